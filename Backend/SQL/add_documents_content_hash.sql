@@ -0,0 +1,24 @@
+-- add_documents_content_hash.sql
+-- Adds the columns used by bulk ingestion (rag/rag_ingestion.py) and
+-- backfills content hashes so existing documents are deduplicated too.
+-- The hash must match rag_ingestion.content_hash():
+-- sha256 of lower(whitespace-collapsed, trimmed title || newline || content).
+-- Whitespace is collapsed before trimming because btrim only strips spaces.
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS metadata JSONB DEFAULT '{}'::jsonb;
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash TEXT;
+
+UPDATE documents
+SET content_hash = encode(sha256(convert_to(
+    lower(btrim(regexp_replace(coalesce(title, ''), '\s+', ' ', 'g'))) || E'\n' ||
+    lower(btrim(regexp_replace(coalesce(content, ''), '\s+', ' ', 'g'))),
+    'UTF8')), 'hex')
+WHERE content_hash IS NULL;
+
+-- Duplicates already in the table keep their lowest id
+DELETE FROM documents d
+USING documents dup
+WHERE d.content_hash = dup.content_hash
+  AND d.id > dup.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
@@ -12,10 +12,14 @@ CREATE TABLE IF NOT EXISTS documents (
     content TEXT NOT NULL,
     embedding VECTOR(1536),           -- pgvector column
     url TEXT,
+    metadata JSONB DEFAULT '{}'::jsonb,  -- authors, journal, date, source...
+    content_hash TEXT,                   -- dedupe key, see rag/rag_ingestion.py
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
 );
 
+CREATE UNIQUE INDEX IF NOT EXISTS idx_documents_content_hash ON documents(content_hash);
+
 -- Create an IVFFLAT index on the embedding column for vector similarity
 CREATE INDEX IF NOT EXISTS embedding_index
 ON documents
@@ -24,3 +24,5 @@ CREATE INDEX IF NOT EXISTS idx_queries_status ON queries(status);
 CREATE INDEX IF NOT EXISTS idx_queries_created_at ON queries(created_at DESC);
 -- Create a compound index for user_id + created_at for optimizing the history endpoint
 CREATE INDEX IF NOT EXISTS idx_queries_user_history ON queries(user_id, created_at DESC);
+-- Cursor pagination orders by (created_at, id), so include id as the tie-breaker
+CREATE INDEX IF NOT EXISTS idx_queries_user_history_cursor ON queries(user_id, created_at DESC, id DESC);
@@ -0,0 +1,48 @@
+-- match_documents_reduced.sql
+-- Reduced-dimension retrieval (requires pgvector >= 0.7 for halfvec/subvector).
+-- text-embedding-3 vectors can be shortened by keeping their first N
+-- dimensions; cosine similarity does not need re-normalization. This indexes
+-- the first 512 dimensions of the existing 1536-d embeddings as float16
+-- (halfvec), so no re-embedding is needed and the index is ~6x smaller than a
+-- full float32 one. Used by the retriever when EMBEDDING_DIMENSIONS=512.
+-- To use another size, replace 512 throughout.
+
+CREATE INDEX IF NOT EXISTS embedding_512_half_index
+ON documents
+USING hnsw ((subvector(embedding, 1, 512)::halfvec(512)) halfvec_cosine_ops);
+
+DROP FUNCTION IF EXISTS match_documents_reduced(halfvec(512), float, int);
+
+CREATE OR REPLACE FUNCTION match_documents_reduced(
+    query_embedding halfvec(512),
+    match_threshold float,
+    match_count int
+)
+RETURNS TABLE (
+    id bigint,
+    title text,
+    content text,
+    url text,
+    metadata jsonb,
+    created_at timestamp with time zone,
+    similarity float
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    d.id::bigint,
+    d.title::text,
+    d.content::text,
+    d.url::text,
+    COALESCE(d.metadata, '{}'::jsonb) AS metadata,
+    d.created_at::timestamp with time zone,
+    (1 - (subvector(d.embedding, 1, 512)::halfvec(512) <=> query_embedding))::float AS similarity
+  FROM documents d
+  WHERE d.embedding IS NOT NULL
+    AND 1 - (subvector(d.embedding, 1, 512)::halfvec(512) <=> query_embedding) > match_threshold
+  ORDER BY subvector(d.embedding, 1, 512)::halfvec(512) <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
@@ -0,0 +1,48 @@
+-- match_documents_slim.sql
+-- Creates the match_documents_slim function (RPC) used by the retriever.
+-- Same matching as match_documents, but only returns the columns the
+-- pipeline uses (metadata carries authors, journal and date for citations). The embedding is omitted unless include_embedding is true,
+-- in which case it comes back as base64 of pgvector's binary form
+-- (int16 dim, int16 unused, dim x big-endian float32) instead of a JSON
+-- array of floats.
+
+DROP FUNCTION IF EXISTS match_documents_slim(vector(1536), float, int, boolean);
+
+CREATE OR REPLACE FUNCTION match_documents_slim(
+    query_embedding vector(1536),
+    match_threshold float,
+    match_count int,
+    include_embedding boolean DEFAULT false
+)
+RETURNS TABLE (
+    id bigint,
+    title text,
+    content text,
+    url text,
+    metadata jsonb,
+    created_at timestamp with time zone,
+    similarity float,
+    embedding_b64 text
+)
+LANGUAGE plpgsql
+AS $$
+BEGIN
+  RETURN QUERY
+  SELECT
+    d.id::bigint,
+    d.title::text,
+    d.content::text,
+    d.url::text,
+    COALESCE(d.metadata, '{}'::jsonb) AS metadata,
+    d.created_at::timestamp with time zone,
+    (1 - (d.embedding <=> query_embedding))::float AS similarity,
+    CASE
+      WHEN include_embedding THEN replace(encode(vector_send(d.embedding), 'base64'), E'\n', '')
+    END AS embedding_b64
+  FROM documents d
+  WHERE d.embedding IS NOT NULL
+    AND 1 - (d.embedding <=> query_embedding) > match_threshold
+  ORDER BY d.embedding <=> query_embedding
+  LIMIT match_count;
+END;
+$$;
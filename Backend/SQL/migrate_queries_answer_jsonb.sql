@@ -0,0 +1,10 @@
+-- migrate_queries_answer_jsonb.sql
+-- Older versions of the API stored the answer as a JSON-encoded string inside
+-- the JSONB column (double encoding). This unwraps those rows into structured
+-- JSON objects so the history endpoints can project into them.
+
+UPDATE queries
+SET answer = (answer #>> '{}')::jsonb
+WHERE jsonb_typeof(answer) = 'string';
+
+CREATE INDEX IF NOT EXISTS idx_queries_user_history_cursor ON queries(user_id, created_at DESC, id DESC);
@@ -1,4 +1,4 @@
-from fastapi import APIRouter, Request, HTTPException
+from fastapi import APIRouter, Request, HTTPException, Query
 from fastapi.responses import StreamingResponse
 from sse_starlette.sse import EventSourceResponse
 import logging
@@ -7,13 +7,14 @@ import asyncio
 from queue import Queue, Empty
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor
-from typing import Optional, Callable
+from typing import Optional, Callable, Literal
 import time
 
 from app.db.models import QuestionRequest, ProcessingStatus
 from app.db.manager import db_manager
-from app.services.request_manager import request_manager
-from rag.rag import RAG, RagAnswer
+from app.services.request_manager import request_manager, RateLimitExceeded
+from rag.rag import RAG, RagAnswer, PIPELINE_MODES
+from rag.rag_warmup import get_shared_components
 from app.core.config import get_settings
 
 settings = get_settings()
@@ -32,9 +33,9 @@ router = APIRouter()
 rag_instances = {}
 
 def get_or_create_rag(request_id: str, status_callback: Optional[Callable] = None) -> RAG:
-    """Get an existing RAG instance or create a new one."""
+    """Get an existing RAG instance or create a new one on the shared components."""
     if request_id not in rag_instances:
-        rag_instances[request_id] = RAG(status_callback=status_callback)
+        rag_instances[request_id] = RAG(status_callback=status_callback, **get_shared_components())
     elif status_callback:  # Update existing instance with new callback
         rag_instances[request_id].status_callback = status_callback
     return rag_instances[request_id]
@@ -44,7 +45,16 @@ def cleanup_rag(request_id: str):
     if request_id in rag_instances:
         del rag_instances[request_id]
 
-async def process_question(request: Request, question: str, user_id: str, stream: bool = True):
+def resolve_pipeline_mode(requested: str) -> str:
+    """
+    Pipeline mode to run a request in: the requested mode ("auto" meaning
+    full), degraded further if the current load calls for a cheaper one.
+    """
+    modes = list(PIPELINE_MODES)
+    requested = "full" if requested == "auto" else requested
+    return max(requested, request_manager.pipeline_mode_for_load(), key=modes.index)
+
+async def process_question(request: Request, question: str, user_id: str, stream: bool = True, mode: str = "auto"):
     """Process a question and return the response."""
     request_id = f"{user_id}_{datetime.now().timestamp()}"
     status_queue = Queue()
@@ -53,9 +63,18 @@ async def process_question(request: Request, question: str, user_id: str, stream
     logger.info(f"\n{'='*50}\nSTEP: Request accepted\nRequest ID: {request_id}\n{'='*50}")
     
     try:
-        can_process = request_manager.add_request(request_id)
+        try:
+            can_process = request_manager.add_request(request_id, user_id=user_id)
+        except RateLimitExceeded as e:
+            logger.warning(f"Rejected request {request_id}: {str(e)}")
+            raise HTTPException(
+                status_code=429,
+                detail="Too many requests. Please slow down and try again shortly.",
+                headers={"Retry-After": str(max(1, int(e.retry_after + 0.5)))}
+            )
         
         if not can_process and not stream:
+            request_manager.remove_request(request_id)
             raise HTTPException(
                 status_code=503,
                 detail="Server is at capacity. Please try again later."
@@ -69,7 +88,10 @@ async def process_question(request: Request, question: str, user_id: str, stream
                     status_queue.put(("status", status))
                     
                 rag_instance = get_or_create_rag(request_id, status_callback=status_callback)
-                return rag_instance.process_query(question)
+                pipeline_mode = resolve_pipeline_mode(mode)
+                if pipeline_mode != "full":
+                    logger.info(f"Request {request_id} running in {pipeline_mode} mode (requested {mode})")
+                return rag_instance.process_query(question, mode=pipeline_mode)
             except Exception as e:
                 logger.error(f"Error in RAG processing: {str(e)}", exc_info=True)
                 status_queue.put(("error", str(e)))
@@ -139,7 +161,7 @@ async def process_question(request: Request, question: str, user_id: str, stream
                             "position": queue_position
                         })
                     }
-                    while not request_manager.can_process_request():
+                    while not request_manager.is_active(request_id):
                         if await request.is_disconnected():
                             logger.info(f"Client disconnected while in queue: {request_id}")
                             return
@@ -228,7 +250,8 @@ async def process_question(request: Request, question: str, user_id: str, stream
                             await db_manager.update_query_status(
                                 query_id=query_id,
                                 status="completed",
-                                answer=result_dict
+                                answer=result_dict,
+                                user_id=user_id
                             )
 
                         yield {
@@ -236,6 +259,7 @@ async def process_question(request: Request, question: str, user_id: str, stream
                             "data": json.dumps({
                                 "from_websearch": result.from_websearch if is_valid else False,
                                 "processing_time": result.processing_time,
+                                "mode": result.mode,
                                 "query_id": query_id if is_valid else None
                             })
                         }
@@ -280,6 +304,8 @@ async def process_question(request: Request, question: str, user_id: str, stream
 
         return EventSourceResponse(event_generator())
     
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in process_question: {str(e)}", exc_info=True)
         cleanup_rag(request_id)
@@ -289,7 +315,8 @@ async def process_question(request: Request, question: str, user_id: str, stream
             await db_manager.update_query_status(
                 query_id=query_id,
                 status="failed",
-                error_message=str(e)
+                error_message=str(e),
+                user_id=user_id
             )
         raise HTTPException(
             status_code=500,
@@ -300,11 +327,14 @@ async def process_question(request: Request, question: str, user_id: str, stream
 async def ask_question_get(
     request: Request,
     question: str,
-    user_id: str
+    user_id: str,
+    mode: Literal["auto", "full", "fast", "db_only"] = "auto"
 ):
     """Handle GET requests for questions."""
     try:
-        return await process_question(request, question=question, user_id=user_id, stream=True)
+        return await process_question(request, question=question, user_id=user_id, stream=True, mode=mode)
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in GET /ask: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
@@ -317,21 +347,44 @@ async def ask_question_post(request: Request, body: QuestionRequest):
             request,
             question=body.question,
             user_id=body.user_id,
-            stream=body.stream
+            stream=body.stream,
+            mode=body.mode
         )
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error in POST /ask: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/history/{user_id}")
-async def get_user_history(user_id: str):
-    """Get the query history for a specific user."""
+async def get_user_history(
+    user_id: str,
+    limit: Optional[int] = Query(default=None, ge=1, le=settings.HISTORY_MAX_PAGE_SIZE),
+    cursor: Optional[str] = None
+):
+    """Get one page of query summaries for a user. Pass `next_cursor` back as `cursor` for the next page."""
     try:
-        queries = await db_manager.get_user_queries(user_id)
-        return {"queries": queries}
+        return await db_manager.get_user_queries(user_id, limit=limit, cursor=cursor)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error retrieving history for user {user_id}: {str(e)}")
         raise HTTPException(
             status_code=500,
             detail=f"Failed to retrieve history: {str(e)}"
-        ) 
\ No newline at end of file
+        )
+
+@router.get("/history/{user_id}/{query_id}")
+async def get_user_query(user_id: str, query_id: str):
+    """Get a single query from a user's history, including its answer and documents."""
+    try:
+        query = await db_manager.get_query(user_id, query_id)
+    except Exception as e:
+        logger.error(f"Error retrieving query {query_id} for user {user_id}: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Failed to retrieve query: {str(e)}"
+        )
+    if query is None:
+        raise HTTPException(status_code=404, detail="Query not found")
+    return {"query": query}
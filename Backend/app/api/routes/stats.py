@@ -0,0 +1,27 @@
+from fastapi import APIRouter
+
+from app.services.request_manager import request_manager
+from app.db.manager import db_manager
+from rag.rag_search_cache import get_search_cache
+from rag.rag_rerank_cache import get_rerank_cache
+from rag.rag_usage_store import get_usage_store
+from rag.rag_metrics import metrics
+from rag.rag_http import get_pool_stats
+from rag.rag_verification import get_verification_policy
+
+# Initialize router
+router = APIRouter()
+
+@router.get("/stats")
+async def get_stats():
+    """Operational statistics for monitoring the request pipeline."""
+    return {
+        "queue": request_manager.get_stats(),
+        "db": db_manager.get_stats(),
+        "search_cache": get_search_cache().get_stats(),
+        "rerank_cache": get_rerank_cache().get_stats(),
+        "search_quota": get_usage_store().snapshot(),
+        "pipeline": metrics.snapshot(),
+        "verification": get_verification_policy().pass_rate(),
+        "http": get_pool_stats()
+    }
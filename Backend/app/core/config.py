@@ -26,6 +26,31 @@ class Settings(BaseSettings):
     
     # Request Processing Configuration
     MAX_CONCURRENT_REQUESTS: int = 10
+
+    # Per-user Rate Limiting / Fair Queueing
+    RATE_LIMIT_REQUESTS_PER_MINUTE: float = 10.0  # 0 disables rate limiting
+    RATE_LIMIT_BURST: int = 5
+    MAX_PENDING_PER_USER: int = 3
+
+    # Load-aware pipeline modes: queued requests at which "auto" requests
+    # are degraded to the fast / DB-only pipeline
+    PIPELINE_FAST_MODE_PENDING: int = 5
+    PIPELINE_DB_ONLY_MODE_PENDING: int = 20
+
+    # Query History Write-behind
+    DB_WRITE_BEHIND_FLUSH_INTERVAL: float = 1.0  # seconds
+    DB_WRITE_BEHIND_BATCH_SIZE: int = 50
+    DB_WRITE_BEHIND_MAX_PENDING: int = 1000
+    # Failed rows are retried with exponential backoff (from the flush
+    # interval), then dropped and logged after this many failed writes
+    DB_WRITE_BEHIND_MAX_ATTEMPTS: int = 10
+
+    # Query History Pagination
+    HISTORY_PAGE_SIZE: int = 20
+    HISTORY_MAX_PAGE_SIZE: int = 100
+    HISTORY_CACHE_MAX_BYTES: int = 32 * 1024 * 1024
+    # Bounds staleness from writes handled by other workers
+    HISTORY_CACHE_TTL: float = 30.0  # seconds
     
     model_config = {
         "case_sensitive": True,
@@ -1,9 +1,17 @@
+import asyncio
 import logging
-from typing import List, Optional, Dict, Any
+import time
+import uuid
+from collections import OrderedDict
+from typing import List, Optional, Dict, Any, TYPE_CHECKING
 from datetime import datetime
-from supabase import create_client, Client
+import base64
 import json
 from app.core.config import get_settings
+from rag.rag_http import share_postgrest_session
+
+if TYPE_CHECKING:
+    from supabase import AsyncClient
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -11,93 +19,518 @@ logger = logging.getLogger(__name__)
 
 settings = get_settings()
 
-# Initialize Supabase client
-try:
-    supabase: Client = create_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
-    logger.info("Successfully initialized Supabase client")
-except Exception as e:
-    logger.error(f"Failed to initialize Supabase client: {str(e)}")
-    raise
+# Columns written by the history upsert. PostgREST bulk upserts need every row
+# to carry the same keys, so full rows are always normalized to this set.
+QUERY_COLUMNS = ("id", "user_id", "question", "status", "answer", "error_message", "created_at", "updated_at")
+
+# Projection used by the history list; answers and documents are loaded per query.
+HISTORY_SUMMARY_COLUMNS = "id,question,status,created_at,updated_at"
+
+
+def encode_history_cursor(created_at: str, query_id: str) -> str:
+    """Encode the position after (created_at, id) as an opaque URL-safe cursor."""
+    raw = json.dumps([created_at, query_id], separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple:
+    """Decode a cursor produced by encode_history_cursor. Raises ValueError if it is malformed."""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        created_at, query_id = json.loads(base64.urlsafe_b64decode(padded))
+        # Validate the parts before they are interpolated into a PostgREST filter
+        datetime.fromisoformat(created_at)
+        return created_at, str(uuid.UUID(query_id))
+    except Exception as e:
+        raise ValueError(f"Invalid history cursor: {cursor}") from e
+
+
+class HistoryCache:
+    """
+    Read-through cache for query history, bounded by the total (JSON-encoded)
+    size of the cached values and evicted least-recently-used.
+
+    Entries are grouped per user so that any write for a user drops all of that
+    user's cached pages and query details. Also remembers which user owns each
+    cached query ID so status updates that only carry a query ID can still be
+    routed to the right user.
+
+    Entries expire after ttl seconds, which bounds staleness from writes this
+    process never sees (other workers). Each invalidation bumps the user's
+    generation; a read takes a token with begin_fill() before fetching, and
+    put() drops the result if the user was invalidated in the meantime (or
+    the fill took longer than ttl), so a page read before a concurrent write
+    is never cached after it.
+    """
+
+    def __init__(self, max_bytes: int, ttl: float):
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple, tuple]" = OrderedDict()  # key -> (value, size, expires_at)
+        self._user_keys: Dict[str, set] = {}
+        self._user_queries: Dict[str, set] = {}  # user_id -> query IDs recorded in _owners
+        self._owners: Dict[str, str] = {}  # query_id -> user_id
+        # user_id -> (generation, invalidated_at), oldest first; records older
+        # than ttl are dropped, as fills that old are rejected anyway
+        self._generations: "OrderedDict[str, tuple]" = OrderedDict()
+        self._generation_counter = 0
+        self.current_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+        self.stale_fills = 0
+
+    def get(self, user_id: str, key: tuple) -> Optional[Any]:
+        full_key = (user_id,) + key
+        entry = self._entries.get(full_key)
+        if entry is not None and entry[2] <= time.monotonic():
+            self._remove(full_key)
+            self.expirations += 1
+            entry = None
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(full_key)
+        self.hits += 1
+        return entry[0]
+
+    def begin_fill(self, user_id: str) -> tuple:
+        """Token to pass to put() for a value about to be read from the database."""
+        return self._generations.get(user_id, (0,))[0], time.monotonic()
+
+    def put(self, user_id: str, key: tuple, value: Any, query_ids: List[str], token: tuple) -> None:
+        generation, started = token
+        now = time.monotonic()
+        if self._generations.get(user_id, (0,))[0] != generation or now - started > self.ttl:
+            self.stale_fills += 1
+            return
+        size = len(json.dumps(value, default=str))
+        if size > self.max_bytes:
+            return
+        full_key = (user_id,) + key
+        self._remove(full_key)
+        self._entries[full_key] = (value, size, now + self.ttl)
+        self._user_keys.setdefault(user_id, set()).add(full_key)
+        self.current_bytes += size
+        user_queries = self._user_queries.setdefault(user_id, set())
+        for query_id in query_ids:
+            self._owners[query_id] = user_id
+            user_queries.add(query_id)
+        while self.current_bytes > self.max_bytes:
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def owner_of(self, query_id: str) -> Optional[str]:
+        return self._owners.get(query_id)
+
+    def invalidate_user(self, user_id: str) -> None:
+        now = time.monotonic()
+        self._generation_counter += 1
+        self._generations.pop(user_id, None)
+        self._generations[user_id] = (self._generation_counter, now)
+        while self._generations:
+            oldest_user, (_, invalidated_at) = next(iter(self._generations.items()))
+            if now - invalidated_at <= self.ttl:
+                break
+            del self._generations[oldest_user]
+
+        keys = self._user_keys.pop(user_id, None)
+        if not keys:
+            return
+        self._user_keys[user_id] = keys
+        for key in list(keys):
+            self._remove(key)
+        self.invalidations += 1
+
+    def _remove(self, full_key: tuple) -> None:
+        entry = self._entries.pop(full_key, None)
+        if entry is None:
+            return
+        self.current_bytes -= entry[1]
+        user_id = full_key[0]
+        user_keys = self._user_keys.get(user_id)
+        if user_keys is not None:
+            user_keys.discard(full_key)
+            if not user_keys:
+                # Last entry for this user is gone; forget which queries they own
+                del self._user_keys[user_id]
+                for query_id in self._user_queries.pop(user_id, ()):
+                    if self._owners.get(query_id) == user_id:
+                        del self._owners[query_id]
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "users": len(self._user_keys),
+            "bytes": self.current_bytes,
+            "max_bytes": self.max_bytes,
+            "ttl": self.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "invalidations": self.invalidations,
+            "stale_fills": self.stale_fills
+        }
+
 
 class DatabaseManager:
-    """Handles all database operations."""
-    
-    @staticmethod
-    async def save_query_to_db(user_id: str, question: str) -> str:
-        """Save a new query to the database and return its ID."""
+    """
+    Handles all database operations.
+
+    Uses the async Supabase client, which keeps a single pooled HTTP/2 connection
+    to PostgREST, so no call blocks the event loop. Query history writes go into a
+    bounded write-behind buffer keyed by query ID: the pending insert and the
+    later status update for the same query are merged and flushed in batches as a
+    single upsert by a background task. A row whose write fails is retried on its
+    own with exponential backoff, so it cannot hold back other rows, and is
+    dropped (and logged) after DB_WRITE_BEHIND_MAX_ATTEMPTS failures. History
+    writes never fail the request that made them.
+
+    History reads go through a per-user HistoryCache that is invalidated whenever
+    a write for that user is buffered, and whose entries expire after
+    HISTORY_CACHE_TTL seconds (writes handled by other workers).
+    """
+
+    def __init__(self):
+        self._client: Optional["AsyncClient"] = None
+        self._client_lock: Optional[asyncio.Lock] = None
+        self._pending: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._flush_lock: Optional[asyncio.Lock] = None
+        self._flush_event: Optional[asyncio.Event] = None
+        self._flusher_task: Optional[asyncio.Task] = None
+        self.history_cache = HistoryCache(settings.HISTORY_CACHE_MAX_BYTES, settings.HISTORY_CACHE_TTL)
+
+    # ---------- Client / lifecycle ----------
+
+    async def get_client(self) -> "AsyncClient":
+        """Return the shared async Supabase client, creating it on first use."""
+        if self._client is None:
+            if self._client_lock is None:
+                self._client_lock = asyncio.Lock()
+            async with self._client_lock:
+                if self._client is None:
+                    try:
+                        from supabase import acreate_client  # deferred: heavy SDK import
+
+                        self._client = await acreate_client(settings.SUPABASE_URL, settings.SUPABASE_ANON_KEY)
+                        share_postgrest_session(self._client)
+                        logger.info("Successfully initialized async Supabase client")
+                    except Exception as e:
+                        logger.error(f"Failed to initialize Supabase client: {str(e)}")
+                        raise
+        return self._client
+
+    def start(self) -> None:
+        """Start the background write-behind flusher. Must be called from a running event loop."""
+        if self._flusher_task is None or self._flusher_task.done():
+            self._flush_lock = self._flush_lock or asyncio.Lock()
+            self._flush_event = self._flush_event or asyncio.Event()
+            self._flusher_task = asyncio.create_task(self._flush_loop())
+            logger.info("Started query history write-behind flusher")
+
+    async def stop(self) -> None:
+        """Stop the flusher and drain any buffered history writes."""
+        if self._flusher_task is not None:
+            self._flusher_task.cancel()
+            try:
+                await self._flusher_task
+            except asyncio.CancelledError:
+                pass
+            self._flusher_task = None
+        await self.flush(force=True)
+        if self._client is not None:
+            await self._client.postgrest.aclose()
+            self._client = None
+
+    # ---------- Write-behind buffer ----------
+
+    async def _enqueue(self, query_id: str, data: Dict[str, Any], user_id: Optional[str] = None) -> Dict[str, Any]:
+        """Merge a write for query_id into the buffer, applying backpressure when it is full."""
+        self.start()
+        user_id = user_id or self.history_cache.owner_of(query_id)
+        if query_id not in self._pending and len(self._pending) >= settings.DB_WRITE_BEHIND_MAX_PENDING:
+            logger.warning("Write-behind buffer full, flushing inline")
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing query history: {str(e)}")
+            self._drop_oldest(len(self._pending) - settings.DB_WRITE_BEHIND_MAX_PENDING + 1)
+
+        record = self._pending.get(query_id)
+        if record is None:
+            record = {"id": query_id}
+            self._pending[query_id] = record
+        record.update(data)
+
+        # "_owner" is bookkeeping only and is never written to the table
+        owner = user_id or record.get("_owner")
+        if owner:
+            record["_owner"] = owner
+            self.history_cache.invalidate_user(owner)
+
+        if len(self._pending) >= settings.DB_WRITE_BEHIND_BATCH_SIZE:
+            self._flush_event.set()
+        return record
+
+    async def _flush_loop(self) -> None:
+        """Flush buffered writes every DB_WRITE_BEHIND_FLUSH_INTERVAL seconds or when a batch fills up."""
+        while True:
+            try:
+                await asyncio.wait_for(
+                    self._flush_event.wait(),
+                    timeout=settings.DB_WRITE_BEHIND_FLUSH_INTERVAL
+                )
+            except asyncio.TimeoutError:
+                pass
+            self._flush_event.clear()
+            try:
+                await self.flush()
+            except Exception as e:
+                logger.error(f"Error flushing query history: {str(e)}")
+
+    async def flush(self, force: bool = False) -> int:
+        """
+        Write buffered history rows to the database. Rows waiting out a retry
+        backoff are skipped unless force is set (shutdown). Rows that fail are
+        put back for a later retry. Returns the number of rows written.
+        """
+        if self._flush_lock is None:
+            self._flush_lock = asyncio.Lock()
+        async with self._flush_lock:
+            now = time.monotonic()
+            batch = OrderedDict(
+                (query_id, record) for query_id, record in self._pending.items()
+                if force or record.get("_retry_at", 0.0) <= now
+            )
+            if not batch:
+                return 0
+            for query_id in batch:
+                del self._pending[query_id]
+
+            # Rows whose insert is still buffered can be written as one upsert;
+            # updates for rows that were already flushed are sent as plain updates.
+            # Rows that failed before are written one per request, so a bad row
+            # cannot fail its neighbours again.
+            full_records = [record for record in batch.values() if "user_id" in record]
+            batch_size = settings.DB_WRITE_BEHIND_BATCH_SIZE
+            fresh = [record for record in full_records if not record.get("_attempts")]
+            chunks = [fresh[start:start + batch_size] for start in range(0, len(fresh), batch_size)]
+            chunks += [[record] for record in full_records if record.get("_attempts")]
+            partial_records = [record for record in batch.values() if "user_id" not in record]
+
+            try:
+                client = await self.get_client()
+            except Exception as e:
+                logger.error(f"Error writing query history batch: {str(e)}")
+                self._requeue(list(batch.values()))
+                return 0
+
+            written = 0
+            failed: List[Dict[str, Any]] = []
+            for chunk in chunks:
+                try:
+                    rows = [{column: record.get(column) for column in QUERY_COLUMNS} for record in chunk]
+                    await client.table('queries').upsert(rows).execute()
+                    written += len(chunk)
+                except Exception as e:
+                    logger.error(f"Error writing {len(chunk)} query history rows: {str(e)}")
+                    failed.extend(chunk)
+            for record in partial_records:
+                try:
+                    data = {k: v for k, v in record.items() if k != "id" and not k.startswith("_")}
+                    await client.table('queries').update(data).eq('id', record["id"]).execute()
+                    written += 1
+                except Exception as e:
+                    logger.error(f"Error updating query history row {record['id']}: {str(e)}")
+                    failed.append(record)
+
+            self._requeue(failed)
+            logger.info(f"Flushed {written} query history rows to database ({len(failed)} failed)")
+            return written
+
+    def _requeue(self, records: List[Dict[str, Any]]) -> None:
+        """
+        Put failed rows back in front of the buffer, without overwriting newer
+        writes, to be retried after a backoff; rows out of attempts are dropped.
+        """
+        now = time.monotonic()
+        merged: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        for record in records:
+            attempts = record.get("_attempts", 0) + 1
+            if attempts >= settings.DB_WRITE_BEHIND_MAX_ATTEMPTS:
+                logger.error(f"Dropping query history row {record['id']} after {attempts} failed writes")
+                continue
+            retry_at = now + settings.DB_WRITE_BEHIND_FLUSH_INTERVAL * 2 ** (attempts - 1)
+            merged[record["id"]] = {
+                **record, **self._pending.get(record["id"], {}), "_attempts": attempts, "_retry_at": retry_at
+            }
+        for query_id, record in self._pending.items():
+            if query_id not in merged:
+                merged[query_id] = record
+        self._pending = merged
+
+    def _drop_oldest(self, count: int) -> None:
+        """Make room in a full buffer that could not be flushed by dropping its oldest rows."""
+        for _ in range(max(0, count)):
+            query_id, _record = self._pending.popitem(last=False)
+            logger.error(f"Write-behind buffer full, dropping query history row {query_id}")
+
+    # ---------- Queries ----------
+
+    async def save_query_to_db(self, user_id: str, question: str) -> str:
+        """Buffer a new query for writing and return its ID."""
         try:
-            data = {
+            query_id = str(uuid.uuid4())
+            now = datetime.utcnow().isoformat()
+            await self._enqueue(query_id, {
                 "user_id": user_id,
                 "question": question,
-                "status": "pending"
-            }
-            response = supabase.table('queries').insert(data).execute()
-            query_id = response.data[0]['id']
-            logger.info(f"Saved query to database with ID: {query_id}")
+                "status": "pending",
+                "created_at": now,
+                "updated_at": now
+            }, user_id=user_id)
+            logger.info(f"Queued query for database with ID: {query_id}")
             return query_id
         except Exception as e:
             logger.error(f"Error saving query to database: {str(e)}")
             raise
 
-    @staticmethod
     async def update_query_status(
-        query_id: str, 
-        status: str, 
-        answer: Optional[Dict] = None, 
-        error_message: Optional[str] = None
+        self,
+        query_id: str,
+        status: str,
+        answer: Optional[Dict] = None,
+        error_message: Optional[str] = None,
+        user_id: Optional[str] = None
     ) -> Dict[str, Any]:
-        """Update the status and optionally the answer of a query in the database."""
+        """Buffer a status (and optionally answer) update for a query."""
         try:
             data = {
                 "status": status,
                 "updated_at": datetime.utcnow().isoformat()
             }
-            
+
             if answer:
-                data["answer"] = json.dumps(answer)
-            
+                data["answer"] = answer
+
             if error_message:
                 data["error_message"] = error_message
 
-            response = supabase.table('queries').update(data).eq('id', query_id).execute()
-            logger.info(f"Updated query {query_id} status to {status}")
-            return response.data
+            record = await self._enqueue(query_id, data, user_id=user_id)
+            logger.info(f"Queued update of query {query_id} status to {status}")
+            return record
         except Exception as e:
             logger.error(f"Error updating query status: {str(e)}")
             raise
 
-    @staticmethod
-    async def get_user_queries(user_id: str) -> List[Dict[str, Any]]:
-        """Retrieve all queries for a given user, ordered by creation date (newest first)."""
+    async def get_user_queries(
+        self,
+        user_id: str,
+        limit: Optional[int] = None,
+        cursor: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Retrieve one page of query summaries for a user, newest first.
+
+        Only the summary columns are fetched; answers and documents are loaded
+        per query through get_query. Pages are keyed by an opaque cursor over
+        (created_at, id), so deep pages cost the same as the first one.
+        Returns {"queries": [...], "next_cursor": str or None}.
+        """
+        limit = min(limit or settings.HISTORY_PAGE_SIZE, settings.HISTORY_MAX_PAGE_SIZE)
         try:
-            response = supabase.table('queries') \
-                .select('*') \
-                .eq('user_id', user_id) \
+            await self._flush_user(user_id)
+            cache_key = ("page", limit, cursor)
+            cached = self.history_cache.get(user_id, cache_key)
+            if cached is not None:
+                return cached
+            fill_token = self.history_cache.begin_fill(user_id)
+
+            client = await self.get_client()
+            request = client.table('queries') \
+                .select(HISTORY_SUMMARY_COLUMNS) \
+                .eq('user_id', user_id)
+            if cursor:
+                created_at, last_id = decode_history_cursor(cursor)
+                request = request.or_(
+                    f'created_at.lt."{created_at}",and(created_at.eq."{created_at}",id.lt.{last_id})'
+                )
+            response = await request \
                 .order('created_at', desc=True) \
+                .order('id', desc=True) \
+                .limit(limit + 1) \
                 .execute()
-            
-            queries = []
-            for query in response.data:
-                # Parse the answer JSON if it exists
-                if query.get('answer'):
-                    try:
-                        answer_data = json.loads(query['answer'])
-                        query['answer'] = answer_data.get('answer', '')
-                        query['documents'] = answer_data.get('documents', [])
-                        query['from_websearch'] = answer_data.get('from_websearch', False)
-                        query['processing_time'] = answer_data.get('processing_time', 0.0)
-                    except json.JSONDecodeError:
-                        query['answer'] = None
-                        query['documents'] = []
-                        query['from_websearch'] = False
-                        query['processing_time'] = 0.0
-                
-                queries.append(query)
-            
-            return queries
+
+            queries = response.data[:limit]
+            next_cursor = None
+            if len(response.data) > limit:
+                last = queries[-1]
+                next_cursor = encode_history_cursor(last['created_at'], last['id'])
+
+            page = {"queries": queries, "next_cursor": next_cursor}
+            self.history_cache.put(user_id, cache_key, page, [q['id'] for q in queries], fill_token)
+            return page
         except Exception as e:
             logger.error(f"Error retrieving queries for user {user_id}: {str(e)}")
             raise
 
+    async def get_query(self, user_id: str, query_id: str) -> Optional[Dict[str, Any]]:
+        """Retrieve a single query with its full answer and documents, or None if not found."""
+        try:
+            await self._flush_user(user_id)
+            cache_key = ("query", query_id)
+            cached = self.history_cache.get(user_id, cache_key)
+            if cached is not None:
+                return cached
+            fill_token = self.history_cache.begin_fill(user_id)
+
+            client = await self.get_client()
+            response = await client.table('queries') \
+                .select(HISTORY_SUMMARY_COLUMNS + ',error_message,answer') \
+                .eq('user_id', user_id) \
+                .eq('id', query_id) \
+                .limit(1) \
+                .execute()
+
+            if not response.data:
+                return None
+            query = response.data[0]
+            query['answer'] = self._decode_answer(query.get('answer'))
+            self.history_cache.put(user_id, cache_key, query, [query_id], fill_token)
+            return query
+        except Exception as e:
+            logger.error(f"Error retrieving query {query_id} for user {user_id}: {str(e)}")
+            raise
+
+    async def _flush_user(self, user_id: str) -> None:
+        """Read-your-writes: persist this user's buffered history before reading it."""
+        if any(record.get("_owner") == user_id for record in self._pending.values()):
+            await self.flush()
+
+    @staticmethod
+    def _decode_answer(answer: Any) -> Optional[Dict[str, Any]]:
+        """Return the stored answer as a dict, decoding legacy double-encoded JSON strings."""
+        if isinstance(answer, str):
+            try:
+                answer = json.loads(answer)
+            except json.JSONDecodeError:
+                return None
+        return answer if isinstance(answer, dict) else None
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Write-behind buffer and history cache statistics for monitoring."""
+        return {
+            "pending_writes": len(self._pending),
+            "max_pending_writes": settings.DB_WRITE_BEHIND_MAX_PENDING,
+            "flusher_running": self._flusher_task is not None and not self._flusher_task.done(),
+            "history_cache": self.history_cache.get_stats()
+        }
+
 # Global instance
-db_manager = DatabaseManager() 
\ No newline at end of file
+db_manager = DatabaseManager()
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Literal
 from datetime import datetime
 
 class RagDocument(BaseModel):
@@ -21,27 +21,44 @@ class QuestionRequest(BaseModel):
                         description="Whether to stream the response")
     user_id: str = Field(..., 
                         description="The ID of the user making the request")
+    mode: Literal["auto", "full", "fast", "db_only"] = Field(default="auto",
+                        description="Pipeline mode; auto degrades under load, and load can only make an explicit mode cheaper")
 
     class Config:
         json_schema_extra = {
             "example": {
                 "question": "What is the role of mitochondria in cell energy production?",
                 "stream": True,
-                "user_id": "user123"
+                "user_id": "user123",
+                "mode": "auto"
             }
         }
 
-class QueryHistory(BaseModel):
-    """Model for query history response."""
+class StoredAnswer(BaseModel):
+    """Model for the answer stored (as JSONB) with a completed query."""
+    answer: str
+    documents: List[RagDocument] = []
+    from_websearch: bool = False
+    processing_time: Optional[float] = None
+    mode: Optional[str] = None
+
+class QuerySummary(BaseModel):
+    """Model for an entry in the paginated query history list."""
     id: str
-    user_id: str
     question: str
-    answer: Optional[str]
     status: str
     created_at: str
-    documents: Optional[List[RagDocument]] = []
-    from_websearch: Optional[bool] = False
-    processing_time: Optional[float] = None
+    updated_at: Optional[str] = None
+
+class QueryHistoryPage(BaseModel):
+    """Model for a page of query history."""
+    queries: List[QuerySummary]
+    next_cursor: Optional[str] = None
+
+class QueryHistory(QuerySummary):
+    """Model for a single query with its full answer and documents."""
+    error_message: Optional[str] = None
+    answer: Optional[StoredAnswer] = None
 
 class ProcessingStatus:
     """Constants for processing status messages."""
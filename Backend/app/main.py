@@ -1,9 +1,13 @@
 from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
+import asyncio
 import logging
 
 from app.core.config import get_settings
-from app.api.routes import question
+from app.api.routes import question, stats
+from app.db.manager import db_manager
+from rag.rag_warmup import warmup, get_warmup_status, WARMUP_RETRY_DELAY, WARMUP_RETRY_MAX_DELAY
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -30,6 +34,34 @@ def create_application() -> FastAPI:
 
     # Register routers
     app.include_router(question.router, tags=["Questions"])
+    app.include_router(stats.router, tags=["Stats"])
+
+    async def run_warmup():
+        """
+        Open the database client, then warm the RAG components off the event
+        loop, retrying with exponential backoff until warmup succeeds.
+        """
+        try:
+            await db_manager.get_client()
+        except Exception as e:
+            logger.warning(f"Database client warmup failed: {str(e)}")
+        delay = WARMUP_RETRY_DELAY
+        while not (await asyncio.to_thread(warmup))["ready"]:
+            logger.warning(f"Retrying warmup in {delay:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, WARMUP_RETRY_MAX_DELAY)
+
+    @app.on_event("startup")
+    async def startup():
+        """Start background workers and the warmup phase."""
+        db_manager.start()
+        app.state.warmup_task = asyncio.create_task(run_warmup())
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        """Stop a warmup still retrying and drain buffered history writes before exiting."""
+        app.state.warmup_task.cancel()
+        await db_manager.stop()
 
     @app.get("/", tags=["Root"])
     def read_root():
@@ -39,10 +71,20 @@ def create_application() -> FastAPI:
             "version": settings.API_VERSION,
             "endpoints": {
                 "/ask": "POST/GET - Ask a scientific question",
-                "/history/{user_id}": "GET - Get user's question history"
+                "/history/{user_id}": "GET - Get user's question history",
+                "/stats": "GET - Queue and pipeline statistics",
+                "/ready": "GET - Readiness (200 once warmup has finished)"
             }
         }
 
+    @app.get("/ready", tags=["Root"])
+    def readiness():
+        """Readiness probe: 503 until warmup has finished."""
+        status = get_warmup_status()
+        if not status["ready"]:
+            return JSONResponse(status_code=503, content=status)
+        return status
+
     @app.exception_handler(Exception)
     async def global_exception_handler(request: Request, exc: Exception):
         """Global exception handler for unhandled exceptions."""
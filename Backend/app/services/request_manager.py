@@ -1,53 +1,234 @@
 from datetime import datetime
-from typing import Dict, List, Optional
+from typing import Dict, List, Optional, Tuple
 from threading import Lock
+import itertools
+import time
 from app.core.config import get_settings
 
 settings = get_settings()
 
+# Requests without a user_id share one bucket and one fair-queue slot
+ANONYMOUS_USER_ID = "anonymous"
+# Seconds between sweeps of per-user limiter state left by idle users
+IDLE_SWEEP_INTERVAL = 60.0
+
+
+class RateLimitExceeded(Exception):
+    """Raised when a user has exhausted their request token bucket."""
+
+    def __init__(self, user_id: str, retry_after: float):
+        self.user_id = user_id
+        self.retry_after = retry_after
+        super().__init__(
+            f"Rate limit exceeded for user {user_id}. Retry after {retry_after:.1f}s."
+        )
+
+
+class TokenBucket:
+    """Classic token bucket: refills at `rate` tokens per second up to `capacity`."""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+
+    def _refill(self, now: float) -> None:
+        elapsed = now - self.updated_at
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self.updated_at = now
+
+    def is_full(self) -> bool:
+        """True once the bucket has refilled completely (its user has been idle)."""
+        self._refill(time.monotonic())
+        return self.tokens >= self.capacity
+
+    def consume(self, tokens: float = 1.0) -> bool:
+        """Take tokens from the bucket. Returns False if not enough are available."""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens:
+            self.tokens -= tokens
+            return True
+        return False
+
+    def retry_after(self, tokens: float = 1.0) -> float:
+        """Seconds until `tokens` will be available."""
+        self._refill(time.monotonic())
+        if self.tokens >= tokens or self.rate <= 0:
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
 class RequestManager:
-    """Manages concurrent request processing and queuing."""
-    
+    """
+    Manages concurrent request processing and queuing.
+
+    Admission is rate limited per user with a token bucket, and pending requests
+    are served with weighted fair queueing across user_ids: every queued request
+    gets a virtual finish tag of max(virtual_time, user's last tag) + 1/weight,
+    and the smallest tag is served first. A single user flooding the queue only
+    pushes their own tags further out, so other users keep their place.
+
+    Per-user limiter state is swept every IDLE_SWEEP_INTERVAL seconds: full
+    buckets (which a new bucket would equal) and finish tags at or below the
+    virtual time (which max() would ignore) are dropped, so user IDs that
+    come and go do not accumulate.
+    """
+
     def __init__(self):
         self.active_requests: Dict[str, datetime] = {}
-        self.pending_requests: List[str] = []
+        # request_id -> (finish_tag, sequence, user_id)
+        self.pending_requests: Dict[str, Tuple[float, int, str]] = {}
+        self.request_users: Dict[str, str] = {}
+        self.user_buckets: Dict[str, TokenBucket] = {}
+        self.user_finish_tags: Dict[str, float] = {}
+        self.user_weights: Dict[str, float] = {}
+        self.virtual_time = 0.0
+        self._last_sweep = time.monotonic()
+        self._sequence = itertools.count()
         self.active_lock = Lock()
         self.pending_lock = Lock()
 
+    # ---------- Rate limiting ----------
+
+    def set_user_weight(self, user_id: str, weight: float) -> None:
+        """Give a user a larger (or smaller) share of the queue. Default weight is 1."""
+        with self.pending_lock:
+            self.user_weights[user_id] = max(weight, 1e-6)
+
+    def _check_rate_limit(self, user_id: str) -> None:
+        """Consume one token for the user or raise RateLimitExceeded."""
+        if settings.RATE_LIMIT_REQUESTS_PER_MINUTE <= 0:
+            return
+        bucket = self.user_buckets.get(user_id)
+        if bucket is None:
+            bucket = TokenBucket(
+                rate=settings.RATE_LIMIT_REQUESTS_PER_MINUTE / 60.0,
+                capacity=settings.RATE_LIMIT_BURST
+            )
+            self.user_buckets[user_id] = bucket
+        if not bucket.consume():
+            raise RateLimitExceeded(user_id, bucket.retry_after())
+
+    def _sweep_idle_users(self) -> None:
+        """Drop limiter state that is equivalent to a user never having been seen."""
+        now = time.monotonic()
+        if now - self._last_sweep < IDLE_SWEEP_INTERVAL:
+            return
+        self._last_sweep = now
+        self.user_buckets = {uid: b for uid, b in self.user_buckets.items() if not b.is_full()}
+        self.user_finish_tags = {
+            uid: tag for uid, tag in self.user_finish_tags.items() if tag > self.virtual_time
+        }
+
+    # ---------- Admission ----------
+
     def can_process_request(self) -> bool:
         """Check if we can process a new request."""
         with self.active_lock:
             return len(self.active_requests) < settings.MAX_CONCURRENT_REQUESTS
 
-    def add_request(self, request_id: str) -> bool:
-        """Add a request. Returns True if it can be processed immediately."""
+    def is_active(self, request_id: str) -> bool:
+        """Check whether a request has been admitted to a processing slot."""
+        with self.active_lock:
+            return request_id in self.active_requests
+
+    def add_request(self, request_id: str, user_id: Optional[str] = None) -> bool:
+        """
+        Add a request. Returns True if it can be processed immediately.
+        Raises RateLimitExceeded if the user is over their rate limit or
+        already has MAX_PENDING_PER_USER requests waiting. The queue depth is
+        checked first, so a request turned away for depth does not spend a
+        rate limit token. Requests without a user_id are limited together as
+        ANONYMOUS_USER_ID.
+        """
+        user_id = user_id or ANONYMOUS_USER_ID
         with self.active_lock:
-            if len(self.active_requests) < settings.MAX_CONCURRENT_REQUESTS:
-                self.active_requests[request_id] = datetime.now()
-                return True
             with self.pending_lock:
-                self.pending_requests.append(request_id)
+                self._sweep_idle_users()
+                admit_now = not self.pending_requests and len(self.active_requests) < settings.MAX_CONCURRENT_REQUESTS
+                if not admit_now and self._user_depth(user_id) >= settings.MAX_PENDING_PER_USER:
+                    raise RateLimitExceeded(user_id, retry_after=1.0)
+                self._check_rate_limit(user_id)
+                self.request_users[request_id] = user_id
+
+                if admit_now:
+                    self.active_requests[request_id] = datetime.now()
+                    return True
+
+                weight = self.user_weights.get(user_id, 1.0)
+                start_tag = max(self.virtual_time, self.user_finish_tags.get(user_id, 0.0))
+                finish_tag = start_tag + 1.0 / weight
+                self.user_finish_tags[user_id] = finish_tag
+                self.pending_requests[request_id] = (finish_tag, next(self._sequence), user_id)
             return False
 
     def remove_request(self, request_id: str) -> Optional[str]:
-        """Remove a request and process next in queue if any."""
+        """Remove a request (active or still queued) and admit the next fair-share request if any."""
         with self.active_lock:
             self.active_requests.pop(request_id, None)
-            # Try to process next pending request
             with self.pending_lock:
+                self.pending_requests.pop(request_id, None)
+                self.request_users.pop(request_id, None)
                 if self.pending_requests and len(self.active_requests) < settings.MAX_CONCURRENT_REQUESTS:
-                    next_request = self.pending_requests.pop(0)
+                    next_request = min(self.pending_requests, key=self.pending_requests.get)
+                    finish_tag, _, _ = self.pending_requests.pop(next_request)
+                    self.virtual_time = max(self.virtual_time, finish_tag)
                     self.active_requests[next_request] = datetime.now()
                     return next_request
+                if not self.pending_requests:
+                    # Idle queue: forget finish tags so they don't grow unbounded
+                    self.user_finish_tags.clear()
+                    self.virtual_time = 0.0
         return None
 
+    def pipeline_mode_for_load(self) -> str:
+        """Cheapest pipeline mode the current queue depth calls for: full, fast or db_only."""
+        with self.pending_lock:
+            pending = len(self.pending_requests)
+        if pending >= settings.PIPELINE_DB_ONLY_MODE_PENDING:
+            return "db_only"
+        if pending >= settings.PIPELINE_FAST_MODE_PENDING:
+            return "fast"
+        return "full"
+
+    # ---------- Observability ----------
+
     def get_queue_position(self, request_id: str) -> int:
-        """Get position in queue for a request."""
+        """Get position in the fair-share queue for a request (0 if not queued)."""
         with self.pending_lock:
-            try:
-                return self.pending_requests.index(request_id) + 1
-            except ValueError:
+            entry = self.pending_requests.get(request_id)
+            if entry is None:
                 return 0
+            return sum(1 for other in self.pending_requests.values() if other < entry) + 1
+
+    def _user_depth(self, user_id: str) -> int:
+        return sum(1 for _, _, uid in self.pending_requests.values() if uid == user_id)
+
+    def get_user_queue_depths(self) -> Dict[str, int]:
+        """Number of pending requests per user."""
+        depths: Dict[str, int] = {}
+        with self.pending_lock:
+            for _, _, user_id in self.pending_requests.values():
+                depths[user_id] = depths.get(user_id, 0) + 1
+        return depths
+
+    def get_stats(self) -> Dict[str, object]:
+        """Snapshot of queue state for monitoring."""
+        with self.active_lock:
+            active_users: Dict[str, int] = {}
+            for request_id in self.active_requests:
+                user_id = self.request_users.get(request_id, request_id)
+                active_users[user_id] = active_users.get(user_id, 0) + 1
+            active = len(self.active_requests)
+        depths = self.get_user_queue_depths()
+        return {
+            "active_requests": active,
+            "pending_requests": sum(depths.values()),
+            "max_concurrent_requests": settings.MAX_CONCURRENT_REQUESTS,
+            "active_per_user": active_users,
+            "pending_per_user": depths,
+        }
 
 # Global instance
-request_manager = RequestManager() 
\ No newline at end of file
+request_manager = RequestManager()
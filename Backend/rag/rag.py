@@ -1,7 +1,8 @@
 import os
 import time
 import logging
-from typing import List, Optional, Dict, Any, Callable
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Optional, Dict, Any, Callable, TYPE_CHECKING
 from pydantic import BaseModel, Field
 
 # Imports from your code
@@ -10,8 +11,9 @@ from .rag_embeddings import EmbeddingsManager
 from .rag_retriever import retrieve_documents
 from .rag_search_manager import SearchManager
 from .rag_reranker import ReRankManager
+from .rag_local_reranker import reranked_locally
 from .rag_prompts import (
-    SCIENTIFIC_QUERY_VALIDATOR_SYSTEM,
+    SCIENTIFIC_QUERY_VALIDATOR_PROMPT,
     QUERY_REWRITER_PROMPT,
     RAG_PROMPT,
     HALLUCINATION_GRADER_PROMPT,
@@ -19,6 +21,15 @@ from .rag_prompts import (
 )
 
 from .models import ProcessingStatus
+from .rag_metrics import metrics
+from .rag_writeback import WebWriteBack
+from .rag_verification import VerificationPolicy, get_verification_policy
+from .rag_context import ContextPacker, context_budget, format_doc, split_authors
+from .rag_topk import ADAPTIVE_TOPK, cut_by_score
+
+if TYPE_CHECKING:
+    import numpy as np
+    from .rag_classifier import QueryClassifier
 
 # Set up logging with more detailed format
 logging.basicConfig(
@@ -30,6 +41,43 @@ logger = logging.getLogger(__name__)
 # Minimum similarity score to consider a document relevant
 MINIMUM_RELEVANCE_THRESHOLD = 0.4  
 
+# Best reranker relevanceScore a "basic" depth web search must reach before we
+# skip the slower "advanced" search
+WEB_ESCALATION_THRESHOLD = 0.3
+# The same threshold for results scored by the local reranker fallback, whose
+# BM25 + cosine scores are not on Cohere's scale
+LOCAL_WEB_ESCALATION_THRESHOLD = float(os.getenv("LOCAL_WEB_ESCALATION_THRESHOLD", "0.35"))
+
+# What to do when a database answer fails verification:
+#   "merge"   - keep the reranked DB candidates that were not in the failed
+#               context, add web results (reranking only the new documents)
+#               and regenerate once from the merged set
+#   "restart" - discard the DB candidates and run the web path from scratch
+DB_FALLBACK_MODE = os.getenv("DB_FALLBACK_MODE", "merge")
+
+# Borderline band: when the best DB similarity is below
+# MINIMUM_RELEVANCE_THRESHOLD + this margin, the DB path often fails
+# verification, so the "basic" web search is started speculatively while the
+# DB candidates are reranked and answered. 0 disables speculation.
+SPECULATIVE_SEARCH_MARGIN = float(os.getenv("SPECULATIVE_SEARCH_MARGIN", "0.05"))
+
+_speculative_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix="speculative")
+
+# Pipeline modes, from most to least thorough. The degraded modes trade answer
+# checks for throughput and are selected per request or automatically when
+# the request queue grows (see RequestManager.pipeline_mode_for_load):
+#   grade         - run the hallucination/relevance graders (subject to the verification policy)
+#   small_model   - generate with each provider's smaller model
+#   web_fallback  - fall back to web search when the DB path is insufficient
+#   db_docs_limit - cap on documents in the answer context
+#   rerank_candidates - DB documents fetched for reranking with adaptive top-k
+#                  (without it, db_docs_limit documents are fetched)
+PIPELINE_MODES = {
+    "full": {"grade": True, "small_model": False, "web_fallback": True, "db_docs_limit": 5, "rerank_candidates": 12},
+    "fast": {"grade": False, "small_model": True, "web_fallback": True, "db_docs_limit": 3, "rerank_candidates": 6},
+    "db_only": {"grade": False, "small_model": True, "web_fallback": False, "db_docs_limit": 3, "rerank_candidates": 6},
+}
+
 class RagDocument(BaseModel):
     """Represents a single document returned by the RAG system."""
     id: Optional[str] = None
@@ -64,6 +112,10 @@ class RagAnswer(BaseModel):
         default=0.0,
         description="Total processing time in seconds"
     )
+    mode: str = Field(
+        default="full",
+        description="Pipeline mode the answer was produced in (full/fast/db_only)."
+    )
 
 # --- RAG Manager ---
 
@@ -86,20 +138,40 @@ class RAG:
         embedder: Optional[EmbeddingsManager] = None,
         search_manager: Optional[SearchManager] = None,
         reranker: Optional[ReRankManager] = None,
-        status_callback: Optional[Callable[[str], None]] = None
+        status_callback: Optional[Callable[[str], None]] = None,
+        writeback: Optional[WebWriteBack] = None,
+        verification_policy: Optional[VerificationPolicy] = None,
+        query_classifier: Optional["QueryClassifier"] = None
     ):
         """
         If the user doesn't provide these, we'll create them internally.
         :param status_callback: Optional callback function to receive status updates
+        :param writeback: Optional stage that stores web documents behind verified answers in the corpus
+        :param verification_policy: Decides when high-confidence DB answers may skip grading
+        :param query_classifier: Local pre-classifier deciding confident questions without the LLM validator
         """
         self.llm_manager = llm_manager or ModelManager()
         self.embedder = embedder or EmbeddingsManager()
         self.search_manager = search_manager or SearchManager()
-        self.reranker = reranker or ReRankManager()
+        self.reranker = reranker or ReRankManager(embedder=self.embedder)
         self.logger = logger
         self.similarity_threshold = 0.2
         self.db_docs_limit = 5
+        self.adaptive_topk = ADAPTIVE_TOPK
+        self.web_escalation_threshold = WEB_ESCALATION_THRESHOLD
+        self.local_web_escalation_threshold = LOCAL_WEB_ESCALATION_THRESHOLD
+        self.db_fallback_mode = DB_FALLBACK_MODE
+        self.speculative_search_margin = SPECULATIVE_SEARCH_MARGIN
+        self.pipeline_mode = "full"
+        self.mode_settings = PIPELINE_MODES["full"]
         self.status_callback = status_callback
+        self.writeback = writeback
+        self.verification_policy = verification_policy or get_verification_policy()
+        self.context_packer = ContextPacker()
+        from .rag_classifier import VALIDATOR_LOG_PATH, get_query_classifier  # deferred: loads numpy
+
+        self.query_classifier = query_classifier or get_query_classifier()
+        self.validator_log_path = VALIDATOR_LOG_PATH
         self.logger.info("RAG system initialized with components: LLM, Embedder, Search, Reranker")
 
     def _emit_status(self, status: ProcessingStatus):
@@ -108,17 +180,35 @@ class RAG:
             self.status_callback(status.value)
         self.logger.info(f"\n{'='*50}\nSTEP: {status}\n{'='*50}")
 
-    def process_query(self, question: str, status_callback = None) -> RagAnswer:
+    def process_query(self, question: str, status_callback = None, mode: str = "full") -> RagAnswer:
+        """
+        Process a question in the given pipeline mode (see PIPELINE_MODES) and
+        return an answer with supporting documents. Latency and throughput are
+        recorded per mode.
+        """
+        if mode not in PIPELINE_MODES:
+            raise ValueError(f"Unknown pipeline mode {mode!r}, expected one of {list(PIPELINE_MODES)}")
+        self.pipeline_mode = mode
+        self.mode_settings = PIPELINE_MODES[mode]
+        start_time = time.time()
+        result = self._process_query(question)
+        result.mode = mode
+        metrics.observe(f"mode.{mode}.latency", time.time() - start_time)
+        metrics.mark(f"mode.{mode}.completed")
+        return result
+
+    def _process_query(self, question: str) -> RagAnswer:
         """Process a question and return an answer with supporting documents."""
         process_start_time = time.time()
-        self.logger.info(f"\n{'='*50}\nSTEP: Starting RAG process\nQuestion: {question}\n{'='*50}")
+        self.logger.info(f"\n{'='*50}\nSTEP: Starting RAG process\nQuestion: {question}\nMode: {self.pipeline_mode}\n{'='*50}")
         
         try:
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.VALIDATING)
             
-            # Validate question
-            is_scientific = self._is_scientific_query(question)
+            # Validate question (a query embedding made for the classifier is reused for retrieval)
+            query_vector = self._embed_for_validation(question)
+            is_scientific = self._is_scientific_query(question, query_vector)
             self.logger.info(f"\n{'='*50}\nSTEP: Question validation completed\nResult: {'Scientific' if is_scientific else 'Not scientific'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
             
             if not is_scientific:
@@ -135,46 +225,61 @@ class RAG:
             # Database search
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.SEARCHING_DB)
-            db_docs = self._retrieve_local_docs(question)
+            db_docs = self._retrieve_local_docs(question, query_vector)
             self.logger.info(f"\n{'='*50}\nSTEP: Database search completed\nDocuments found: {len(db_docs)}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
             
             if not db_docs or self._all_docs_below_threshold(db_docs, self.similarity_threshold):
+                if not self.mode_settings["web_fallback"]:
+                    self.logger.info(f"\n{'='*50}\nSTEP: Insufficient database results, web search disabled in {self.pipeline_mode} mode\n{'='*50}")
+                    self._emit_status(ProcessingStatus.FAILED)
+                    return self._get_fallback_response(time.time() - process_start_time, from_websearch=False)
                 self.logger.info(f"\n{'='*50}\nSTEP: Insufficient database results, switching to web search\n{'='*50}")
                 self._emit_status(ProcessingStatus.SEARCHING_WEB)
                 return self._websearch_path(question)
             
+            speculative = self._start_speculative_search(question, db_docs)
+
             # Reranking
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.ANALYZING_PAPERS)
-            reranked_docs = self._rerank_docs(question, db_docs)
-            self.logger.info(f"\n{'='*50}\nSTEP: Document reranking completed\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+            candidates = self._select_rerank_candidates(db_docs)
+            reranked_candidates = self._rerank_docs(question, candidates)
+            reranked_docs = self._select_context_docs(reranked_candidates)
+            self.logger.info(f"\n{'='*50}\nSTEP: Document reranking completed\nDocuments: {len(db_docs)} retrieved, {len(candidates)} reranked, {len(reranked_docs)} in context\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
             
             # Answer generation
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.PREPARING_ANSWER)
-            answer = self._generate_answer(question, reranked_docs)
+            context_docs = self._pack_context(question, reranked_docs)
+            answer = self._generate_answer(question, context_docs)
             self.logger.info(f"\n{'='*50}\nSTEP: Answer generation completed\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
             
             # Answer verification
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.CHECKING_ANSWER)
+            verification = self.verification_policy.decide(reranked_docs, grading_enabled=self.mode_settings["grade"])
+            self.logger.info(f"\n{'='*50}\nSTEP: Verification decision: {verification['action']}\nReason: {verification['reason']}\nBest relevance: {verification['relevance']:.3f}, best similarity: {verification['similarity']:.3f}\n{'='*50}")
             
-            hallucination_check = self._grade_hallucination(answer, reranked_docs)
-            self.logger.info(f"\n{'='*50}\nSTEP: Hallucination check completed\nResult: {'Passed' if hallucination_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
-            
-            if not hallucination_check:
-                self.logger.warning(f"\n{'='*50}\nSTEP: Answer failed hallucination check, falling back to web search\n{'='*50}")
-                self._emit_status(ProcessingStatus.SEARCHING_WEB)
-                return self._websearch_path(question)
-
-            relevance_check = self._grade_answer_relevance(question, answer)
-            self.logger.info(f"\n{'='*50}\nSTEP: Relevance check completed\nResult: {'Passed' if relevance_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
-            
-            if not relevance_check:
-                self.logger.warning(f"\n{'='*50}\nSTEP: Answer failed relevance check, falling back to web search\n{'='*50}")
-                self._emit_status(ProcessingStatus.SEARCHING_WEB)
-                return self._websearch_path(question)
+            if verification["action"] != "skip":
+                hallucination_check = self._grade_hallucination(answer, context_docs)
+                self.logger.info(f"\n{'='*50}\nSTEP: Hallucination check completed\nResult: {'Passed' if hallucination_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+                
+                if not hallucination_check:
+                    self.verification_policy.record(verification, passed=False)
+                    self.logger.warning(f"\n{'='*50}\nSTEP: Answer failed hallucination check, falling back to web search\n{'='*50}")
+                    self._emit_status(ProcessingStatus.SEARCHING_WEB)
+                    return self._db_fallback(question, reranked_candidates, speculative, failed_docs=reranked_docs)
+
+                relevance_check = self._grade_answer_relevance(question, answer)
+                self.logger.info(f"\n{'='*50}\nSTEP: Relevance check completed\nResult: {'Passed' if relevance_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+                self.verification_policy.record(verification, passed=relevance_check)
+                
+                if not relevance_check:
+                    self.logger.warning(f"\n{'='*50}\nSTEP: Answer failed relevance check, falling back to web search\n{'='*50}")
+                    self._emit_status(ProcessingStatus.SEARCHING_WEB)
+                    return self._db_fallback(question, reranked_candidates, speculative, failed_docs=reranked_docs)
             
+            self._discard_speculative_search(speculative)
             self._emit_status(ProcessingStatus.COMPLETED)
             
             # Return final answer
@@ -184,7 +289,7 @@ class RAG:
             
             return RagAnswer(
                 answer=answer,
-                documents=self._to_rag_docs(reranked_docs),
+                documents=self._to_rag_docs([d["original"] for d in context_docs]),
                 from_websearch=False,
                 processing_time=total_time
             )
@@ -196,44 +301,80 @@ class RAG:
 
     # ---------------- Internal steps -----------------
 
-    def _is_scientific_query(self, query: str) -> bool:
+    def _embed_for_validation(self, query: str) -> Optional["np.ndarray"]:
+        """
+        Query embedding for the local classifier and the verdict log, or None
+        when neither is in use. A failed embedding request leaves the decision
+        to the LLM validator; retrieval then embeds the question itself.
+        """
+        if self.query_classifier is None and not self.validator_log_path:
+            return None
+        try:
+            return self.embedder.get_embedding_vector(query)
+        except Exception as e:
+            metrics.increment("validation.embedding_failed")
+            self.logger.warning(f"Could not embed question for validation: {str(e)}")
+            return None
+
+    def _is_scientific_query(self, query: str, query_vector: Optional["np.ndarray"] = None) -> bool:
         """
-        Uses the LLM with SCIENTIFIC_QUERY_VALIDATOR_SYSTEM to determine if query is 'VALID' or 'INVALID'.
+        Asks the local query classifier first (if one is trained); only questions
+        in its uncertain band go to the LLM with SCIENTIFIC_QUERY_VALIDATOR_PROMPT
+        to determine if query is 'VALID' or 'INVALID'.
         Returns True if 'VALID', else False.
         """
-        system_prompt = SCIENTIFIC_QUERY_VALIDATOR_SYSTEM
+        if self.query_classifier is not None and query_vector is not None:
+            verdict = self.query_classifier.decide(query_vector)
+            if verdict is not None:
+                metrics.increment(f"validation.classifier.{'valid' if verdict else 'invalid'}")
+                self.logger.info(f"Question classified locally as {'scientific' if verdict else 'not scientific'}")
+                return verdict
+            metrics.increment("validation.classifier.uncertain")
+
+        start_time = time.time()
         resp: ModelResponse = self.llm_manager.prompt(
-            prompt_text=query,
-            system_prompt=system_prompt,
+            messages=SCIENTIFIC_QUERY_VALIDATOR_PROMPT.render(question=query),
             temperature=0.2
         )
+        latency = time.time() - start_time
+        metrics.observe("validation.llm.latency", latency)
         # The validator returns "VALID" or "INVALID" at the start of content
-        return resp.content.strip().startswith("VALID")
+        is_valid = resp.content.strip().startswith("VALID")
+        if self.validator_log_path and query_vector is not None:
+            from .rag_classifier import log_verdict
+
+            try:
+                log_verdict(self.validator_log_path, query, query_vector, is_valid, latency)
+            except OSError as e:
+                self.logger.warning(f"Could not log validator verdict: {str(e)}")
+        return is_valid
 
     def _rewrite_query(self, query: str) -> str:
         """
         Rewrites the user's query for better embedding-based retrieval (e.g. synonyms, more precise).
         Using the QUERY_REWRITER_PROMPT from rag_prompts.
         """
-        # Assuming QUERY_REWRITER_PROMPT is a string template or has a format method
-        prompt_text = QUERY_REWRITER_PROMPT.format(question=query)
-        
         resp = self.llm_manager.prompt(
-            prompt_text=prompt_text, 
+            messages=QUERY_REWRITER_PROMPT.render(question=query),
             temperature=0.3
         )
         return resp.content.strip()
 
-    def _retrieve_local_docs(self, rewritten_query: str) -> List[Dict[str, Any]]:
+    def _retrieve_local_docs(self, rewritten_query: str, query_vector: Optional["np.ndarray"] = None) -> List[Dict[str, Any]]:
         """
         Retrieve from DB using Supabase RPC function. Returns a list of doc dictionaries
         with fields: content, similarity, etc.
         """
-        # Get docs from retrieve_documents
+        # Get docs from retrieve_documents (over-fetched for adaptive top-k)
+        limit = min(self.db_docs_limit, self.mode_settings["db_docs_limit"])
+        if self.adaptive_topk:
+            limit = max(limit, self.mode_settings["rerank_candidates"])
         docs = retrieve_documents(
             user_query=rewritten_query,
-            limit=self.db_docs_limit,
-            min_similarity=self.similarity_threshold
+            limit=limit,
+            min_similarity=self.similarity_threshold,
+            embedder=self.embedder,
+            query_vector=query_vector
         )
         
         # Filter out low-relevance documents
@@ -260,56 +401,72 @@ class RAG:
 
     def _rerank_docs(self, query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
         """
-        Rerank using Cohere. 
+        Rerank using Cohere (or the local reranker when Cohere is down or disabled).
         The doc structure must have doc["content"] for ReRankManager to handle it.
         """
         reranked = self.reranker.rerank_documents(query, docs, top_n=len(docs))
         return reranked
 
+    def _select_rerank_candidates(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Adaptive top-k, stage 1: every over-fetched DB document (at most
+        rerank_candidates) is reranked. Cosine similarities above the
+        relevance floor are too close together to cut on without losing
+        recall, so the adaptive cut is only applied to relevanceScores.
+        """
+        limit = self.mode_settings["rerank_candidates"] if self.adaptive_topk else len(docs)
+        candidates = docs[:limit]
+        metrics.observe("topk.rerank_k", len(candidates))
+        return candidates
+
+    def _select_context_docs(self, reranked: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Adaptive top-k, stage 2: cut reranked documents where their
+        relevanceScores drop off, at most db_docs_limit of them. Questions
+        with one or two clearly relevant documents send fewer to the LLM.
+        The gap and mass cuts are tuned for Cohere scores, so documents
+        scored by the local reranker keep the fixed db_docs_limit instead.
+        The document counts are recorded either way, so runs with and
+        without ADAPTIVE_TOPK can be compared in /stats.
+        """
+        docs = reranked
+        if self.adaptive_topk:
+            max_k = min(self.db_docs_limit, self.mode_settings["db_docs_limit"])
+            if reranked_locally(reranked):
+                docs = reranked[:max_k]
+            else:
+                docs = cut_by_score(reranked, "relevanceScore", max_k=max_k)
+        metrics.observe("topk.context_k", len(docs))
+        return docs
+
+    def _pack_context(self, user_query: str, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Fit docs into the context budget of the models that may answer in this
+        mode. The packed docs are what the answer and the hallucination
+        grader see; their "original" docs are returned to the user.
+        """
+        budget = context_budget(self.llm_manager.model_ids(small_model=self.mode_settings["small_model"]))
+        return self.context_packer.pack(user_query, docs, budget)
+
     def _generate_answer(self, user_query: str, docs: List[Dict[str, Any]]) -> str:
         """
-        Uses the LLM to generate an answer from the given docs. 
+        Uses the LLM to generate an answer from the given (packed) docs. 
         """
         # Build a context string from docs with proper citations
-        context_str = ""
-        for i, doc in enumerate(docs):
-            snippet = doc.get("content", "")
-            title = doc.get("title", "Untitled")
-            url = doc.get("url", "")
-            metadata = doc.get("metadata", {})
-            
-            # Format authors if available
-            authors = metadata.get("authors", [])
-            author_str = ", ".join([" ".join(author).strip() for author in authors]) if authors else "No authors listed"
-            
-            # Get journal information
-            journal_info = []
-            if metadata.get("journal_title"):
-                journal_info.append(metadata["journal_title"])
-            if metadata.get("journal_ref"):
-                journal_info.append(metadata["journal_ref"])
-            journal_str = " - ".join(journal_info) if journal_info else ""
-            
-            # Add date if available
-            date = metadata.get("date", "")
-            
-            context_str += (
-                f"[Doc {i+1}]: {snippet}\n"
-                f"Title: {title}\n"
-                f"Authors: {author_str}\n"
-                f"Journal: {journal_str}\n"
-                f"Date: {date}\n"
-                f"URL: {url}\n\n"
-            )
+        context_str = "".join(format_doc(i, doc) for i, doc in enumerate(docs))
 
-        # Modify RAG_PROMPT to request proper citations
-        modified_prompt = RAG_PROMPT.format(
+        # RAG_PROMPT's system message carries the citation instructions
+        messages = RAG_PROMPT.render(
             context=context_str,
             question=user_query
-        )  
+        )
 
         # Now call the LLM
-        resp = self.llm_manager.prompt(prompt_text=modified_prompt, temperature=0.5)
+        resp = self.llm_manager.prompt(
+            messages=messages,
+            temperature=0.5,
+            small_model=self.mode_settings["small_model"]
+        )
         return resp.content.strip()
 
     def _grade_hallucination(self, generation: str, docs: List[Dict[str, Any]]) -> bool:
@@ -320,12 +477,12 @@ class RAG:
         for i, d in enumerate(docs):
             doc_str += f"[Doc {i+1}]: {d['content']}\n\n"
 
-        grader_prompt = HALLUCINATION_GRADER_PROMPT.format(
+        messages = HALLUCINATION_GRADER_PROMPT.render(
             documents=doc_str,
             generation=generation
         )
 
-        resp = self.llm_manager.prompt(grader_prompt, temperature=0.0)
+        resp = self.llm_manager.prompt(messages=messages, temperature=0.0)
         answer = resp.content.strip().lower()
         return answer.startswith("yes")
 
@@ -333,71 +490,159 @@ class RAG:
         """
         Uses the ANSWER_GRADER_PROMPT to see if the LLM's generation actually answers the question.
         """
-        grader_prompt = ANSWER_GRADER_PROMPT.format(
+        messages = ANSWER_GRADER_PROMPT.render(
             question=question,
             generation=generation
         )
-        resp = self.llm_manager.prompt(grader_prompt, temperature=0.0)
+        resp = self.llm_manager.prompt(messages=messages, temperature=0.0)
         answer = resp.content.strip().lower()
         return answer.startswith("yes")
 
-    def _websearch_path(self, query: str) -> RagAnswer:
+    def _db_fallback(
+        self,
+        query: str,
+        db_docs: List[Dict[str, Any]],
+        speculative: Optional[Future] = None,
+        failed_docs: Optional[List[Dict[str, Any]]] = None
+    ) -> RagAnswer:
+        """
+        Web fallback after a database answer failed verification, according to
+        db_fallback_mode. In "merge" mode the DB candidates that were in the
+        failed context (failed_docs) are left out, so the regenerated answer is
+        never built from the same documents again.
+        """
+        if not self.mode_settings["web_fallback"]:
+            self._discard_speculative_search(speculative)
+            self._emit_status(ProcessingStatus.FAILED)
+            return self._get_fallback_response(from_websearch=False)
+        metrics.increment(f"fallback.{self.db_fallback_mode}")
+        if self.db_fallback_mode == "merge":
+            failed_keys = {(d.get("id"), d.get("url")) for d in failed_docs or []}
+            unused_docs = [d for d in db_docs if (d.get("id"), d.get("url")) not in failed_keys]
+            return self._websearch_path(query, db_docs=unused_docs, speculative=speculative)
+        return self._websearch_path(query, speculative=speculative)
+
+    def _start_speculative_search(self, query: str, db_docs: List[Dict[str, Any]]) -> Optional[Future]:
+        """
+        Start the "basic" web search in the background if the best DB similarity
+        is in the borderline band. The search manager's quota policy may still
+        decline it (the future then yields None).
+        """
+        if self.speculative_search_margin <= 0 or not self.mode_settings["web_fallback"]:
+            return None
+        best_similarity = max((d.get("similarity", 0.0) for d in db_docs), default=0.0)
+        if best_similarity >= MINIMUM_RELEVANCE_THRESHOLD + self.speculative_search_margin:
+            return None
+        metrics.increment("speculative_search.started")
+        self.logger.info(f"\n{'='*50}\nSTEP: Borderline DB similarity ({best_similarity:.3f}), starting speculative web search\n{'='*50}")
+        return _speculative_pool.submit(self.search_manager.speculative_search, query, 5, "basic")
+
+    def _discard_speculative_search(self, speculative: Optional[Future]) -> None:
+        """The DB answer was accepted: cancel the search if it has not started (a running one finishes into the cache)."""
+        if speculative is None:
+            return
+        if speculative.cancel():
+            metrics.increment("speculative_search.cancelled")
+        else:
+            metrics.increment("speculative_search.unused")
+
+    def _combine_reranked(
+        self,
+        query: str,
+        first: List[Dict[str, Any]],
+        second: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Documents from two rerank calls for the same query, by descending
+        relevanceScore. If only one call was answered by the local reranker
+        (the Cohere breaker tripped in between) the two sets of scores are on
+        different scales, so the union is rescored locally before sorting.
+        """
+        combined = first + second
+        if first and second and reranked_locally(first) != reranked_locally(second):
+            metrics.increment("rerank.rescored_locally")
+            return self.reranker.local_reranker.rerank_documents(query, combined)
+        return sorted(combined, key=lambda d: d.get("relevanceScore", 0.0), reverse=True)
+
+    def _merge_candidates(
+        self,
+        query: str,
+        db_docs: List[Dict[str, Any]],
+        web_docs: List[Dict[str, Any]]
+    ) -> List[Dict[str, Any]]:
+        """
+        Merge already reranked DB candidates with reranked web documents. Both
+        carry relevanceScores for the same query, so they are compared directly
+        (after rescoring if only one side was reranked locally); web documents
+        whose URL is already present are dropped.
+        """
+        seen_urls = {d.get("url") for d in db_docs if d.get("url")}
+        new_web_docs = [d for d in web_docs if not d.get("url") or d.get("url") not in seen_urls]
+        return self._combine_reranked(query, db_docs, new_web_docs)[:self.reranker.default_top_n]
+
+    def _websearch_path(
+        self,
+        query: str,
+        db_docs: Optional[List[Dict[str, Any]]] = None,
+        speculative: Optional[Future] = None
+    ) -> RagAnswer:
         """
         Fallback path using web search when database results are insufficient.
+        If db_docs (reranked DB candidates) are given, they are merged with the
+        web results instead of being discarded, and the answer is regenerated
+        once from the merged set. A speculative search already started for this
+        query is used as the "basic" search.
         Returns a RagAnswer with documents from web search.
         """
         websearch_start_time = time.time()
         self.logger.info(f"\n{'='*50}\nSTEP: Starting web search fallback path\n{'='*50}")
         
         try:
-            # 1) Web search
+            # 1) Web search + 2) Rerank (basic depth first, escalating if needed)
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.SEARCHING_WEB)
-            search_docs = self.search_manager.search(query, results=5)
-            self.logger.info(f"\n{'='*50}\nSTEP: Web search completed\nDocuments found: {len(search_docs)}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
-            
-            # Convert to dict for reranker
-            docs_dicts = []
-            for d in search_docs:
-                docs_dicts.append({
-                    "content": d.page_content,
-                    "title": d.metadata.get("title", ""),
-                    "url": d.metadata.get("url", ""),
-                    "provider": d.metadata.get("search_provider", ""),
-                    "date": d.metadata.get("search_date", "")  
-                })
-
-            if not docs_dicts:
+            reranked = self._tiered_web_search(query, speculative)
+            self.logger.info(f"\n{'='*50}\nSTEP: Web search and reranking completed\nDocuments found: {len(reranked)}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+
+            if not reranked:
                 self.logger.warning(f"\n{'='*50}\nSTEP: Web search returned no results\n{'='*50}")
                 self._emit_status(ProcessingStatus.FAILED)
                 return self._get_fallback_response(time.time() - websearch_start_time)
 
-            # 2) Rerank
-            step_start_time = time.time()
-            self._emit_status(ProcessingStatus.RERANKING_RESULTS)
-            reranked = self.reranker.rerank_documents(query, docs_dicts, top_n=len(docs_dicts))
-            self.logger.info(f"\n{'='*50}\nSTEP: Web result reranking completed\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+            if db_docs:
+                reranked = self._merge_candidates(query, db_docs, reranked)
+                kept = sum(1 for d in reranked if not d.get("provider"))
+                self.logger.info(f"\n{'='*50}\nSTEP: Merged DB and web candidates\nKept from DB: {kept}/{len(reranked)}\n{'='*50}")
+            reranked = self._select_context_docs(reranked)
 
             # 3) Generate answer
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.PREPARING_ANSWER)
-            final_answer = self._generate_answer(query, reranked)
+            context_docs = self._pack_context(query, reranked)
+            final_answer = self._generate_answer(query, context_docs)
             self.logger.info(f"\n{'='*50}\nSTEP: Answer generation from web results completed\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
 
             # 4) Grade for hallucination & correctness
             step_start_time = time.time()
             self._emit_status(ProcessingStatus.CHECKING_ANSWER)
             
-            hallucination_check = self._grade_hallucination(final_answer, reranked)
-            self.logger.info(f"\n{'='*50}\nSTEP: Web answer hallucination check completed\nResult: {'Passed' if hallucination_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
-            
-            relevance_check = self._grade_answer_relevance(query, final_answer)
-            self.logger.info(f"\n{'='*50}\nSTEP: Web answer relevance check completed\nResult: {'Passed' if relevance_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
-            
-            if not hallucination_check or not relevance_check:
-                self.logger.warning(f"\n{'='*50}\nSTEP: Web search answer failed quality checks\n{'='*50}")
-                self._emit_status(ProcessingStatus.FAILED)
-                return self._get_fallback_response(time.time() - websearch_start_time)
+            if self.mode_settings["grade"]:
+                hallucination_check = self._grade_hallucination(final_answer, context_docs)
+                self.logger.info(f"\n{'='*50}\nSTEP: Web answer hallucination check completed\nResult: {'Passed' if hallucination_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+                
+                relevance_check = self._grade_answer_relevance(query, final_answer)
+                self.logger.info(f"\n{'='*50}\nSTEP: Web answer relevance check completed\nResult: {'Passed' if relevance_check else 'Failed'}\nTime taken: {time.time() - step_start_time:.2f}s\n{'='*50}")
+                
+                if not hallucination_check or not relevance_check:
+                    self.logger.warning(f"\n{'='*50}\nSTEP: Web search answer failed quality checks\n{'='*50}")
+                    self._emit_status(ProcessingStatus.FAILED)
+                    return self._get_fallback_response(time.time() - websearch_start_time)
+            else:
+                self.logger.info(f"\n{'='*50}\nSTEP: Web answer checks skipped in {self.pipeline_mode} mode\n{'='*50}")
+
+            # Verified: let the documents migrate to the database path
+            if self.writeback and self.mode_settings["grade"]:
+                self.writeback.submit(query, [d for d in reranked if d.get("provider")])
 
             # Return successful result
             total_time = time.time() - websearch_start_time
@@ -405,7 +650,7 @@ class RAG:
             
             return RagAnswer(
                 answer=final_answer,
-                documents=self._to_rag_docs(reranked),
+                documents=self._to_rag_docs([d["original"] for d in context_docs]),
                 from_websearch=True,
                 processing_time=total_time
             )
@@ -415,12 +660,84 @@ class RAG:
             self.logger.error(f"\n{'='*50}\nERROR: Web search path failed\nReason: {str(e)}\nTime taken: {end_time - websearch_start_time:.2f}s\n{'='*50}")
             return self._get_fallback_response(processing_time=end_time - websearch_start_time)
 
-    def _get_fallback_response(self, processing_time: float = 0.0) -> RagAnswer:
+    def _search_web_docs(self, query: str, depth: str) -> List[Dict[str, Any]]:
+        """Run a web search and convert the results to doc dicts for the reranker."""
+        return self._web_docs_to_dicts(self.search_manager.search(query, results=5, depth=depth))
+
+    def _web_docs_to_dicts(self, search_docs: List[Any]) -> List[Dict[str, Any]]:
+        """Convert search results (LC documents) to doc dicts for the reranker."""
+        return [
+            {
+                "content": d.page_content,
+                "title": d.metadata.get("title", ""),
+                "url": d.metadata.get("url", ""),
+                "provider": d.metadata.get("search_provider", ""),
+                "date": d.metadata.get("search_date", "")
+            }
+            for d in search_docs
+        ]
+
+    def _speculative_or_basic_search(self, query: str, speculative: Optional[Future]) -> List[Dict[str, Any]]:
+        """The speculative search's results if it ran, otherwise a normal "basic" search."""
+        if speculative is not None:
+            try:
+                search_docs = speculative.result()
+            except Exception as e:
+                self.logger.warning(f"Speculative web search failed: {str(e)}")
+                search_docs = None
+            if search_docs is not None:
+                metrics.increment("speculative_search.used")
+                return self._web_docs_to_dicts(search_docs)
+            metrics.increment("speculative_search.declined")
+        return self._search_web_docs(query, depth="basic")
+
+    def _tiered_web_search(self, query: str, speculative: Optional[Future] = None) -> List[Dict[str, Any]]:
+        """
+        Search the web at "basic" depth first and rerank. Only if the best
+        relevanceScore is below web_escalation_threshold (or
+        local_web_escalation_threshold when the local reranker scored them),
+        search again at "advanced" depth (the rotation may also move to
+        another provider), rerank just the new documents and merge them in.
+        The decision is recorded in metrics so the thresholds can be tuned.
+        """
+        step_start_time = time.time()
+        basic_docs = self._speculative_or_basic_search(query, speculative)
+        self._emit_status(ProcessingStatus.RERANKING_RESULTS)
+        reranked = self.reranker.rerank_documents(query, basic_docs, top_n=len(basic_docs)) if basic_docs else []
+        best_score = max((d.get("relevanceScore", 0.0) for d in reranked), default=0.0)
+        metrics.observe("web_search.basic.latency", time.time() - step_start_time)
+        metrics.observe("web_search.basic.best_score", best_score)
+
+        threshold = self.local_web_escalation_threshold if reranked_locally(reranked) else self.web_escalation_threshold
+        if reranked and best_score >= threshold:
+            metrics.increment("web_search.tier.basic_accepted")
+            self.logger.info(f"\n{'='*50}\nSTEP: Basic web search accepted\nBest relevance: {best_score:.3f}\n{'='*50}")
+            return reranked
+
+        metrics.increment("web_search.tier.escalated")
+        self.logger.info(f"\n{'='*50}\nSTEP: Escalating to advanced web search\nBest basic relevance: {best_score:.3f} (threshold {threshold})\n{'='*50}")
+        step_start_time = time.time()
+        seen_urls = {d.get("url") for d in reranked if d.get("url")}
+        advanced_docs = [
+            d for d in self._search_web_docs(query, depth="advanced")
+            if not d.get("url") or d.get("url") not in seen_urls
+        ]
+        if advanced_docs:
+            advanced_reranked = self.reranker.rerank_documents(query, advanced_docs, top_n=len(advanced_docs))
+            reranked = self._combine_reranked(query, reranked, advanced_reranked)[:self.reranker.default_top_n]
+        escalated_best = max((d.get("relevanceScore", 0.0) for d in reranked), default=0.0)
+        metrics.observe("web_search.advanced.latency", time.time() - step_start_time)
+        metrics.observe("web_search.advanced.best_score", escalated_best)
+        if escalated_best > best_score:
+            metrics.increment("web_search.tier.escalation_improved")
+        return reranked
+
+    def _get_fallback_response(self, processing_time: float = 0.0, from_websearch: bool = True) -> RagAnswer:
         """Returns a standard fallback response when we can't provide a reliable answer."""
         return RagAnswer(
             answer="I apologize, but I don't have enough reliable information to answer this question accurately.",
             documents=[],
-            from_websearch=True,
+            from_websearch=from_websearch,
             processing_time=processing_time
         )
 
@@ -458,7 +775,7 @@ class RAG:
                 date=date,
                 journal_ref=metadata.get("journal_ref"),
                 journal_title=metadata.get("journal_title"),
-                authors=metadata.get("authors")
+                authors=split_authors(metadata.get("authors")) or None
             ))
         return rag_docs
 
@@ -0,0 +1,223 @@
+# rag_classifier.py
+import os
+import json
+import base64
+import threading
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+from dotenv import load_dotenv
+
+from .rag_vectors import decode_base64_float32
+
+load_dotenv()
+
+# Trained classifier (see __main__); unset or missing means every question
+# goes to the LLM validator
+QUERY_CLASSIFIER_PATH = os.getenv("QUERY_CLASSIFIER_PATH", "")
+# JSONL file the LLM validator's verdicts are appended to, as training data
+VALIDATOR_LOG_PATH = os.getenv("VALIDATOR_LOG_PATH", "")
+# Agreement with the LLM validator required on the questions the classifier decides
+TARGET_AGREEMENT = 0.98
+
+_log_lock = threading.Lock()
+
+
+def log_verdict(path: str, question: str, vector: np.ndarray, valid: bool, latency: float) -> None:
+    """Append one LLM validator verdict with its query embedding (base64 float32)."""
+    record = {
+        "question": question,
+        "embedding": base64.b64encode(np.asarray(vector, dtype="<f4").tobytes()).decode("ascii"),
+        "valid": valid,
+        "latency": latency,
+    }
+    with _log_lock:
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def read_verdicts(path: str) -> Iterator[Dict[str, Any]]:
+    """Records written by log_verdict, with the embedding decoded."""
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                record["embedding"] = decode_base64_float32(record["embedding"])
+                yield record
+
+
+class QueryClassifier:
+    """
+    Logistic regression over the query embedding that predicts the LLM
+    validator's verdict. Questions scoring at or above `high` are accepted and
+    at or below `low` rejected without an LLM call; the band in between is
+    left to the validator. Both thresholds are chosen on held-out verdicts so
+    the decided questions agree with the LLM at TARGET_AGREEMENT or better.
+    """
+
+    def __init__(self, weights: np.ndarray, bias: float, low: float = 0.0, high: float = 1.0):
+        self.weights = np.asarray(weights, dtype=np.float32)
+        self.bias = float(bias)
+        self.low = low
+        self.high = high
+
+    @classmethod
+    def fit(cls, vectors: np.ndarray, labels: np.ndarray, l2: float = 1e-3,
+            epochs: int = 300, learning_rate: float = 1.0) -> "QueryClassifier":
+        """Full-batch gradient descent on the L2-regularized logistic loss."""
+        x = _normalize(vectors)
+        y = np.asarray(labels, dtype=np.float32)
+        weights = np.zeros(x.shape[1], dtype=np.float32)
+        bias = 0.0
+        for _ in range(epochs):
+            p = _sigmoid(x @ weights + bias)
+            error = p - y
+            weights -= learning_rate * (x.T @ error / len(y) + l2 * weights)
+            bias -= learning_rate * float(error.mean())
+        return cls(weights, bias)
+
+    def probabilities(self, vectors: np.ndarray) -> np.ndarray:
+        """P(valid) for each vector."""
+        return _sigmoid(_normalize(vectors) @ self.weights + self.bias)
+
+    def calibrate(self, vectors: np.ndarray, labels: np.ndarray, target: float = TARGET_AGREEMENT) -> None:
+        """
+        Pick the widest thresholds at which the questions decided on each side
+        agree with the labels at `target` or better.
+        """
+        p = self.probabilities(vectors)
+        labels = np.asarray(labels, dtype=bool)
+        self.high = _threshold(-p, labels, target, above=True)
+        self.low = min(_threshold(p, ~labels, target, above=False), self.high)
+
+    def decide(self, vector: np.ndarray) -> Optional[bool]:
+        """
+        True (scientific), False (not scientific) or None (uncertain: ask the
+        LLM). Embeddings of another size than the classifier was trained on
+        (e.g. after changing EMBEDDING_DIMENSIONS) are always uncertain.
+        """
+        if np.shape(vector)[-1] != len(self.weights):
+            return None
+        p = float(self.probabilities(vector)[0])
+        if p >= self.high:
+            return True
+        if p <= self.low:
+            return False
+        return None
+
+    def save(self, path: str) -> None:
+        np.savez(path, weights=self.weights, bias=self.bias, low=self.low, high=self.high)
+
+    @classmethod
+    def load(cls, path: str) -> "QueryClassifier":
+        data = np.load(path)
+        return cls(data["weights"], float(data["bias"]), float(data["low"]), float(data["high"]))
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _sigmoid(z: np.ndarray) -> np.ndarray:
+    return 1.0 / (1.0 + np.exp(-np.clip(z, -30, 30)))
+
+
+def _threshold(keys: np.ndarray, correct: np.ndarray, target: float, above: bool) -> float:
+    """
+    Sort by keys (ascending = most confident first) and extend the decided
+    region until the agreement of the next window of questions drops below
+    target. Using a moving window rather than the cumulative rate keeps a very
+    confident core from paying for a poor margin. With above=True, keys are -p
+    and the threshold is a lower bound on p; otherwise an upper bound.
+    """
+    never = 1.01 if above else -0.01
+    order = np.argsort(keys, kind="stable")
+    window = max(20, len(order) // 20)
+    if len(order) < window:
+        return never
+    local = np.convolve(correct[order].astype(np.float32), np.ones(window) / window, mode="valid")
+    failing = np.nonzero(local < target)[0]
+    cutoff = failing[0] if len(failing) else len(order)
+    if cutoff == 0:
+        return never
+    value = keys[order[cutoff - 1]]
+    return float(-value if above else value)
+
+
+_classifier: Optional[QueryClassifier] = None
+_classifier_lock = threading.Lock()
+
+
+def get_query_classifier() -> Optional[QueryClassifier]:
+    """Process-wide classifier loaded from QUERY_CLASSIFIER_PATH, or None if there is none."""
+    global _classifier
+    if _classifier is None and QUERY_CLASSIFIER_PATH and os.path.exists(QUERY_CLASSIFIER_PATH):
+        with _classifier_lock:
+            if _classifier is None:
+                _classifier = QueryClassifier.load(QUERY_CLASSIFIER_PATH)
+    return _classifier
+
+
+def evaluate(classifier: QueryClassifier, records: List[Dict[str, Any]]) -> Dict[str, float]:
+    """Coverage, agreement with the LLM on decided questions, and LLM latency saved."""
+    import time
+
+    if not records:
+        raise ValueError("No verdicts to evaluate")
+    vectors = np.stack([r["embedding"] for r in records])
+    start = time.perf_counter()
+    decisions = [classifier.decide(v) for v in vectors]
+    classifier_seconds = (time.perf_counter() - start) / len(records)
+
+    decided = [(d, r) for d, r in zip(decisions, records) if d is not None]
+    agreed = sum(1 for d, r in decided if d == r["valid"])
+    llm_latency = float(np.mean([r.get("latency", 0.0) for r in records]))
+    coverage = len(decided) / len(records)
+    return {
+        "questions": len(records),
+        "coverage": coverage,
+        "agreement": agreed / len(decided) if decided else 1.0,
+        "classifier_us": classifier_seconds * 1e6,
+        "llm_latency_s": llm_latency,
+        "latency_saved_s": coverage * llm_latency - classifier_seconds,
+    }
+
+
+def train_test_split(records: List[Dict[str, Any]], test_fraction: float, seed: int = 0) -> Tuple[list, list]:
+    order = np.random.default_rng(seed).permutation(len(records))
+    cut = int(len(records) * (1 - test_fraction))
+    return [records[i] for i in order[:cut]], [records[i] for i in order[cut:]]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(
+        description="Train the query pre-classifier from logged validator verdicts (VALIDATOR_LOG_PATH) and report agreement and latency saved."
+    )
+    parser.add_argument("verdicts", help="JSONL file written by the validator log")
+    parser.add_argument("--out", default="query_classifier.npz", help="Where to save the classifier")
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="Held-out share for evaluation")
+    parser.add_argument("--target-agreement", type=float, default=TARGET_AGREEMENT)
+    args = parser.parse_args()
+
+    records = list(read_verdicts(args.verdicts))
+    train, test = train_test_split(records, args.test_fraction)
+    # Thresholds are calibrated on part of the training data, not on the test set
+    fit_set, calibration_set = train_test_split(train, 0.25, seed=1)
+    if not (fit_set and calibration_set and test):
+        parser.error(f"{args.verdicts} has {len(records)} verdicts, too few to train, calibrate and evaluate")
+    stack = lambda rows: (np.stack([r["embedding"] for r in rows]), np.array([r["valid"] for r in rows]))
+
+    classifier = QueryClassifier.fit(*stack(fit_set))
+    classifier.calibrate(*stack(calibration_set), target=args.target_agreement)
+    report = evaluate(classifier, test)
+    classifier.save(args.out)
+
+    print(f"Trained on {len(fit_set)} verdicts, calibrated on {len(calibration_set)}, evaluated on {len(test)}")
+    print(f"Thresholds: reject <= {classifier.low:.3f}, accept >= {classifier.high:.3f}")
+    print(f"Decided locally: {report['coverage']:.1%} of questions, agreement with LLM {report['agreement']:.1%}")
+    print(f"Classifier {report['classifier_us']:.0f} us/question vs LLM validator {report['llm_latency_s']:.2f}s; "
+          f"saves {report['latency_saved_s']:.2f}s per question on average")
+    print(f"Saved to {args.out}; set QUERY_CLASSIFIER_PATH to use it")
@@ -0,0 +1,273 @@
+# rag_context.py
+import os
+import re
+import math
+import time
+import logging
+import threading
+from collections import Counter
+from typing import Any, Dict, List, Sequence
+
+from dotenv import load_dotenv
+
+from .rag_metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Tokens of document context per prompt. Bounded by the smallest context
+# window of the models that may serve the prompt, minus room for the prompt
+# template and the answer.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "2500"))
+CONTEXT_WINDOWS = {
+    "llama-3.3-70b": 8192,
+    "llama3.1-8b": 8192,
+    "llama-3.3-70b-specdec": 8192,
+    "llama-3.1-8b-instant": 8192,
+    "accounts/fireworks/models/llama-v3p3-70b-instruct": 131072,
+    "accounts/fireworks/models/llama-v3p1-8b-instruct": 131072,
+    "Meta-Llama-3.3-70B-Instruct": 8192,
+    "Meta-Llama-3.1-8B-Instruct": 8192,
+}
+DEFAULT_CONTEXT_WINDOW = 8192
+PROMPT_RESERVE_TOKENS = 1024   # prompt template and question
+ANSWER_RESERVE_TOKENS = 1024   # generated answer
+
+MAX_AUTHORS = 3                # authors listed per document, then "et al."
+NEAR_DUPLICATE_JACCARD = 0.8   # word 3-shingle overlap at which snippets count as the same
+
+# Llama 3 uses a tiktoken BPE close to cl100k_base; without tiktoken (or its
+# encoding file, e.g. offline) tokens are estimated at ~4 characters each.
+TOKENIZER_ENCODING = "cl100k_base"
+# After a failed load (the encoding file is downloaded on first use), wait
+# this long before trying again
+TOKENIZER_RETRY_INTERVAL = 60.0  # seconds
+
+STOPWORDS = frozenset(
+    "a an and are as at be been but by can do does for from has have how in into is it its "
+    "of on or that the their these this those to was were what when where which who why will "
+    "with within without".split()
+)
+
+
+_encoding = None
+_encoding_lock = threading.Lock()
+_encoding_retry_at = 0.0
+
+
+def get_encoding():
+    """
+    The tiktoken encoding, loaded on first use (warmup preloads it), or None
+    if it is unavailable. A failed load is retried after
+    TOKENIZER_RETRY_INTERVAL seconds instead of being remembered for the life
+    of the process.
+    """
+    global _encoding, _encoding_retry_at
+    if _encoding is None and time.monotonic() >= _encoding_retry_at:
+        with _encoding_lock:
+            if _encoding is None and time.monotonic() >= _encoding_retry_at:
+                try:
+                    import tiktoken  # deferred: loads the BPE tables
+
+                    _encoding = tiktoken.get_encoding(TOKENIZER_ENCODING)
+                except Exception as e:
+                    _encoding_retry_at = time.monotonic() + TOKENIZER_RETRY_INTERVAL
+                    logger.warning(f"Tokenizer {TOKENIZER_ENCODING} unavailable ({e}), estimating token counts")
+    return _encoding
+
+
+def count_tokens(text: str) -> int:
+    """Number of tokens in text (estimated if no tokenizer is available)."""
+    encoding = get_encoding()
+    if encoding is None:
+        return math.ceil(len(text) / 4)
+    return len(encoding.encode(text, disallowed_special=()))
+
+
+def context_budget(model_ids: Sequence[str]) -> int:
+    """Context tokens that fit every one of these models, capped at CONTEXT_TOKEN_BUDGET."""
+    window = min((CONTEXT_WINDOWS.get(m, DEFAULT_CONTEXT_WINDOW) for m in model_ids), default=DEFAULT_CONTEXT_WINDOW)
+    return max(0, min(CONTEXT_TOKEN_BUDGET, window - PROMPT_RESERVE_TOKENS - ANSWER_RESERVE_TOKENS))
+
+
+def split_authors(authors: Any) -> List[List[str]]:
+    """
+    Authors in arXiv's authors_parsed shape, [[last, first, suffix], ...].
+    A plain author string ("A. Smith, B. Jones and C. Li", as arXiv records
+    without authors_parsed carry) is split on "," and " and ", with
+    parenthesized affiliations removed.
+    """
+    if not authors:
+        return []
+    if isinstance(authors, str):
+        names = re.split(r",|\s+and\s+", re.sub(r"\([^)]*\)", "", authors))
+        return [[parts[-1], " ".join(parts[:-1]), ""] for parts in (name.split() for name in names) if parts]
+    return [[author] if isinstance(author, str) else list(author) for author in authors]
+
+
+def format_doc(index: int, doc: Dict[str, Any]) -> str:
+    """One document as it appears in the answer generation context."""
+    metadata = doc.get("metadata") or {}
+    authors = split_authors(metadata.get("authors"))
+    author_str = ", ".join([" ".join(author).strip() for author in authors]) if authors else "No authors listed"
+    journal_info = [metadata[key] for key in ("journal_title", "journal_ref") if metadata.get(key)]
+    journal_str = " - ".join(journal_info)
+    return (
+        f"[Doc {index + 1}]: {doc.get('content', '')}\n"
+        f"Title: {doc.get('title', 'Untitled')}\n"
+        f"Authors: {author_str}\n"
+        f"Journal: {journal_str}\n"
+        f"Date: {metadata.get('date', '')}\n"
+        f"URL: {doc.get('url', '')}\n\n"
+    )
+
+
+def split_sentences(text: str) -> List[str]:
+    """Split text into sentences on terminal punctuation followed by a capital, digit or bracket."""
+    return [s.strip() for s in re.split(r"(?<=[.!?])\s+(?=[A-Z0-9\[(])", text or "") if s.strip()]
+
+
+def content_terms(text: str) -> List[str]:
+    """Lowercased content words of text (no stopwords or words under 3 characters)."""
+    return [w for w in re.findall(r"[a-z0-9]+", text.lower()) if len(w) > 2 and w not in STOPWORDS]
+
+
+def _shingles(text: str) -> set:
+    words = re.findall(r"\w+", text.lower())
+    return {tuple(words[i:i + 3]) for i in range(max(1, len(words) - 2))}
+
+
+class ContextPacker:
+    """
+    Fits reranked documents into a token budget before they are sent to the
+    LLM. The packed documents are used for both the answer generation and the
+    hallucination grader prompts, so the grader judges the answer against
+    exactly the context it was generated from.
+
+      1. Near-identical snippets (word 3-shingle Jaccard >= NEAR_DUPLICATE_JACCARD)
+         are dropped, keeping the higher-ranked copy.
+      2. Author lists are capped at MAX_AUTHORS.
+      3. If the documents still exceed the budget, sentences are selected
+         extractively by TF-IDF similarity to the question: every document
+         keeps its best sentence, then the best remaining sentences are added
+         while they fit, skipping sentences already selected elsewhere.
+         Selected sentences keep their original order.
+    Documents that fit are passed through unchanged. Every packed copy keeps
+    the unpacked document under "original", so the documents shown to the
+    user line up with the [Doc n] citations.
+    """
+
+    def __init__(self, max_authors: int = MAX_AUTHORS, near_duplicate: float = NEAR_DUPLICATE_JACCARD):
+        self.max_authors = max_authors
+        self.near_duplicate = near_duplicate
+
+    def pack(self, question: str, docs: List[Dict[str, Any]], budget: int) -> List[Dict[str, Any]]:
+        """Packed copies of docs (best first) whose formatted context fits in budget tokens."""
+        docs = [{**self._cap_authors(doc), "original": doc} for doc in self._dedupe(docs)]
+        full_tokens = sum(count_tokens(format_doc(i, doc)) for i, doc in enumerate(docs))
+        metrics.observe("context.tokens_before", full_tokens)
+        if full_tokens <= budget:
+            metrics.observe("context.tokens_after", full_tokens)
+            return docs
+
+        # Fixed cost of each document without its content; lowest-ranked documents
+        # are dropped if even the headers do not fit.
+        header_tokens = [count_tokens(format_doc(i, {**doc, "content": ""})) for i, doc in enumerate(docs)]
+        while docs and sum(header_tokens) > budget:
+            docs, header_tokens = docs[:-1], header_tokens[:-1]
+        remaining = budget - sum(header_tokens)
+
+        sentences = [split_sentences(doc.get("content", "")) for doc in docs]
+        scores = self._score(question, sentences)
+        selected = [set() for _ in docs]
+        candidates = []
+        for d, doc_sentences in enumerate(sentences):
+            ranked = sorted(range(len(doc_sentences)), key=lambda s: -scores[d][s])
+            for position, s in enumerate(ranked):
+                # Each document's best sentence first, then everything by score
+                candidates.append((position > 0, -scores[d][s], d, s))
+        seen = set()
+        for _, _, d, s in sorted(candidates):
+            key = " ".join(content_terms(sentences[d][s]))
+            cost = count_tokens(sentences[d][s]) + 1
+            if key in seen or cost > remaining:
+                continue
+            seen.add(key)
+            selected[d].add(s)
+            remaining -= cost
+
+        packed = []
+        for d, doc in enumerate(docs):
+            kept = sorted(selected[d])
+            parts = []
+            for previous, s in zip([None] + kept, kept):
+                if parts and s != previous + 1:
+                    parts.append("...")
+                parts.append(sentences[d][s])
+            packed.append({**doc, "content": " ".join(parts)})
+        metrics.observe("context.tokens_after", budget - remaining)
+        return packed
+
+    def _dedupe(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        kept, kept_shingles = [], []
+        for doc in docs:
+            shingles = _shingles(doc.get("content", ""))
+            if any(len(shingles & other) / max(1, len(shingles | other)) >= self.near_duplicate
+                   for other in kept_shingles):
+                metrics.increment("context.near_duplicates")
+                continue
+            kept.append(doc)
+            kept_shingles.append(shingles)
+        return kept
+
+    def _cap_authors(self, doc: Dict[str, Any]) -> Dict[str, Any]:
+        metadata = doc.get("metadata") or {}
+        authors = split_authors(metadata.get("authors"))
+        if len(authors) <= self.max_authors:
+            return doc
+        return {**doc, "metadata": {**metadata, "authors": authors[:self.max_authors] + [["et al."]]}}
+
+    def _score(self, question: str, sentences: List[List[str]]) -> List[List[float]]:
+        """TF-IDF cosine similarity of every sentence to the question."""
+        sentence_terms = [[Counter(content_terms(s)) for s in doc_sentences] for doc_sentences in sentences]
+        document_frequency = Counter(term for doc in sentence_terms for terms in doc for term in terms)
+        total = sum(len(doc) for doc in sentence_terms) or 1
+        idf = lambda term: math.log((1 + total) / (1 + document_frequency[term])) + 1.0
+        query = {term: count * idf(term) for term, count in Counter(content_terms(question)).items()}
+        query_norm = math.sqrt(sum(w * w for w in query.values())) or 1.0
+
+        scores = []
+        for doc in sentence_terms:
+            doc_scores = []
+            for terms in doc:
+                weights = {term: count * idf(term) for term, count in terms.items()}
+                norm = math.sqrt(sum(w * w for w in weights.values())) or 1.0
+                doc_scores.append(sum(w * query.get(term, 0.0) for term, w in weights.items()) / (norm * query_norm))
+            scores.append(doc_scores)
+        return scores
+
+
+if __name__ == "__main__":
+    import time
+
+    # Before/after prompt size for a long, partly duplicated context
+    question = "How do mitochondria produce ATP through oxidative phosphorylation?"
+    filler = " ".join(f"Section {i} surveys unrelated work on membrane transport and cell signalling in detail." for i in range(12))
+    docs = [
+        {"title": "Mitochondrial energetics", "url": "https://example.org/1",
+         "content": "Mitochondria produce ATP by oxidative phosphorylation. The electron transport chain pumps protons across the inner membrane. " + filler,
+         "metadata": {"authors": [["Smith", "A", ""]] * 40, "date": "2021-01-01"}},
+        {"title": "Mitochondrial energetics (mirror)", "url": "https://mirror.example.org/1",
+         "content": "Mitochondria produce ATP by oxidative phosphorylation. The electron transport chain pumps protons across the inner membrane. " + filler},
+        {"title": "ATP synthase", "url": "https://example.org/2",
+         "content": filler + " ATP synthase uses the proton gradient to phosphorylate ADP into ATP. " + filler},
+    ]
+    before = sum(count_tokens(format_doc(i, d)) for i, d in enumerate(docs))
+    start = time.perf_counter()
+    packed = ContextPacker().pack(question, docs, budget=400)
+    elapsed = time.perf_counter() - start
+    after = sum(count_tokens(format_doc(i, d)) for i, d in enumerate(packed))
+    print(f"Context tokens: {before} -> {after} ({len(docs)} -> {len(packed)} documents) in {elapsed * 1000:.1f} ms")
+    for i, doc in enumerate(packed):
+        print(format_doc(i, doc))
@@ -1,12 +1,22 @@
 # rag_embeddings.py
 import os
-from typing import List, Optional, Any
-import openai
-from openai import OpenAI
+from typing import List, Optional, Any, TYPE_CHECKING
+
 from dotenv import load_dotenv
 
+from .rag_http import get_http_client
+from .rag_vectors import decode_base64_float32
+
+if TYPE_CHECKING:
+    import numpy as np
+
 load_dotenv()  
 
+# Output size for text-embedding-3 models. Unset means the model's full size
+# (1536 for text-embedding-3-small); a smaller value asks OpenAI for shortened,
+# re-normalized vectors (see rag_retriever for the matching database path).
+EMBEDDING_DIMENSIONS = int(os.getenv("EMBEDDING_DIMENSIONS", "0")) or None
+
 class EmbeddingsManager:
     """
     A manager for generating embeddings via OpenAI. It creates the client once
@@ -16,11 +26,13 @@ class EmbeddingsManager:
     def __init__(
         self, 
         openai_api_key: Optional[str] = None, 
-        default_model: str = "text-embedding-3-small"
+        default_model: str = "text-embedding-3-small",
+        dimensions: Optional[int] = EMBEDDING_DIMENSIONS
     ):
         """
         :param openai_api_key: API key for OpenAI. If not provided, will look for OPENAI_API_KEY in env.
         :param default_model: Default model to use for embeddings.
+        :param dimensions: Reduced output size (text-embedding-3 models only). None for the full size.
         """
         if not openai_api_key:
             openai_api_key = os.getenv("OPENAI_API_KEY")
@@ -31,10 +43,13 @@ class EmbeddingsManager:
                 "or pass openai_api_key to EmbeddingsManager."
             )
 
+        import openai  # deferred: heavy SDK import
+
         openai.api_key = openai_api_key
 
-        self.client = OpenAI(api_key=openai_api_key)
+        self.client = openai.OpenAI(api_key=openai_api_key, http_client=get_http_client())
         self.default_model = default_model
+        self.dimensions = dimensions
 
     def get_embeddings(self, text: str, model: Optional[str] = None) -> List[float]:
         """
@@ -43,6 +58,17 @@ class EmbeddingsManager:
         :param model: (Optional) Model override.
         :return: The embedding vector as a list of floats.
         """
+        return self.get_embedding_vector(text, model).tolist()
+
+    def get_embedding_vector(self, text: str, model: Optional[str] = None) -> "np.ndarray":
+        """
+        Get the embedding as a float32 NumPy array. The vector is requested
+        base64-encoded and decoded straight into one buffer, so no per-element
+        Python floats are created.
+        :param text: The text to be embedded.
+        :param model: (Optional) Model override.
+        :return: The embedding vector as a float32 array.
+        """
         if model is None:
             model = self.default_model
         
@@ -50,9 +76,32 @@ class EmbeddingsManager:
 
         response = self.client.embeddings.create(
             model=model,
-            input=text
+            input=text,
+            encoding_format="base64",
+            **({"dimensions": self.dimensions} if self.dimensions else {})
         )
-        return response.data[0].embedding
+        return decode_base64_float32(response.data[0].embedding)
+
+    def get_embedding_vectors(self, texts: List[str], model: Optional[str] = None) -> "np.ndarray":
+        """
+        Embed a batch of texts in one request (OpenAI accepts up to 2048 inputs).
+        :param texts: Non-empty texts to embed.
+        :param model: (Optional) Model override.
+        :return: A (len(texts), dimensions) float32 array, in input order.
+        """
+        if model is None:
+            model = self.default_model
+
+        response = self.client.embeddings.create(
+            model=model,
+            input=[text.replace("\n", " ").strip() for text in texts],
+            encoding_format="base64",
+            **({"dimensions": self.dimensions} if self.dimensions else {})
+        )
+        import numpy as np  # deferred: heavy import
+
+        data = sorted(response.data, key=lambda item: item.index)
+        return np.stack([decode_base64_float32(item.embedding) for item in data])
 
     def get_full_response(self, text: str, model: Optional[str] = None) -> Any:
         """
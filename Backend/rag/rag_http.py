@@ -0,0 +1,181 @@
+# rag_http.py
+import time
+import threading
+from typing import Dict, Any, Optional
+
+import httpx
+
+# Pool sizing for the process-wide transport. Each provider host gets HTTP/2
+# (one multiplexed connection) where the server supports it, otherwise up to
+# MAX_CONNECTIONS keep-alive HTTP/1.1 connections shared across hosts.
+MAX_CONNECTIONS = 100
+MAX_KEEPALIVE_CONNECTIONS = 40
+KEEPALIVE_EXPIRY = 120.0  # seconds
+DEFAULT_TIMEOUT = httpx.Timeout(30.0, connect=5.0)
+
+POOL_LIMITS = httpx.Limits(
+    max_connections=MAX_CONNECTIONS,
+    max_keepalive_connections=MAX_KEEPALIVE_CONNECTIONS,
+    keepalive_expiry=KEEPALIVE_EXPIRY,
+)
+
+
+class _HostStats:
+    """Per-host request counters shared by the sync and async transports."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Dict[str, float]] = {}
+
+    def record(self, host: str, elapsed: float, error: bool) -> None:
+        with self._lock:
+            stats = self._hosts.setdefault(host, {"requests": 0, "errors": 0, "total_time": 0.0})
+            stats["requests"] += 1
+            stats["total_time"] += elapsed
+            if error:
+                stats["errors"] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                host: {
+                    "requests": s["requests"],
+                    "errors": s["errors"],
+                    "avg_latency": s["total_time"] / s["requests"] if s["requests"] else 0.0,
+                }
+                for host, s in self._hosts.items()
+            }
+
+
+_host_stats = _HostStats()
+
+
+def _pool_connections(pool: Any) -> Dict[str, Dict[str, int]]:
+    """Summarize an httpcore connection pool as open/idle/http2 connection counts per host."""
+    summary: Dict[str, Dict[str, int]] = {}
+    for connection in getattr(pool, "connections", []):
+        origin = getattr(connection, "_origin", None)
+        host = origin.host.decode("ascii") if origin is not None else "unknown"
+        stats = summary.setdefault(host, {"open": 0, "idle": 0, "http2": 0})
+        stats["open"] += 1
+        if connection.is_idle():
+            stats["idle"] += 1
+        if "HTTP/2" in connection.info():
+            stats["http2"] += 1
+    return summary
+
+
+class SharedHTTPTransport(httpx.HTTPTransport):
+    """
+    Pooled keep-alive transport shared by every sync client in the process.
+    Records per-host request statistics. close() is a no-op so an SDK closing
+    its client cannot tear down the shared pool; use shutdown() instead.
+    """
+
+    def handle_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = super().handle_request(request)
+        except Exception:
+            _host_stats.record(request.url.host, time.perf_counter() - start, error=True)
+            raise
+        _host_stats.record(request.url.host, time.perf_counter() - start, error=False)
+        return response
+
+    def close(self) -> None:
+        pass
+
+    def shutdown(self) -> None:
+        super().close()
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return _pool_connections(self._pool)
+
+
+class SharedAsyncHTTPTransport(httpx.AsyncHTTPTransport):
+    """Async counterpart of SharedHTTPTransport."""
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        start = time.perf_counter()
+        try:
+            response = await super().handle_async_request(request)
+        except Exception:
+            _host_stats.record(request.url.host, time.perf_counter() - start, error=True)
+            raise
+        _host_stats.record(request.url.host, time.perf_counter() - start, error=False)
+        return response
+
+    async def aclose(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        await super().aclose()
+
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        return _pool_connections(self._pool)
+
+
+_transport: Optional[SharedHTTPTransport] = None
+_async_transport: Optional[SharedAsyncHTTPTransport] = None
+_transport_lock = threading.Lock()
+
+
+def get_transport() -> SharedHTTPTransport:
+    """The process-wide pooled sync transport, created on first use."""
+    global _transport
+    if _transport is None:
+        with _transport_lock:
+            if _transport is None:
+                _transport = SharedHTTPTransport(http2=True, limits=POOL_LIMITS)
+    return _transport
+
+
+def get_async_transport() -> SharedAsyncHTTPTransport:
+    """The process-wide pooled async transport, created on first use."""
+    global _async_transport
+    if _async_transport is None:
+        with _transport_lock:
+            if _async_transport is None:
+                _async_transport = SharedAsyncHTTPTransport(http2=True, limits=POOL_LIMITS)
+    return _async_transport
+
+
+def get_http_client(**kwargs) -> httpx.Client:
+    """
+    A new httpx.Client backed by the shared pool. Clients are cheap wrappers,
+    so each SDK can get its own (with its own base_url/headers/timeout) while
+    connections are reused process-wide.
+    """
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return httpx.Client(transport=get_transport(), **kwargs)
+
+
+def get_async_http_client(**kwargs) -> httpx.AsyncClient:
+    """Async counterpart of get_http_client."""
+    kwargs.setdefault("timeout", DEFAULT_TIMEOUT)
+    return httpx.AsyncClient(transport=get_async_transport(), **kwargs)
+
+
+def share_postgrest_session(client: Any) -> None:
+    """
+    Re-home a Supabase client's PostgREST session onto the shared pool,
+    keeping its session class, base URL, auth headers and timeout.
+    """
+    session = client.postgrest.session
+    transport = get_async_transport() if isinstance(session, httpx.AsyncClient) else get_transport()
+    client.postgrest.session = type(session)(
+        transport=transport,
+        base_url=session.base_url,
+        headers=session.headers,
+        timeout=session.timeout,
+        follow_redirects=True,
+    )
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    """Per-host request counters and open/idle connection counts for both transports."""
+    return {
+        "hosts": _host_stats.snapshot(),
+        "sync_pool": _transport.pool_stats() if _transport is not None else {},
+        "async_pool": _async_transport.pool_stats() if _async_transport is not None else {},
+    }
@@ -0,0 +1,312 @@
+# rag_ingestion.py
+import os
+import re
+import json
+import time
+import random
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+from .rag_context import split_authors
+from .rag_embeddings import EmbeddingsManager
+from .rag_http import share_postgrest_session
+from .rag_vectors import to_pgvector_literal
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Ingestion writes need a key allowed to insert; falls back to the anon key
+SUPABASE_URL = os.getenv("SUPABASE_URL")
+SUPABASE_WRITE_KEY = os.getenv("SUPABASE_SERVICE_ROLE_KEY") or os.getenv("SUPABASE_ANON_KEY")
+
+DOCUMENTS_TABLE = "documents"
+EMBED_BATCH_SIZE = 256      # texts per embeddings request
+EMBED_CONCURRENCY = 4       # embeddings requests in flight
+UPSERT_CHUNK_SIZE = 200     # rows per upsert request (~18 KB of vector text each)
+HASH_LOOKUP_CHUNK_SIZE = 100
+CHUNK_RECORDS = 2000        # input records per checkpointed chunk
+MAX_RETRIES = 5
+RETRY_BASE_DELAY = 1.0      # seconds, doubled per attempt
+
+
+def content_hash(title: str, content: str) -> str:
+    """
+    Dedupe key for a document: sha256 of the lowercased, whitespace-collapsed
+    title and content. Must match SQL/add_documents_content_hash.sql.
+    """
+    normalize = lambda text: re.sub(r"\s+", " ", (text or "").strip()).lower()
+    return hashlib.sha256(f"{normalize(title)}\n{normalize(content)}".encode("utf-8")).hexdigest()
+
+
+def with_retry(fn: Callable[..., Any], *args, max_retries: int = MAX_RETRIES, **kwargs) -> Any:
+    """Call fn, retrying with exponential backoff and jitter on any exception."""
+    for attempt in range(max_retries):
+        try:
+            return fn(*args, **kwargs)
+        except Exception as e:
+            if attempt == max_retries - 1:
+                raise
+            delay = RETRY_BASE_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+            logger.warning(f"{getattr(fn, '__name__', 'call')} failed ({e}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+
+
+def read_records(path: str, start_offset: int = 0) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """
+    Stream JSON records from a JSONL file, starting at a byte offset.
+    Yields (offset just past the record, record); malformed lines are skipped.
+    """
+    with open(path, "rb") as f:
+        f.seek(start_offset)
+        offset = start_offset
+        for line in f:
+            offset += len(line)
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                yield offset, json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+
+def to_document(record: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Map an arXiv-metadata-style (or already normalized) record to a document
+    row without embedding. Returns None if it has no title or content.
+    """
+    title = " ".join((record.get("title") or "").split())
+    content = " ".join((record.get("content") or record.get("abstract") or "").split())
+    if not title or not content:
+        return None
+
+    url = record.get("url")
+    if not url and record.get("doi"):
+        doi = record["doi"].strip()
+        url = doi if doi.startswith("https://doi.org/") else f"https://doi.org/{doi}"
+    if not url and record.get("id"):
+        url = f"https://arxiv.org/abs/{record['id']}"
+
+    categories = record.get("categories")
+    metadata = {
+        "date": record.get("date") or record.get("update_date"),
+        "journal_ref": record.get("journal_ref") or record.get("journal-ref"),
+        "journal_title": record.get("journal_title"),
+        "source": record.get("source", "arxiv"),
+        "authors": split_authors(record.get("authors_parsed") or record.get("authors")) or None,
+        "categories": categories.split() if isinstance(categories, str) else categories,
+    }
+    return {
+        "title": title,
+        "content": content,
+        "url": url,
+        "metadata": {k: v for k, v in metadata.items() if v is not None},
+    }
+
+
+class DocumentWriter:
+    """
+    Embeds and upserts documents into the retrieval store.
+
+    - Documents are keyed on content_hash(); duplicates within a batch and
+      hashes already in the table are dropped before anything is embedded.
+    - Embeddings are requested EMBED_BATCH_SIZE texts at a time with at most
+      `concurrency` requests in flight, each retried with backoff.
+    - Rows are upserted UPSERT_CHUNK_SIZE at a time with
+      ON CONFLICT (content_hash) DO NOTHING and no response body.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[EmbeddingsManager] = None,
+        client: Any = None,
+        batch_size: int = EMBED_BATCH_SIZE,
+        concurrency: int = EMBED_CONCURRENCY
+    ):
+        # Stored vectors must fill the VECTOR(1536) column whatever
+        # EMBEDDING_DIMENSIONS the query path uses
+        if embedder is not None and embedder.dimensions is not None:
+            raise ValueError(
+                f"DocumentWriter needs a full-dimension embedder, got dimensions={embedder.dimensions}"
+            )
+        self.embedder = embedder or EmbeddingsManager(dimensions=None)
+        if client is None:
+            from supabase import create_client  # deferred: heavy SDK import
+
+            client = create_client(SUPABASE_URL, SUPABASE_WRITE_KEY)
+            share_postgrest_session(client)
+        self.client = client
+        self.batch_size = batch_size
+        self._pool = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="embed")
+
+    def existing_hashes(self, hashes: List[str]) -> set:
+        """Which of these content hashes are already stored."""
+        found = set()
+        for i in range(0, len(hashes), HASH_LOOKUP_CHUNK_SIZE):
+            chunk = hashes[i:i + HASH_LOOKUP_CHUNK_SIZE]
+            response = with_retry(
+                self.client.table(DOCUMENTS_TABLE).select("content_hash").in_("content_hash", chunk).execute
+            )
+            found.update(row["content_hash"] for row in response.data or [])
+        return found
+
+    def _embed_batch(self, documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        vectors = with_retry(self.embedder.get_embedding_vectors, [doc["content"] for doc in documents])
+        return [{**doc, "embedding": to_pgvector_literal(vector)} for doc, vector in zip(documents, vectors)]
+
+    def _upsert(self, rows: List[Dict[str, Any]]) -> None:
+        from postgrest.types import ReturnMethod  # deferred with the supabase client
+
+        with_retry(
+            self.client.table(DOCUMENTS_TABLE).upsert(
+                rows,
+                on_conflict="content_hash",
+                ignore_duplicates=True,
+                returning=ReturnMethod.minimal
+            ).execute
+        )
+
+    def write(self, documents: List[Dict[str, Any]]) -> Dict[str, int]:
+        """
+        Dedupe, embed and upsert documents (title, content, url, metadata).
+        A document may carry its own "content_hash" to choose its dedupe key.
+        Returns counts of written, duplicate and failed documents.
+        """
+        unique: Dict[str, Dict[str, Any]] = {}
+        for doc in documents:
+            key = doc.get("content_hash") or content_hash(doc["title"], doc["content"])
+            unique.setdefault(key, doc)
+        existing = self.existing_hashes(list(unique))
+        pending = [{**doc, "content_hash": h} for h, doc in unique.items() if h not in existing]
+        stats = {"written": 0, "duplicates": len(documents) - len(pending), "failed": 0}
+
+        batches = [pending[i:i + self.batch_size] for i in range(0, len(pending), self.batch_size)]
+        futures = [self._pool.submit(self._embed_batch, batch) for batch in batches]
+        rows: List[Dict[str, Any]] = []
+        for batch, future in zip(batches, futures):
+            try:
+                rows.extend(future.result())
+            except Exception as e:
+                logger.error(f"Embedding batch of {len(batch)} documents failed: {e}")
+                stats["failed"] += len(batch)
+
+        for i in range(0, len(rows), UPSERT_CHUNK_SIZE):
+            chunk = rows[i:i + UPSERT_CHUNK_SIZE]
+            try:
+                self._upsert(chunk)
+                stats["written"] += len(chunk)
+            except Exception as e:
+                logger.error(f"Upsert of {len(chunk)} documents failed: {e}")
+                stats["failed"] += len(chunk)
+        return stats
+
+
+def load_checkpoint(path: str, input_path: str) -> Dict[str, Any]:
+    """Resume state for input_path, or a fresh one."""
+    if os.path.exists(path):
+        with open(path, "r") as f:
+            checkpoint = json.load(f)
+        if checkpoint.get("input") == os.path.abspath(input_path):
+            return checkpoint
+    return {"input": os.path.abspath(input_path), "offset": 0,
+            "records": 0, "written": 0, "duplicates": 0, "skipped": 0, "failed": 0}
+
+
+def save_checkpoint(path: str, checkpoint: Dict[str, Any]) -> None:
+    """Atomically replace the checkpoint file."""
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(checkpoint, f)
+    os.replace(tmp_path, path)
+
+
+def ingest(
+    input_path: str,
+    checkpoint_path: str,
+    writer: Optional[DocumentWriter] = None,
+    chunk_records: int = CHUNK_RECORDS,
+    limit: Optional[int] = None
+) -> Dict[str, Any]:
+    """
+    Stream input_path into the documents table in checkpointed chunks. The
+    checkpoint stores the byte offset after the last fully written chunk, so
+    an interrupted run resumes where it stopped. Failed documents are counted
+    and skipped rather than retried forever.
+    """
+    writer = writer or DocumentWriter()
+    checkpoint = load_checkpoint(checkpoint_path, input_path)
+    if checkpoint["offset"]:
+        print(f"Resuming {input_path} at byte {checkpoint['offset']} ({checkpoint['records']} records done)")
+
+    start_time = time.time()
+    run_records = 0
+    chunk: List[Dict[str, Any]] = []
+    chunk_skipped = 0
+    offset = checkpoint["offset"]
+
+    def flush_chunk() -> None:
+        nonlocal chunk, chunk_skipped
+        chunk_start = time.time()
+        stats = writer.write(chunk) if chunk else {"written": 0, "duplicates": 0, "failed": 0}
+        for key, value in stats.items():
+            checkpoint[key] += value
+        checkpoint["skipped"] += chunk_skipped
+        checkpoint["records"] += len(chunk) + chunk_skipped
+        checkpoint["offset"] = offset
+        save_checkpoint(checkpoint_path, checkpoint)
+        elapsed = time.time() - start_time
+        print(
+            f"{checkpoint['records']} records: +{stats['written']} written, "
+            f"{stats['duplicates']} duplicates, {stats['failed']} failed "
+            f"({len(chunk) / max(time.time() - chunk_start, 1e-9):.1f} docs/s chunk, "
+            f"{run_records / max(elapsed, 1e-9):.1f} docs/s overall)"
+        )
+        chunk, chunk_skipped = [], 0
+
+    for offset, record in read_records(input_path, checkpoint["offset"]):
+        run_records += 1
+        doc = to_document(record)
+        if doc is None:
+            chunk_skipped += 1
+        else:
+            chunk.append(doc)
+        if len(chunk) + chunk_skipped >= chunk_records:
+            flush_chunk()
+        if limit is not None and run_records >= limit:
+            break
+    if chunk or chunk_skipped:
+        flush_chunk()
+
+    elapsed = time.time() - start_time
+    checkpoint["elapsed"] = elapsed
+    checkpoint["docs_per_second"] = run_records / elapsed if elapsed else 0.0
+    return checkpoint
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Bulk-load a JSONL corpus (e.g. arXiv metadata) into the documents table.")
+    parser.add_argument("input", help="JSONL file, one record per line")
+    parser.add_argument("--checkpoint", default=None, help="Checkpoint file (default: <input>.checkpoint)")
+    parser.add_argument("--batch-size", type=int, default=EMBED_BATCH_SIZE, help="Texts per embeddings request")
+    parser.add_argument("--concurrency", type=int, default=EMBED_CONCURRENCY, help="Embeddings requests in flight")
+    parser.add_argument("--chunk-records", type=int, default=CHUNK_RECORDS, help="Records per checkpointed chunk")
+    parser.add_argument("--limit", type=int, default=None, help="Stop after this many records")
+    args = parser.parse_args()
+
+    result = ingest(
+        args.input,
+        args.checkpoint or f"{args.input}.checkpoint",
+        writer=DocumentWriter(batch_size=args.batch_size, concurrency=args.concurrency),
+        chunk_records=args.chunk_records,
+        limit=args.limit
+    )
+    print(f"Done: {result['written']} written, {result['duplicates']} duplicates, "
+          f"{result['skipped']} skipped, {result['failed']} failed in {result['elapsed']:.1f}s "
+          f"({result['docs_per_second']:.1f} docs/s)")
@@ -9,13 +9,11 @@ import asyncio
 
 from .rag_prompts import (
     DEFAULT_SYSTEM_PROMPT,
-    SCIENTIFIC_QUERY_VALIDATOR_SYSTEM,
-    RAG_PROMPT,
-    RAG_SYSTEM
+    SCIENTIFIC_QUERY_VALIDATOR_PROMPT,
+    RAG_PROMPT
 )
 
-import aisuite as ai
-from cerebras.cloud.sdk import Cerebras
+from .rag_http import get_http_client
 
 load_dotenv()
 
@@ -64,29 +62,38 @@ class ModelManager:
         Initialize the ModelManager with all possible providers, their corresponding model IDs,
         and any other config needed. You can easily add new providers here.
         """
+        # Provider SDKs are imported here rather than at module level so that
+        # importing the package stays cheap; see rag_warmup.
+        import aisuite as ai
+        from cerebras.cloud.sdk import Cerebras
+
         self.logger = logging.getLogger(__name__)
         self.ai_client = ai.Client()
-        self.cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY)
+        self.cerebras_client = Cerebras(api_key=CEREBRAS_API_KEY, http_client=get_http_client())
 
         self.providers = [
             {
                 "name": "cerebras",
                 "model_id": "llama-3.3-70b",
+                "small_model_id": "llama3.1-8b",
                 "type": "cerebras",
             },
             {
                 "name": "groq",
                 "model_id": "llama-3.3-70b-specdec",
+                "small_model_id": "llama-3.1-8b-instant",
                 "type": "aisuite",
             },
             {
                 "name": "fireworks",
                 "model_id": "accounts/fireworks/models/llama-v3p3-70b-instruct",
+                "small_model_id": "accounts/fireworks/models/llama-v3p1-8b-instruct",
                 "type": "aisuite",  
             },
             {
                 "name": "sambanova",
                 "model_id": "Meta-Llama-3.3-70B-Instruct",
+                "small_model_id": "Meta-Llama-3.1-8B-Instruct",
                 "type": "aisuite",
             }
         ]
@@ -96,30 +103,46 @@ class ModelManager:
 
         self.cooldowns = {p["name"]: 0 for p in self.providers}
 
-    def prompt(self, prompt_text: str, system_prompt: str = DEFAULT_SYSTEM_PROMPT, **kwargs) -> ModelResponse:
+    def prompt(
+        self,
+        prompt_text: Optional[str] = None,
+        system_prompt: str = DEFAULT_SYSTEM_PROMPT,
+        small_model: bool = False,
+        messages: Optional[List[Dict[str, str]]] = None,
+        **kwargs
+    ) -> ModelResponse:
         """
         Takes a user prompt and returns a ModelResponse object from the first available (non-cooldown) provider.
         Round-robin rotation is applied after a successful call or a failure that triggers moving to next.
         
         :param prompt_text: The user prompt or question
         :param system_prompt: Optional system instructions
+        :param small_model: Use each provider's smaller, faster model (degraded pipeline modes)
+        :param messages: Chat messages sent as-is instead of prompt_text/system_prompt,
+                         e.g. PromptTemplate.render() output (static system message first)
         :param kwargs: Additional parameters for the underlying provider calls (e.g. temperature, etc.)
         :return: ModelResponse - object containing the content, provider_name, raw response, etc.
         """
+        if messages is None:
+            messages = [
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt_text}
+            ]
+
         # Check if this is a validation or answer generation prompt
-        is_validation = system_prompt == SCIENTIFIC_QUERY_VALIDATOR_SYSTEM
-        is_answer_gen = system_prompt == RAG_SYSTEM
+        system_content = messages[0]["content"] if messages[0]["role"] == "system" else None
+        is_validation = system_content == SCIENTIFIC_QUERY_VALIDATOR_PROMPT.system
+        is_answer_gen = system_content == RAG_PROMPT.system
         
         if is_validation or is_answer_gen:
             # Try Cerebras first for validation and answer generation
             try:
                 if time.time() >= self.cooldowns["cerebras"]:
-                    cerebras_info = next(p for p in self.providers if p["name"] == "cerebras")
+                    cerebras_info = self._model_info(next(p for p in self.providers if p["name"] == "cerebras"), small_model)
                     start_time = time.time()
                     response = self._call_provider(
                         provider_info=cerebras_info,
-                        prompt_text=prompt_text,
-                        system_prompt=system_prompt,
+                        messages=messages,
                         **kwargs
                     )
                     end_time = time.time()
@@ -144,9 +167,8 @@ class ModelManager:
             try:
                 start_time = time.time()
                 response = self._call_provider(
-                    provider_info=provider_info,
-                    prompt_text=prompt_text,
-                    system_prompt=system_prompt,
+                    provider_info=self._model_info(provider_info, small_model),
+                    messages=messages,
                     **kwargs
                 )
                 end_time = time.time()
@@ -164,6 +186,16 @@ class ModelManager:
         # If we exhaust all providers (none succeeded), raise an error
         raise RuntimeError("All providers failed or are on cooldown. Please try again later.")
 
+    def model_ids(self, small_model: bool = False) -> List[str]:
+        """Model IDs that may serve a prompt (any provider can be picked by the rotation)."""
+        return [self._model_info(p, small_model)["model_id"] for p in self.providers]
+
+    def _model_info(self, provider_info: Dict[str, str], small_model: bool) -> Dict[str, str]:
+        """Provider info with model_id switched to the provider's small model if requested."""
+        if small_model and provider_info.get("small_model_id"):
+            return {**provider_info, "model_id": provider_info["small_model_id"]}
+        return provider_info
+
     def _move_to_next_provider(self):
         """Advance the provider index in a round-robin fashion."""
         self.current_provider_index = (self.current_provider_index + 1) % len(self.providers)
@@ -171,8 +203,7 @@ class ModelManager:
     async def _call_provider_with_timeout(
         self,
         provider_info: Dict[str, str],
-        prompt_text: str,
-        system_prompt: str,
+        messages: List[Dict[str, str]],
         timeout: float = 5.0,  # 5 seconds timeout
         **kwargs
     ) -> ModelResponse:
@@ -186,10 +217,6 @@ class ModelManager:
 
         try:
             if provider_type == "aisuite":
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt_text}
-                ]
                 combined_model_string = f"{provider_name}:{model_id}"
                 raw_response = await asyncio.wait_for(
                     self.ai_client.chat.completions.acreate(
@@ -207,10 +234,6 @@ class ModelManager:
                     model_id=model_id
                 )
             elif provider_type == "cerebras":
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt_text}
-                ]
                 raw_response = await asyncio.wait_for(
                     self.cerebras_client.chat.completions.acreate(
                         messages=messages,
@@ -235,8 +258,7 @@ class ModelManager:
     async def _call_provider_with_fallback(
         self,
         provider_info: Dict[str, str],
-        prompt_text: str,
-        system_prompt: str,
+        messages: List[Dict[str, str]],
         **kwargs
     ) -> ModelResponse:
         """
@@ -247,8 +269,7 @@ class ModelManager:
         first_provider_task = asyncio.create_task(
             self._call_provider_with_timeout(
                 provider_info=provider_info,
-                prompt_text=prompt_text,
-                system_prompt=system_prompt,
+                messages=messages,
                 **kwargs
             )
         )
@@ -265,8 +286,7 @@ class ModelManager:
             second_provider_task = asyncio.create_task(
                 self._call_provider_with_timeout(
                     provider_info=next_provider,
-                    prompt_text=prompt_text,
-                    system_prompt=system_prompt,
+                    messages=messages,
                     **kwargs
                 )
             )
@@ -301,15 +321,10 @@ class ModelManager:
         self,
         provider_name: str,
         model_id: str,
-        prompt_text: str,
-        system_prompt: str,
+        messages: List[Dict[str, str]],
         **kwargs
     ) -> ModelResponse:
         """Call AISuite-based providers (like fireworks, groq)."""
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt_text}
-        ]
 
         combined_model_string = f"{provider_name}:{model_id}"
 
@@ -349,15 +364,10 @@ class ModelManager:
         self,
         provider_name: str,
         model_id: str,
-        prompt_text: str,
-        system_prompt: str,
+        messages: List[Dict[str, str]],
         **kwargs
     ) -> ModelResponse:
         """Call the Cerebras-based provider."""
-        messages = [
-            {"role": "system", "content": system_prompt},
-            {"role": "user", "content": prompt_text}
-        ]
 
         # Create an event loop if one doesn't exist
         try:
@@ -394,8 +404,7 @@ class ModelManager:
     def _call_provider(
         self,
         provider_info: Dict[str, str],
-        prompt_text: str,
-        system_prompt: str,
+        messages: List[Dict[str, str]],
         **kwargs
     ) -> ModelResponse:
         """
@@ -408,10 +417,6 @@ class ModelManager:
 
         try:
             if provider_type == "aisuite":
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt_text}
-                ]
                 combined_model_string = f"{provider_name}:{model_id}"
                 raw_response = self.ai_client.chat.completions.create(
                     model=combined_model_string,
@@ -426,10 +431,6 @@ class ModelManager:
                     model_id=model_id
                 )
             elif provider_type == "cerebras":
-                messages = [
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": prompt_text}
-                ]
                 raw_response = self.cerebras_client.chat.completions.create(
                     messages=messages,
                     model=model_id,
@@ -0,0 +1,125 @@
+# rag_local_reranker.py
+import os
+import logging
+from collections import Counter
+from typing import Any, Dict, List, Optional, TYPE_CHECKING
+
+from dotenv import load_dotenv
+
+from .rag_context import content_terms
+
+if TYPE_CHECKING:
+    import numpy as np
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Share of the local relevance score that comes from embedding cosine
+# similarity; the rest is lexical (BM25) overlap with the query
+LOCAL_RERANK_COSINE_WEIGHT = float(os.getenv("LOCAL_RERANK_COSINE_WEIGHT", "0.5"))
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+
+def reranked_locally(docs: List[Dict[str, Any]]) -> bool:
+    """Whether any of these reranked documents was scored by the local reranker."""
+    return any(doc.get("reranker") == "local" for doc in docs)
+
+
+class LocalReranker:
+    """
+    CPU reranker used when Cohere is unavailable, slow, or disabled
+    (RERANK_ENGINE=local). Each document is scored in [0, 1] as a weighted
+    mix of:
+
+      - BM25 over the query's content terms, with document frequencies taken
+        from the candidate set and normalized by its maximum possible value;
+      - cosine similarity between the query and document embeddings. Database
+        documents carry it already ("similarity" from the vector search); the
+        others are embedded in one batched request if an embedder is given.
+
+    Documents without an embedding (no embedder, or the request failed) are
+    scored on BM25 alone. Scores are not calibrated against Cohere's
+    relevance_score, so reranked documents are tagged "reranker": "local".
+    """
+
+    def __init__(self, embedder=None, cosine_weight: float = LOCAL_RERANK_COSINE_WEIGHT):
+        self.embedder = embedder
+        self.cosine_weight = cosine_weight
+
+    def rerank_documents(
+        self,
+        query: str,
+        documents: List[Dict[str, Any]],
+        top_n: Optional[int] = None
+    ) -> List[Dict[str, Any]]:
+        """Documents sorted by descending local relevanceScore, at most top_n of them."""
+        if not documents:
+            return []
+        import numpy as np  # deferred: heavy import
+
+        texts = [doc.get("content", "") for doc in documents]
+        lexical = self.lexical_scores(query, texts)
+        cosine = self.cosine_scores(query, documents)
+        scores = np.where(
+            np.isnan(cosine), lexical,
+            self.cosine_weight * np.nan_to_num(cosine) + (1 - self.cosine_weight) * lexical
+        )
+        order = np.argsort(-scores, kind="stable")[:top_n]
+        return [{**documents[i], "relevanceScore": float(scores[i]), "reranker": "local"} for i in order]
+
+    def lexical_scores(self, query: str, texts: List[str]) -> "np.ndarray":
+        """BM25 score of every text for the query, scaled to [0, 1]."""
+        import numpy as np  # deferred: heavy import
+
+        query_terms = list(dict.fromkeys(content_terms(query)))
+        if not query_terms:
+            return np.zeros(len(texts), dtype=np.float32)
+        doc_terms = [Counter(content_terms(text)) for text in texts]
+        tf = np.array([[terms[t] for t in query_terms] for terms in doc_terms], dtype=np.float32)
+        lengths = np.array([sum(terms.values()) for terms in doc_terms], dtype=np.float32)
+
+        n = len(texts)
+        df = (tf > 0).sum(axis=0)
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        norm = BM25_K1 * (1 - BM25_B + BM25_B * lengths / max(float(lengths.mean()), 1.0))
+        bm25 = (tf * (BM25_K1 + 1) / (tf + norm[:, None])) @ idf
+        return bm25 / (float(idf.sum()) * (BM25_K1 + 1))
+
+    def cosine_scores(self, query: str, documents: List[Dict[str, Any]]) -> "np.ndarray":
+        """Query-document cosine similarity clipped to [0, 1], NaN where it is not available."""
+        import numpy as np  # deferred: heavy import
+
+        cosine = np.array([doc.get("similarity", np.nan) for doc in documents], dtype=np.float32)
+        missing = [i for i in np.flatnonzero(np.isnan(cosine)) if documents[i].get("content")]
+        if not missing or self.embedder is None:
+            return cosine
+        try:
+            vectors = self.embedder.get_embedding_vectors([query] + [documents[i]["content"] for i in missing])
+        except Exception as e:
+            logger.warning(f"Local reranker could not embed documents ({e}), using lexical scores")
+            return cosine
+        vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        cosine[missing] = vectors[1:] @ vectors[0]
+        return np.clip(cosine, 0.0, 1.0)
+
+
+if __name__ == "__main__":
+    import time
+
+    query_text = "How can numerical methods model material response under shock and ramp compression?"
+    docs = [
+        {"id": 1, "content": "A general formulation was developed to represent material models for dynamic loading. "
+                             "Numerical methods for shock and ramp compression are compared.", "similarity": 0.71},
+        {"id": 2, "content": "We address the problem of retrieving information from a noisy knowledge network."},
+        {"id": 3, "content": "A viscoplastic material model of overstress type with nonlinear kinematic hardening.",
+         "similarity": 0.52},
+        {"id": 4, "content": "Kinetic approaches describe particle acceleration at cosmic ray modified shocks."},
+    ] + [{"id": 5 + i, "content": f"Abstract {i} on gene regulation and market microstructure."} for i in range(96)]
+    start = time.perf_counter()
+    results = LocalReranker().rerank_documents(query_text, docs, top_n=4)
+    elapsed = time.perf_counter() - start
+    print(f"Reranked {len(docs)} documents locally in {elapsed * 1000:.2f} ms")
+    for rank, doc in enumerate(results, 1):
+        print(f"Rank #{rank} | Doc ID: {doc['id']} | Relevance: {doc['relevanceScore']:.4f}")
@@ -0,0 +1,84 @@
+# rag_metrics.py
+import threading
+import time
+from collections import deque
+from typing import Dict, Any
+
+
+class Metrics:
+    """
+    A small thread-safe, in-process metrics registry for the RAG pipeline.
+
+    - Counters: monotonically increasing integers (e.g. decisions taken).
+    - Observations: numeric samples (latencies, scores) summarized as count,
+      mean, min, max and p50/p95 over the most recent samples.
+    - Rates: event timestamps reported as events per minute over the last
+      RATE_WINDOW seconds (e.g. throughput).
+    """
+
+    MAX_SAMPLES = 1000
+    RATE_WINDOW = 60.0  # seconds
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counters: Dict[str, int] = {}
+        self._observations: Dict[str, Dict[str, Any]] = {}
+        self._events: Dict[str, deque] = {}
+
+    def increment(self, name: str, value: int = 1) -> None:
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + value
+
+    def observe(self, name: str, value: float) -> None:
+        with self._lock:
+            obs = self._observations.get(name)
+            if obs is None:
+                obs = {"count": 0, "sum": 0.0, "min": value, "max": value,
+                       "samples": deque(maxlen=self.MAX_SAMPLES)}
+                self._observations[name] = obs
+            obs["count"] += 1
+            obs["sum"] += value
+            obs["min"] = min(obs["min"], value)
+            obs["max"] = max(obs["max"], value)
+            obs["samples"].append(value)
+
+    def mark(self, name: str) -> None:
+        """Record that an event happened now, for its per-minute rate."""
+        with self._lock:
+            events = self._events.setdefault(name, deque(maxlen=self.MAX_SAMPLES))
+            events.append(time.monotonic())
+
+    def get_counter(self, name: str) -> int:
+        with self._lock:
+            return self._counters.get(name, 0)
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Return all counters, observation summaries and rates as plain dicts."""
+        with self._lock:
+            since = time.monotonic() - self.RATE_WINDOW
+            rates = {
+                name: {"per_minute": sum(1 for t in events if t >= since) * 60.0 / self.RATE_WINDOW}
+                for name, events in self._events.items()
+            }
+            observations = {}
+            for name, obs in self._observations.items():
+                samples = sorted(obs["samples"])
+                observations[name] = {
+                    "count": obs["count"],
+                    "mean": obs["sum"] / obs["count"],
+                    "min": obs["min"],
+                    "max": obs["max"],
+                    "p50": samples[int(0.50 * (len(samples) - 1))],
+                    "p95": samples[int(0.95 * (len(samples) - 1))],
+                }
+            return {"counters": dict(self._counters), "observations": observations, "rates": rates}
+
+    def reset(self) -> None:
+        with self._lock:
+            self._counters.clear()
+            self._observations.clear()
+            self._events.clear()
+
+
+# Global instance
+metrics = Metrics()
@@ -1,5 +1,37 @@
 # rag_prompts.py
-from langchain_core.prompts import ChatPromptTemplate
+from string import Formatter
+from typing import Dict, List
+
+
+class PromptTemplate:
+    """
+    A chat prompt compiled once at import time: a static system message
+    followed by a user message template. The system message may not contain
+    placeholders, so every request of one kind starts with identical content
+    and providers with prefix caching can reuse it; everything that varies
+    per request (context, question, generation) goes in the user message.
+    """
+
+    def __init__(self, system: str, user: str):
+        placeholders = [field for _, field, _, _ in Formatter().parse(system) if field is not None]
+        if placeholders:
+            raise ValueError(f"System content must be static, found placeholders {placeholders}")
+        self.system = system.strip()
+        self._system_message = {"role": "system", "content": self.system}
+        # Precompiled user template: (literal text, field name or None) pairs
+        self._parts = [(literal, field) for literal, field, _, _ in Formatter().parse(user)]
+        self.fields = frozenset(field for _, field in self._parts if field)
+
+    def format_user(self, **values: str) -> str:
+        """The user message with values filled in."""
+        missing = self.fields - values.keys()
+        if missing:
+            raise KeyError(f"Missing prompt values: {sorted(missing)}")
+        return "".join(literal + (str(values[field]) if field else "") for literal, field in self._parts)
+
+    def render(self, **values: str) -> List[Dict[str, str]]:
+        """Messages for ModelManager.prompt(messages=...): the static system message, then the user message."""
+        return [dict(self._system_message), {"role": "user", "content": self.format_user(**values)}]
 
 DEFAULT_SYSTEM_PROMPT = "You are a helpful assistant."
 
@@ -64,35 +96,34 @@ If you are uncertain or the context doesn't contain relevant information, say "I
 If relevant, please cite the sources in your final answer.
 """
 
-# Prompt Templates
-HALLUCINATION_GRADER_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", HALLUCINATION_GRADER_SYSTEM),
-    ("human", "Set of facts:\n\n{documents}\n\nLLM generation:\n{generation}")
-])
-
-ANSWER_GRADER_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", ANSWER_GRADER_SYSTEM),
-    ("human", "User question:\n{question}\n\nLLM generation:\n{generation}")
-])
-
-QUERY_REWRITER_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", QUERY_REWRITER_SYSTEM),
-    ("human", "Initial question:\n{question}\nPlease rewrite it.")
-])
-
-RAG_PROMPT = ChatPromptTemplate.from_messages([
-    ("system", RAG_SYSTEM),
-    ("human", """Context:
-{context}
-
-Question: {question}
-
-- Please answer in a helpful manner, referencing the facts from the context. 
+RAG_ANSWER_INSTRUCTIONS = """
+- Please answer in a helpful manner, referencing the facts from the context.
 - Please provide a concise, yet clear and helpful answer and include a 'Sources:' section at the end in markdown format. For each source you used to answer the question, include the title, authors, journal (if available), date, and URL in a properly formatted citation.
-     
-     """)
-]) 
-
-
-
+"""
 
+# Prompt Templates
+SCIENTIFIC_QUERY_VALIDATOR_PROMPT = PromptTemplate(
+    SCIENTIFIC_QUERY_VALIDATOR_SYSTEM,
+    "{question}"
+)
+
+HALLUCINATION_GRADER_PROMPT = PromptTemplate(
+    HALLUCINATION_GRADER_SYSTEM,
+    "Set of facts:\n\n{documents}\n\nLLM generation:\n{generation}"
+)
+
+ANSWER_GRADER_PROMPT = PromptTemplate(
+    ANSWER_GRADER_SYSTEM,
+    "User question:\n{question}\n\nLLM generation:\n{generation}"
+)
+
+QUERY_REWRITER_PROMPT = PromptTemplate(
+    QUERY_REWRITER_SYSTEM,
+    "Initial question:\n{question}\nPlease rewrite it."
+)
+
+# The answer instructions are static, so they belong to the cached system prefix
+RAG_PROMPT = PromptTemplate(
+    RAG_SYSTEM + RAG_ANSWER_INSTRUCTIONS,
+    "Context:\n{context}\n\nQuestion: {question}"
+)
@@ -0,0 +1,105 @@
+# rag_rerank_cache.py
+import os
+import time
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from dotenv import load_dotenv
+
+from .rag_search_cache import normalize_query
+
+load_dotenv()
+
+# Cached (query, document) rerank scores; 0 disables the cache
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "20000"))
+RERANK_CACHE_TTL = float(os.getenv("RERANK_CACHE_TTL", str(6 * 60 * 60)))
+
+
+def document_key(text: str) -> str:
+    """Identity of a document as the reranker sees it: a hash of the text sent to it."""
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class RerankCache:
+    """
+    In-process LRU cache of Cohere relevance scores, one entry per
+    (model, normalized query, document content hash).
+
+    Cohere scores every document against the query independently, so scores
+    can be cached per document: a request whose documents are partly cached
+    only sends the rest to Cohere. Entries expire after ttl seconds and the
+    least recently used are evicted beyond max_entries.
+    """
+
+    def __init__(self, max_entries: int = RERANK_CACHE_SIZE, ttl: float = RERANK_CACHE_TTL):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[Tuple[str, str, str], Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_many(self, model: str, query: str, texts: Sequence[str]) -> List[Optional[float]]:
+        """Cached score for each text, None where there is none."""
+        query = normalize_query(query)
+        now = time.time()
+        scores = []
+        with self._lock:
+            for text in texts:
+                key = (model, query, document_key(text))
+                entry = self._entries.get(key)
+                if entry is not None and entry[1] < now:
+                    del self._entries[key]
+                    entry = None
+                if entry is None:
+                    self.misses += 1
+                    scores.append(None)
+                else:
+                    self.hits += 1
+                    self._entries.move_to_end(key)
+                    scores.append(entry[0])
+        return scores
+
+    def put_many(self, model: str, query: str, texts: Sequence[str], scores: Sequence[float]) -> None:
+        if self.max_entries <= 0:
+            return
+        query = normalize_query(query)
+        expires_at = time.time() + self.ttl
+        with self._lock:
+            for text, score in zip(texts, scores):
+                key = (model, query, document_key(text))
+                self._entries[key] = (score, expires_at)
+                self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+            }
+
+
+_cache: Optional[RerankCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_rerank_cache() -> RerankCache:
+    """Process-wide RerankCache shared by every ReRankManager."""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = RerankCache()
+    return _cache
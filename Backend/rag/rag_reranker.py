@@ -1,40 +1,129 @@
 # rag_reranker.py
 import os
+import time
+import logging
+import threading
 from typing import List, Dict, Any, Union, Optional
 from dotenv import load_dotenv
-import cohere
+
+from .rag_http import get_http_client
+from .rag_local_reranker import LocalReranker
+from .rag_rerank_cache import RerankCache, get_rerank_cache
+from .rag_metrics import metrics
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
+# "cohere" reranks with Cohere and falls back to the local reranker on errors,
+# timeouts or an open circuit; "local" always uses the local reranker
+RERANK_ENGINE = os.getenv("RERANK_ENGINE", "cohere")
+# Seconds a Cohere rerank call may take before the local reranker answers instead
+RERANK_TIMEOUT = float(os.getenv("RERANK_TIMEOUT", "3.0"))
+# Successful calls slower than this still count against the circuit breaker
+RERANK_SLOW_SECONDS = float(os.getenv("RERANK_SLOW_SECONDS", "1.5"))
+# Consecutive failed (or slow) calls that open the circuit, and how long it stays open
+RERANK_BREAKER_FAILURES = int(os.getenv("RERANK_BREAKER_FAILURES", "3"))
+RERANK_BREAKER_COOLDOWN = float(os.getenv("RERANK_BREAKER_COOLDOWN", "30"))
+
 class ReRankManager:
     """
     A manager for reranking documents using Cohere's Rerank endpoint.
     Creates the Cohere client once, and provides a method to rerank documents.
+
+    Cohere calls are bounded by RERANK_TIMEOUT. When a call fails, times out,
+    or the circuit breaker is open, the documents are reranked on the CPU by
+    LocalReranker instead. The breaker opens after RERANK_BREAKER_FAILURES
+    consecutive failed or slow calls; once RERANK_BREAKER_COOLDOWN seconds
+    have passed a single trial call is let through, and its outcome closes or
+    re-opens the circuit.
+
+    Cohere scores are cached per (model, query, document) in a RerankCache,
+    so repeated questions and re-ranking the same documents (e.g. the web
+    fallback merging DB candidates) only pay for documents not seen before.
     """
 
     def __init__(
         self,
         cohere_api_key: Optional[str] = None,
         default_model: str = "rerank-v3.5",
-        default_top_n: int = 5
+        default_top_n: int = 5,
+        engine: str = RERANK_ENGINE,
+        embedder=None,
+        cache: Optional[RerankCache] = None
     ):
         """
         :param cohere_api_key: Your Cohere API key. If not provided, will attempt to load from COHERE_API_KEY env var.
         :param default_model: Default Cohere Rerank model, e.g. 'rerank-v3.5' (multilingual) or 'rerank-english-v3.0'.
         :param default_top_n: Default number of top results to return when reranking.
+        :param engine: "cohere" (local reranker as fallback) or "local".
+        :param embedder: Optional EmbeddingsManager the local reranker uses for documents without a similarity.
+        :param cache: Cache of Cohere scores (defaults to the process-wide RerankCache).
         """
+        if engine not in ("cohere", "local"):
+            raise ValueError(f"Unknown rerank engine {engine!r}, expected 'cohere' or 'local'")
+
         if not cohere_api_key:
             cohere_api_key = os.getenv("COHERE_API_KEY")
 
-        if not cohere_api_key:
-            raise ValueError(
-                "No Cohere API key found. Please set COHERE_API_KEY in your environment "
-                "or pass cohere_api_key to ReRankManager."
-            )
+        self.client = None
+        if engine == "cohere":
+            if not cohere_api_key:
+                raise ValueError(
+                    "No Cohere API key found. Please set COHERE_API_KEY in your environment "
+                    "or pass cohere_api_key to ReRankManager (or set RERANK_ENGINE=local)."
+                )
+
+            import cohere  # deferred: heavy SDK import
 
-        self.client = cohere.Client(cohere_api_key)
+            self.client = cohere.Client(cohere_api_key, httpx_client=get_http_client())
+        self.engine = engine
+        self.local_reranker = LocalReranker(embedder)
+        self.cache = cache or get_rerank_cache()
         self.default_model = default_model
         self.default_top_n = default_top_n
+        self.timeout = RERANK_TIMEOUT
+        self._breaker_lock = threading.Lock()
+        self._consecutive_failures = 0
+        self._open_until = 0.0
+        self._trial_in_flight = False
+
+    def breaker_state(self) -> str:
+        """State of the Cohere circuit: closed, open, or half_open (cooldown over, trial call next)."""
+        with self._breaker_lock:
+            if self._consecutive_failures < RERANK_BREAKER_FAILURES:
+                return "closed"
+            return "open" if time.time() < self._open_until or self._trial_in_flight else "half_open"
+
+    def _allow_cohere(self) -> bool:
+        """Whether this call may go to Cohere; claims the trial call when half-open."""
+        with self._breaker_lock:
+            if self._consecutive_failures < RERANK_BREAKER_FAILURES:
+                return True
+            if time.time() < self._open_until or self._trial_in_flight:
+                return False
+            self._trial_in_flight = True
+            return True
+
+    def _record_cohere(self, success: bool) -> None:
+        with self._breaker_lock:
+            self._trial_in_flight = False
+            if success:
+                self._consecutive_failures = 0
+                return
+            self._consecutive_failures += 1
+            if self._consecutive_failures >= RERANK_BREAKER_FAILURES:
+                self._open_until = time.time() + RERANK_BREAKER_COOLDOWN
+                opened = True
+            else:
+                opened = False
+        if opened:
+            metrics.increment("rerank.breaker.opened")
+            logger.warning(f"\n{'='*50}\nWARNING: Cohere rerank circuit open for {RERANK_BREAKER_COOLDOWN:.0f}s, using local reranker\n{'='*50}")
+
+    def _rerank_locally(self, query: str, documents: List[Dict[str, Any]], top_n: int) -> List[Dict[str, Any]]:
+        metrics.increment("rerank.local")
+        return self.local_reranker.rerank_documents(query, documents, top_n=top_n)
 
     def rerank_documents(
         self,
@@ -44,7 +133,7 @@ class ReRankManager:
         model: Optional[str] = None
     ) -> List[Dict[str, Any]]:
         """
-        Re-rank documents using Cohere's Rerank API.
+        Re-rank documents using Cohere's Rerank API, or the local reranker.
 
         :param query: The query you want to search for (str).
         :param documents: A list of documents. 
@@ -54,7 +143,8 @@ class ReRankManager:
         :param top_n: Number of top results to return (defaults to self.default_top_n)
         :param model: Rerank model to use (defaults to self.default_model).
         :return: A list of dictionaries with the original document plus a "relevanceScore".
-                 Sorted by descending relevanceScore.
+                 Sorted by descending relevanceScore. Documents reranked by the local
+                 fallback also carry "reranker": "local".
         """
         if not documents:
             return []
@@ -64,56 +154,59 @@ class ReRankManager:
         if model is None:
             model = self.default_model
 
-        doc_texts = []
-        for doc in documents:
-            if isinstance(doc, dict):
-                # Expecting the actual text in doc["content"]
-                doc_texts.append(doc.get("content", ""))
-            else:
-                # doc is assumed to be a string
-                doc_texts.append(doc)
-
-        try:
-            # Call Cohere's Rerank API
-            rerank_response = self.client.rerank(
-                model=model,
-                query=query,
-                documents=doc_texts,
-                top_n=top_n,
-                return_documents=True
-            )
-
-            # Build a new list with the original docs + relevanceScore
-            reranked_results = []
-            for result in rerank_response.results:
-                # result.index = the original index in the doc_texts
-                orig_doc = documents[result.index]
-                # Convert doc to a dict if it's just a string
-                if isinstance(orig_doc, str):
-                    orig_doc = {"content": orig_doc}
-
-                # Add relevance score
-                reranked_results.append({
-                    **orig_doc,
-                    "relevanceScore": result.relevance_score
-                })
-
-            # Sort by descending relevance
-            reranked_results.sort(key=lambda x: x["relevanceScore"], reverse=True)
-            return reranked_results
-
-        except Exception as e:
-            print(f"Error in reranking: {e}")
-            fallback = []
-            for i, doc in enumerate(documents[:top_n]):
-                if isinstance(doc, str):
-                    doc = {"content": doc}
-                fallback.append({
-                    **doc,
-                    "relevanceScore": 0.0,  
-                })
-            return fallback
-
+        # Convert plain strings to dicts so both engines return the same shape
+        documents = [doc if isinstance(doc, dict) else {"content": doc} for doc in documents]
+        # Expecting the actual text in doc["content"]
+        doc_texts = [doc.get("content", "") for doc in documents]
+
+        if self.engine == "local":
+            return self._rerank_locally(query, documents, top_n)
+
+        # Only documents without a cached score for this query go to Cohere
+        scores = self.cache.get_many(model, query, doc_texts)
+        uncached = list(dict.fromkeys(text for text, score in zip(doc_texts, scores) if score is None))
+        metrics.increment("rerank.cache.hits", len(doc_texts) - scores.count(None))
+        metrics.increment("rerank.cache.misses", scores.count(None))
+
+        if uncached:
+            if not self._allow_cohere():
+                metrics.increment("rerank.breaker.short_circuited")
+                return self._rerank_locally(query, documents, top_n)
+
+            try:
+                # Call Cohere's Rerank API for every uncached document (scores are
+                # cached, so top_n is applied below); no SDK retries, the local
+                # reranker is the retry
+                start = time.perf_counter()
+                rerank_response = self.client.rerank(
+                    model=model,
+                    query=query,
+                    documents=uncached,
+                    top_n=len(uncached),
+                    return_documents=False,
+                    request_options={"timeout_in_seconds": self.timeout, "max_retries": 0}
+                )
+                elapsed = time.perf_counter() - start
+                metrics.observe("rerank.cohere.latency", elapsed)
+                metrics.increment("rerank.cohere")
+                self._record_cohere(success=elapsed <= RERANK_SLOW_SECONDS)
+            except Exception as e:
+                logger.warning(f"Error in reranking: {e}, falling back to local reranker")
+                metrics.increment("rerank.cohere.failed")
+                self._record_cohere(success=False)
+                return self._rerank_locally(query, documents, top_n)
+
+            # result.index = the index in the uncached texts
+            fresh = {uncached[result.index]: result.relevance_score for result in rerank_response.results}
+            self.cache.put_many(model, query, list(fresh), list(fresh.values()))
+            scores = [fresh.get(text, 0.0) if score is None else score for text, score in zip(doc_texts, scores)]
+        else:
+            metrics.increment("rerank.cache.full_hits")
+
+        # Build a new list with the original docs + relevanceScore, by descending relevance
+        reranked_results = [{**doc, "relevanceScore": score} for doc, score in zip(documents, scores)]
+        reranked_results.sort(key=lambda x: x["relevanceScore"], reverse=True)
+        return reranked_results[:top_n]
 
 if __name__ == "__main__":
     reranker = ReRankManager()  
@@ -1,56 +1,142 @@
 # rag_retriever.py
-from typing import List
-import openai
-from langchain_core.documents import Document as LC_Document
 import os
-# setup supabase
-from supabase import create_client, Client
+import logging
+import threading
+from typing import List, Optional, TYPE_CHECKING
 from dotenv import load_dotenv
 
 from .rag_embeddings import EmbeddingsManager
+from .rag_http import share_postgrest_session
+from .rag_vectors import decode_pgvector_binary, to_pgvector_literal
+
+if TYPE_CHECKING:
+    import numpy as np
+    from supabase import Client
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Constants
 DEFAULT_DOCS_LIMIT = 5
 DEFAULT_MIN_SIMILARITY = 0.1
 
+# Slim RPC (SQL/match_documents_slim.sql): projected columns only, embeddings
+# optional and base64-encoded. Falls back to the legacy match_documents RPC
+# (which ships the full embedding as JSON floats) until it is deployed.
+RETRIEVAL_RPC = "match_documents_slim"
+LEGACY_RETRIEVAL_RPC = "match_documents"
+_slim_rpc_available = True
+
+# Reduced-dimension RPC (SQL/match_documents_reduced.sql), used when the
+# embedder produces REDUCED_DIMENSIONS-sized query vectors (EMBEDDING_DIMENSIONS).
+# It never returns embeddings.
+FULL_DIMENSIONS = 1536
+REDUCED_DIMENSIONS = 512
+REDUCED_RETRIEVAL_RPC = "match_documents_reduced"
+
 # Setup Supabase
 SUPABASE_URL = os.environ.get("SUPABASE_URL")
 SUPABASE_KEY = os.environ.get("SUPABASE_ANON_KEY")
-supabase: Client = create_client(SUPABASE_URL, SUPABASE_KEY)  
+
+_supabase: Optional["Client"] = None
+_supabase_lock = threading.Lock()
+
+
+def get_supabase_client() -> "Client":
+    """Shared Supabase client, created on first use rather than at import time."""
+    global _supabase
+    if _supabase is None:
+        with _supabase_lock:
+            if _supabase is None:
+                from supabase import create_client
+
+                client = create_client(SUPABASE_URL, SUPABASE_KEY)
+                share_postgrest_session(client)
+                _supabase = client
+    return _supabase
 
 
 def retrieve_documents(
     user_query: str,
     limit: int = DEFAULT_DOCS_LIMIT,
-    min_similarity: float = DEFAULT_MIN_SIMILARITY
+    min_similarity: float = DEFAULT_MIN_SIMILARITY,
+    embedder: Optional[EmbeddingsManager] = None,
+    include_embedding: bool = False,
+    query_vector: Optional["np.ndarray"] = None
 ) -> List[dict]:
-    """Retrieve documents from Supabase using vector similarity."""
-    embeddings = EmbeddingsManager()
-    query_embedding = embeddings.get_embeddings(user_query)
-    
-    response = supabase.rpc(
-        "match_documents",
-        {
-            "query_embedding": query_embedding,
-            "match_threshold": min_similarity,
-            "match_count": limit
-        }
-    ).execute()
-
-    return response.data or [] 
+    """
+    Retrieve documents from Supabase using vector similarity.
+    Returns id, title, content, url, metadata (authors, journal, date; {} if
+    none is stored), created_at and similarity per document.
+    With include_embedding, each document also gets an "embedding" float32
+    array (shipped base64-encoded rather than as JSON floats).
+    The query embedding is sent as a pgvector text literal built straight
+    from the float32 buffer. If the embedder is in reduced-dimension mode,
+    the reduced RPC is used instead; it returns no embeddings, so
+    include_embedding raises ValueError in that mode.
+    Pass `embedder` to reuse an existing EmbeddingsManager (and its connections),
+    or `query_vector` if the query has already been embedded.
+    """
+    global _slim_rpc_available
+
+    if query_vector is None:
+        embeddings = embedder or EmbeddingsManager()
+        query_vector = embeddings.get_embedding_vector(user_query)
+    params = {
+        "query_embedding": to_pgvector_literal(query_vector),
+        "match_threshold": min_similarity,
+        "match_count": limit
+    }
+
+    if len(query_vector) != FULL_DIMENSIONS:
+        if len(query_vector) != REDUCED_DIMENSIONS:
+            raise ValueError(
+                f"No retrieval index for {len(query_vector)}-d embeddings "
+                f"(supported: {FULL_DIMENSIONS}, {REDUCED_DIMENSIONS})"
+            )
+        if include_embedding:
+            raise ValueError(
+                f"{REDUCED_RETRIEVAL_RPC} does not return embeddings; "
+                f"retrieve with a full-dimension query vector for include_embedding"
+            )
+        response = get_supabase_client().rpc(REDUCED_RETRIEVAL_RPC, params).execute()
+        return _with_metadata(response.data or [])
+
+    if _slim_rpc_available:
+        try:
+            response = get_supabase_client().rpc(
+                RETRIEVAL_RPC, {**params, "include_embedding": include_embedding}
+            ).execute()
+            docs = response.data or []
+            for doc in docs:
+                embedding_b64 = doc.pop("embedding_b64", None)
+                if embedding_b64:
+                    doc["embedding"] = decode_pgvector_binary(embedding_b64)
+            return _with_metadata(docs)
+        except Exception as e:
+            # PGRST202: function not found in the schema cache
+            if getattr(e, "code", None) != "PGRST202":
+                raise
+            logger.warning(f"{RETRIEVAL_RPC} is not deployed, falling back to {LEGACY_RETRIEVAL_RPC}")
+            _slim_rpc_available = False
+
+    response = get_supabase_client().rpc(LEGACY_RETRIEVAL_RPC, params).execute()
+    docs = response.data or []
+    if not include_embedding:
+        for doc in docs:
+            doc.pop("embedding", None)
+    return _with_metadata(docs)
+
+
+def _with_metadata(docs: List[dict]) -> List[dict]:
+    """Every document gets a metadata dict (the legacy RPC does not return one)."""
+    for doc in docs:
+        doc["metadata"] = doc.get("metadata") or {}
+    return docs
 
 
 if __name__ == "__main__":
     docs = retrieve_documents("How can numerical methods model material response under shock and ramp compression, including phase transitions and composite deformation paths?", limit=10)
-    print(docs)
-    # save to json file - without the embedding field but keep the key of embedding and the list empty
-    import json
-    with open("docs.json", "w") as f:
-        # remove the embedding values in each doc
-        docs_without_embedding = [
-            {k: v for k, v in doc.items() if k != "embedding"}
-            for doc in docs
-        ]
-        json.dump(docs_without_embedding, f, default=lambda x: x.__dict__)
+    for doc in docs:
+        print(f"{doc['similarity']:.3f} | {doc.get('title')} | {doc.get('url')}")
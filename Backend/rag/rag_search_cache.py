@@ -0,0 +1,210 @@
+# rag_search_cache.py
+from __future__ import annotations
+
+import os
+import re
+import json
+import time
+import zlib
+import logging
+import sqlite3
+import hashlib
+import tempfile
+import threading
+import unicodedata
+from typing import List, Dict, Optional, Any, TYPE_CHECKING
+
+from dotenv import load_dotenv
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LC_Document
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Defaults to the temp directory, the only writable location on read-only
+# deployments (e.g. Vercel); if the file cannot be opened the cache is kept in memory
+SEARCH_CACHE_PATH = os.getenv("SEARCH_CACHE_PATH", os.path.join(tempfile.gettempdir(), "search_cache.sqlite"))
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalize a search query so near-identical questions share a cache entry:
+    unicode-normalized, lowercased, punctuation stripped and whitespace collapsed.
+    """
+    query = unicodedata.normalize("NFKC", query).lower()
+    query = re.sub(r"[^\w\s]", " ", query)
+    return " ".join(query.split())
+
+
+class SearchCache:
+    """
+    Persistent cache of web search results, stored in a small sqlite database so
+    it survives restarts and is shared by every worker on the host.
+
+    Entries are keyed on the normalized query and requested result count. Each
+    entry expires after its provider's TTL (results from scarce providers are
+    kept longer), and the table is trimmed least-recently-used once it grows past
+    max_bytes. Documents are stored as zlib-compressed compact JSON of
+    [page_content, metadata] pairs.
+    If the database file cannot be opened (read-only filesystem), the cache
+    falls back to an in-memory database for the life of the process.
+    """
+
+    # Seconds a cached result stays fresh, per provider
+    PROVIDER_TTLS = {
+        "tavily": 24 * 60 * 60,
+        "serp": 7 * 24 * 60 * 60,
+        "serper": 7 * 24 * 60 * 60,
+    }
+    DEFAULT_TTL = 24 * 60 * 60
+    DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+    def __init__(self, path: str = SEARCH_CACHE_PATH, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        try:
+            self._conn = self._open(path)
+        except sqlite3.Error as e:
+            logger.warning(f"Search cache {path} unavailable ({e}), caching in memory for this process")
+            self.path = ":memory:"
+            self._conn = self._open(self.path)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=5.0)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS search_cache (
+                key TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                payload BLOB NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_search_cache_access ON search_cache(last_access)")
+        conn.commit()
+        return conn
+
+    @staticmethod
+    def make_key(query: str, results: int, variant: str = "") -> str:
+        return hashlib.sha256(f"{normalize_query(query)}|{results}|{variant}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def _encode(docs: List[LC_Document]) -> bytes:
+        payload = [[doc.page_content, doc.metadata] for doc in docs]
+        return zlib.compress(json.dumps(payload, separators=(",", ":")).encode("utf-8"), 1)
+
+    @staticmethod
+    def _decode(blob: bytes) -> List[LC_Document]:
+        from langchain_core.documents import Document as LC_Document  # deferred: heavy import
+        payload = json.loads(zlib.decompress(blob))
+        return [LC_Document(page_content=content, metadata=metadata) for content, metadata in payload]
+
+    def get(self, query: str, results: int, variant: str = "") -> Optional[List[LC_Document]]:
+        """
+        Return cached documents for this query, or None on a miss or expired entry.
+        `variant` separates otherwise identical searches run with different options.
+        """
+        key = self.make_key(query, results, variant)
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT payload, expires_at FROM search_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None or row[1] <= now:
+                    self.misses += 1
+                    return None
+                self._conn.execute("UPDATE search_cache SET last_access = ? WHERE key = ?", (now, key))
+                self._conn.commit()
+                self.hits += 1
+            return self._decode(row[0])
+        except Exception as e:
+            logger.warning(f"Search cache read error: {e}")
+            return None
+
+    def put(self, query: str, results: int, provider: str, docs: List[LC_Document], variant: str = "") -> None:
+        """Store documents returned by provider for this query."""
+        if not docs:
+            return
+        key = self.make_key(query, results, variant)
+        now = time.time()
+        ttl = self.PROVIDER_TTLS.get(provider, self.DEFAULT_TTL)
+        try:
+            blob = self._encode(docs)
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO search_cache (key, provider, payload, size, expires_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    (key, provider, blob, len(blob), now + ttl, now)
+                )
+                self._evict(now)
+                self._conn.commit()
+        except Exception as e:
+            logger.warning(f"Search cache write error: {e}")
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then least-recently-used ones until under max_bytes."""
+        self._conn.execute("DELETE FROM search_cache WHERE expires_at <= ?", (now,))
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM search_cache").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+        for key, size in self._conn.execute(
+            "SELECT key, size FROM search_cache ORDER BY last_access"
+        ).fetchall():
+            self._conn.execute("DELETE FROM search_cache WHERE key = ?", (key,))
+            total -= size
+            if total <= self.max_bytes:
+                break
+
+    def get_stats(self) -> Dict[str, Any]:
+        with self._lock:
+            entries, total = self._conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM search_cache"
+            ).fetchone()
+        lookups = self.hits + self.misses
+        return {
+            "entries": entries,
+            "bytes": total,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0
+        }
+
+
+_search_cache: Optional[SearchCache] = None
+_search_cache_lock = threading.Lock()
+
+
+def get_search_cache() -> SearchCache:
+    """Process-wide SearchCache instance, opened on first use."""
+    global _search_cache
+    if _search_cache is None:
+        with _search_cache_lock:
+            if _search_cache is None:
+                _search_cache = SearchCache()
+    return _search_cache
+
+
+if __name__ == "__main__":
+    import tempfile
+    from langchain_core.documents import Document as LC_Document
+
+    cache = SearchCache(path=os.path.join(tempfile.mkdtemp(), "search_cache.sqlite"))
+    docs = [LC_Document(page_content="Dolphins sleep with one brain hemisphere at a time.",
+                        metadata={"title": "Unihemispheric sleep", "url": "https://example.org",
+                                  "search_provider": "tavily"})]
+    cache.put("How do dolphins sleep?", 5, "tavily", docs)
+    print(cache.get("how do dolphins   sleep", 5))
+    print(cache.get_stats())
@@ -1,26 +1,42 @@
 # rag_search_manager.py
+from __future__ import annotations
 
 import os
 import json
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError as FuturesTimeout
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple, TYPE_CHECKING
 
 # External libraries
 from dotenv import load_dotenv
-from serpapi import GoogleSearch
-import http.client
-import json as pyjson
-from langchain_core.documents import Document as LC_Document
-from tavily import TavilyClient
+
+from .rag_search_cache import SearchCache, get_search_cache
+from .rag_http import get_http_client
+from .rag_usage_store import UsageStore, UsageStoreError, get_usage_store, current_month, LIFETIME_PERIOD
+from .rag_metrics import metrics
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document as LC_Document
+    from tavily import TavilyClient
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # ========== Provider Keys from .env ==========
 SERP_API_KEY = os.getenv("SERP_API_KEY")
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
 TAVILY_API_KEY = os.getenv("TAVILY_API_KEY")
 
 
+# Shared pool for concurrent provider calls
+_search_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix="search")
+
+# Serper client on the process-wide keep-alive transport
+_serper_client = get_http_client(base_url="https://google.serper.dev")
+
+
 # ========== Domains Setup ==========
 DOMAINS = [
     "scholar.google.com", "ncbi.nlm.nih.gov/pmc", "arxiv.org", "sciencedirect.com",
@@ -31,13 +47,20 @@ DOMAINS = [
 ]
 
 
-def web_search_tavily(client: TavilyClient, query: str, max_results: int = 5) -> List[LC_Document]:
-    """Perform web search using Tavily API with restricted domains."""
+def web_search_tavily(
+    client: TavilyClient,
+    query: str,
+    max_results: int = 5,
+    search_depth: str = "advanced"
+) -> List[LC_Document]:
+    """Perform web search using Tavily API with restricted domains. search_depth is "basic" or "advanced"."""
+    from langchain_core.documents import Document as LC_Document  # deferred: heavy import
+
     documents = []
     try:
         search_result = client.search(
             query=query,
-            search_depth="advanced",
+            search_depth=search_depth,
             max_results=max_results,
             include_domains=DOMAINS
         )
@@ -57,6 +80,8 @@ def web_search_tavily(client: TavilyClient, query: str, max_results: int = 5) ->
 
 def serp_search(api_key: str, query: str, num_results: int = 5) -> List[LC_Document]:
     """Perform Google search using SERP API."""
+    from langchain_core.documents import Document as LC_Document  # deferred: heavy import
+
     documents = []
     if not api_key:
         print("No SERP_API_KEY provided.")
@@ -69,6 +94,8 @@ def serp_search(api_key: str, query: str, num_results: int = 5) -> List[LC_Docum
             "num": num_results,
             "api_key": api_key
         }
+        from serpapi import GoogleSearch  # deferred: heavy SDK import
+
         search = GoogleSearch(params)
         results = search.get_dict()
 
@@ -103,21 +130,21 @@ def serp_search(api_key: str, query: str, num_results: int = 5) -> List[LC_Docum
 
 def scholar_search_serper(api_key: str, query: str) -> List[LC_Document]:
     """Perform Google Scholar search using Serper API."""
+    from langchain_core.documents import Document as LC_Document  # deferred: heavy import
+
     documents = []
     if not api_key:
         print("No SERPER_API_KEY provided.")
         return documents
 
     try:
-        conn = http.client.HTTPSConnection("google.serper.dev")
-        payload = pyjson.dumps({"q": query})
-        headers = {
-            'X-API-KEY': api_key,
-            'Content-Type': 'application/json'
-        }
-        conn.request("POST", "/scholar", payload, headers)
-        response = conn.getresponse()
-        data = pyjson.loads(response.read().decode("utf-8"))
+        response = _serper_client.post(
+            "/scholar",
+            json={"q": query},
+            headers={'X-API-KEY': api_key}
+        )
+        response.raise_for_status()
+        data = response.json()
 
         for result in data.get('organic', []):
             doc = LC_Document(
@@ -145,34 +172,73 @@ class SearchManager:
     they refresh monthly. If a provider is out of usage (or no API key),
     skip it. Serper is used if the others are also either out or by rotation.
 
-    Usage counters are persisted on disk (usage.json) so that restarting
-    the app does not lose the usage info.
+    Usage counters are kept in a sqlite UsageStore (WAL mode) so that
+    restarts, crashes and multiple workers never lose or double-spend quota.
+    Each call reserves quota atomically before it is made; calls that raise
+    are given back, since the providers only bill successful searches. If
+    the store itself fails, searches go ahead uncharged rather than being
+    treated as out of quota.
+
+    Results are cached in a persistent SearchCache keyed on the normalized
+    query; a cache hit returns immediately and is not charged to any provider.
     """
 
-    USAGE_FILE = "usage.json"
+    USAGE_FILE = "usage.json"  # legacy counters, imported into the usage store once
     TAVILY_MONTHLY_LIMIT = 1000
     SERP_MONTHLY_LIMIT = 100
     SERPER_LIFETIME_LIMIT = 2400
-
-    def __init__(self):
+    QUOTAS = {
+        "tavily": (TAVILY_MONTHLY_LIMIT, "monthly"),
+        "serp": (SERP_MONTHLY_LIMIT, "monthly"),
+        "serper": (SERPER_LIFETIME_LIMIT, "lifetime"),
+    }
+
+    # Concurrent ("race"/"merge") search policy
+    DEFAULT_SEARCH_MODE = os.getenv("SEARCH_MODE", "sequential")
+    CONCURRENT_DEADLINE = float(os.getenv("SEARCH_CONCURRENT_DEADLINE", "6.0"))  # seconds
+    # A provider joins a race only while more than this fraction of its quota
+    # remains. 1.0 means never: SERP's 100/month is kept for sequential fallback.
+    CONCURRENT_RESERVE_FRACTION = {
+        "tavily": 0.2,
+        "serp": 1.0,
+        "serper": 0.1,
+    }
+    # Speculative searches (started before we know the web is needed, see
+    # RAG) may only use a provider while more than this fraction remains.
+    SPECULATIVE_RESERVE_FRACTION = {
+        "tavily": 0.3,
+        "serp": 1.0,
+        "serper": 0.25,
+    }
+
+    def __init__(self, cache: Optional[SearchCache] = None, usage_store: Optional[UsageStore] = None):
         # Providers in desired rotation order:
         #   TAVILY -> SERP -> SERPER -> repeat ...
         self.providers = ["tavily", "serp", "serper"]
         self.current_index = 0
 
-        # Load usage from disk
-        self.usage = self._load_usage()
+        # Shared quota store (sqlite, safe across workers); seed it from the
+        # legacy usage.json the first time
+        self.usage_store = usage_store or get_usage_store()
+        self.usage_store.import_legacy_json(self.USAGE_FILE)
+
+        # Shared persistent result cache
+        self.cache = cache or get_search_cache()
 
         # Initialize API clients here after ensuring environment variables are loaded
-        self.tavily_client = TavilyClient(api_key=TAVILY_API_KEY) if TAVILY_API_KEY else None
+        self.tavily_client = None
+        if TAVILY_API_KEY:
+            from tavily import TavilyClient  # deferred: heavy SDK import
+            self.tavily_client = TavilyClient(api_key=TAVILY_API_KEY)
         # SERP and Serper don't require client initialization here
 
-        # Possibly reset monthly usage if the month changed
-        self._reset_monthly_usage_if_needed("tavily")
-        self._reset_monthly_usage_if_needed("serp")
-        # We do NOT reset Serper usage automatically (it's lifetime).
-
-    def search(self, query: str, results: int = 5) -> List[LC_Document]:
+    def search(
+        self,
+        query: str,
+        results: int = 5,
+        mode: Optional[str] = None,
+        depth: str = "advanced"
+    ) -> List[LC_Document]:
         """
         High-level search method:
           1) Round-robin among providers [TAVILY -> SERP -> SERPER -> ...]
@@ -181,7 +247,35 @@ class SearchManager:
                - doc.page_content
                - doc.metadata['title'], doc.metadata['url'], doc.metadata['search_date']
                - doc.metadata['search_provider']
+        Cached results are returned without touching the usage counters.
+
+        :param mode: "sequential" (default) tries providers one after another,
+                     "race" queries the concurrent-eligible providers at once and
+                     returns the first non-empty result, "merge" queries them at
+                     once and merges whatever arrives before CONCURRENT_DEADLINE.
+                     Concurrent modes fall back to sequential when fewer than two
+                     providers are within their race budget.
+        :param depth: Tavily search depth, "basic" (fast, cheap) or "advanced".
+                      Other providers ignore it.
         """
+        cached_docs = self.cache.get(query, results, variant=depth)
+        if cached_docs:
+            return cached_docs
+
+        mode = mode or self.DEFAULT_SEARCH_MODE
+        attempted = set()
+        if mode in ("race", "merge"):
+            providers = self._concurrent_providers()
+            if len(providers) >= 2:
+                if mode == "race":
+                    provider, docs, attempted = self._race_search(providers, query, results, depth)
+                else:
+                    provider, docs, attempted = self._merge_search(providers, query, results, depth)
+                if docs:
+                    self.cache.put(query, results, provider, docs, variant=depth)
+                    return docs
+                # Nothing came back concurrently; sequential rotation below only
+                # tries the remaining providers (e.g. SERP), so none is charged twice.
 
         attempts = 0
         max_attempts = len(self.providers)
@@ -193,33 +287,178 @@ class SearchManager:
             attempts += 1
 
             # Check usage and key for this provider
-            if not self._can_use_provider(provider):
+            if provider in attempted or not self._can_use_provider(provider):
                 continue  # skip to next in rotation
 
-            # Actually use this provider
-            docs = self._call_provider_search(provider, query, results)
+            # Actually use this provider (charged whether or not it finds anything)
+            docs = self._search_and_charge(provider, query, results, depth)
             if docs:
-                # Update usage counters
-                self._increment_usage(provider)
-
-                # Save to disk
-                self._save_usage()
-
+                self.cache.put(query, results, provider, docs, variant=depth)
                 return docs
 
         # If we exhaust all providers, no results
         print("All providers are either out of usage or missing API keys.")
         return []
 
+    def speculative_search(
+        self,
+        query: str,
+        results: int = 5,
+        depth: str = "basic"
+    ) -> Optional[List[LC_Document]]:
+        """
+        A search that may turn out to be unnecessary. Served from the cache when
+        possible; otherwise only providers above their SPECULATIVE_RESERVE_FRACTION
+        are used, so speculation never eats into the quota kept for searches we
+        know we need. Returns None if the quota policy declines.
+        """
+        cached_docs = self.cache.get(query, results, variant=depth)
+        if cached_docs:
+            return cached_docs
+
+        for provider in self.providers:
+            reserve = self.SPECULATIVE_RESERVE_FRACTION.get(provider, 1.0)
+            if reserve >= 1.0 or not self._can_use_provider(provider):
+                continue
+            try:
+                if self._remaining_fraction(provider) <= reserve:
+                    continue
+            except UsageStoreError as e:
+                # Speculation is optional: don't spend quota we cannot see
+                logger.warning(f"Usage store failure, skipping speculative {provider} search: {e}")
+                continue
+            docs = self._search_and_charge(provider, query, results, depth)
+            if docs:
+                self.cache.put(query, results, provider, docs, variant=depth)
+                return docs
+        return None
+
+    # ---------- Concurrent search ----------
+
+    def _concurrent_providers(self) -> List[str]:
+        """
+        Providers allowed in a concurrent race, in rotation priority order.
+        A provider qualifies only while it keeps more than its reserve fraction
+        of quota, so races never drain a scarce quota (SERP is never raced).
+        A provider whose usage cannot be read is left to the sequential path.
+        """
+        eligible = []
+        for provider in self.providers:
+            reserve = self.CONCURRENT_RESERVE_FRACTION.get(provider, 1.0)
+            if reserve >= 1.0 or not self._can_use_provider(provider):
+                continue
+            try:
+                if self._remaining_fraction(provider) > reserve:
+                    eligible.append(provider)
+            except UsageStoreError as e:
+                logger.warning(f"Usage store failure, not racing {provider}: {e}")
+        return eligible
+
+    def _race_search(self, providers: List[str], query: str, results: int, depth: str = "advanced"):
+        """
+        Query providers concurrently. Returns (provider, docs, attempted): the
+        first non-empty result, or (None, []) if there is none before the
+        deadline, and the set of providers whose call was actually made.
+        """
+        futures = {
+            _search_pool.submit(self._search_and_charge, provider, query, results, depth): provider
+            for provider in providers
+        }
+        attempted = set(providers)
+        winner, winning_docs = None, []
+        try:
+            for future in as_completed(futures, timeout=self.CONCURRENT_DEADLINE):
+                docs = future.result()
+                if docs:
+                    winner, winning_docs = futures[future], docs
+                    break
+        except FuturesTimeout:
+            print(f"Search race timed out after {self.CONCURRENT_DEADLINE}s")
+        finally:
+            # Calls that have not started yet are never made (and never charged);
+            # calls already in flight finish in the background and charge themselves.
+            for future, provider in futures.items():
+                if future.cancel():
+                    attempted.discard(provider)
+        return winner, winning_docs, attempted
+
+    def _merge_search(self, providers: List[str], query: str, results: int, depth: str = "advanced"):
+        """
+        Query providers concurrently and merge everything that arrives before
+        the deadline, deduplicated by URL and capped at `results` documents.
+        Returns (first provider with results, docs, attempted providers).
+        """
+        futures = {
+            _search_pool.submit(self._search_and_charge, provider, query, results, depth): provider
+            for provider in providers
+        }
+        attempted = set(providers)
+        done, not_done = wait(futures, timeout=self.CONCURRENT_DEADLINE)
+        for future in not_done:
+            if future.cancel():
+                attempted.discard(futures[future])
+
+        merged: List[LC_Document] = []
+        seen_urls = set()
+        first_provider = None
+        # Keep rotation priority order so the preferred provider's results lead
+        for future in sorted(done, key=lambda f: providers.index(futures[f])):
+            docs = future.result()
+            if docs and first_provider is None:
+                first_provider = futures[future]
+            for doc in docs:
+                url = doc.metadata.get("url")
+                if url and url in seen_urls:
+                    continue
+                seen_urls.add(url)
+                merged.append(doc)
+        return first_provider, merged[:results], attempted
+
+    def _search_and_charge(
+        self,
+        provider: str,
+        query: str,
+        max_results: int,
+        depth: str = "advanced"
+    ) -> List[LC_Document]:
+        """
+        Reserve quota, call the provider and charge the call, whether or not it
+        returned documents. A call that raises is released instead of charged.
+        Returns [] without calling if the quota is exhausted. If the usage
+        store fails, the call is made uncharged and the failure logged.
+        """
+        try:
+            reservation = self._reserve_usage(provider)
+        except UsageStoreError as e:
+            metrics.increment("search_quota.store_errors")
+            logger.error(f"Usage store failure, calling {provider.upper()} without quota accounting: {e}")
+            return self._call_provider_search(provider, query, max_results, depth)
+        if reservation is None:
+            print(f"{provider.upper()} quota exhausted, skipping.")
+            return []
+        try:
+            docs = self._call_provider_search(provider, query, max_results, depth)
+        except Exception:
+            self.usage_store.release(reservation)
+            raise
+        self.usage_store.commit(reservation)
+        return docs
+
     # ---------- Internals ----------
 
-    def _call_provider_search(self, provider: str, query: str, max_results: int) -> List[LC_Document]:
+    def _call_provider_search(
+        self,
+        provider: str,
+        query: str,
+        max_results: int,
+        depth: str = "advanced"
+    ) -> List[LC_Document]:
         """Calls the appropriate search function based on the provider name, adds provider to metadata."""
         if provider == "tavily":
             if not self.tavily_client:
                 print("Tavily client is not initialized.")
                 return []
-            docs = web_search_tavily(self.tavily_client, query, max_results)
+            docs = web_search_tavily(self.tavily_client, query, max_results, search_depth=depth)
         elif provider == "serp":
             docs = serp_search(SERP_API_KEY, query, max_results)
         elif provider == "serper":
@@ -231,9 +470,11 @@ class SearchManager:
             print(f"No documents found from provider: {provider}")
             return []
 
-        # Attach the provider name to each doc's metadata
+        # Attach the provider name (and Tavily depth) to each doc's metadata
         for doc in docs:
             doc.metadata["search_provider"] = provider
+            if provider == "tavily":
+                doc.metadata["search_depth"] = depth
 
         return docs
 
@@ -242,92 +483,44 @@ class SearchManager:
         if provider == "tavily":
             if not self.tavily_client:
                 return False
-            usage = self.usage["tavily"]["usage"]
-            if usage >= self.TAVILY_MONTHLY_LIMIT:
-                print("Tavily usage limit reached.")
-                return False
-            return True
-
         elif provider == "serp":
             if not SERP_API_KEY:
                 return False
-            usage = self.usage["serp"]["usage"]
-            if usage >= self.SERP_MONTHLY_LIMIT:
-                print("SERP usage limit reached.")
-                return False
-            return True
-
         elif provider == "serper":
             if not SERPER_API_KEY:
                 return False
-            usage = self.usage["serper"]["lifetime_usage"]
-            if usage >= self.SERPER_LIFETIME_LIMIT:
-                print("SERPER usage limit (2400) reached. Please update your API key.")
-                return False
-            return True
-
-        return False
-
-    def _increment_usage(self, provider: str) -> None:
-        """Increment usage for the chosen provider."""
-        if provider == "tavily":
-            self._reset_monthly_usage_if_needed(provider)
-            self.usage["tavily"]["usage"] += 1
-
-        elif provider == "serp":
-            self._reset_monthly_usage_if_needed(provider)
-            self.usage["serp"]["usage"] += 1
+        else:
+            return False
 
-        elif provider == "serper":
-            # Lifetime usage
-            self.usage["serper"]["lifetime_usage"] += 1
-
-    # ---------- Usage Persistence ----------
-
-    def _load_usage(self) -> Dict:
-        """Load usage data from disk, or return defaults if not found."""
-        if not os.path.exists(self.USAGE_FILE):
-            # Return a default structure
-            now = datetime.utcnow()
-            month_str = now.strftime("%Y-%m")
-            return {
-                "tavily": {"month": month_str, "usage": 0},
-                "serp": {"month": month_str, "usage": 0},
-                "serper": {"lifetime_usage": 0},
-            }
-        try:
-            with open(self.USAGE_FILE, "r") as f:
-                data = json.load(f)
-            return data
-        except Exception as e:
-            print(f"Error loading usage file: {e}")
-            # fallback
-            now = datetime.utcnow()
-            month_str = now.strftime("%Y-%m")
-            return {
-                "tavily": {"month": month_str, "usage": 0},
-                "serp": {"month": month_str, "usage": 0},
-                "serper": {"lifetime_usage": 0},
-            }
-
-    def _save_usage(self) -> None:
-        """Save current usage structure to disk."""
         try:
-            with open(self.USAGE_FILE, "w") as f:
-                json.dump(self.usage, f, indent=2)
-        except Exception as e:
-            print(f"Error saving usage file: {e}")
-
-    def _reset_monthly_usage_if_needed(self, provider: str) -> None:
-        """If the month changed, reset usage to 0 for that provider."""
-        now = datetime.utcnow()
-        curr_month_str = now.strftime("%Y-%m")
-        record_month = self.usage[provider].get("month", "")
-
-        if curr_month_str != record_month:
-            # new month -> reset usage
-            self.usage[provider]["usage"] = 0
-            self.usage[provider]["month"] = curr_month_str
+            if self._remaining_fraction(provider) <= 0:
+                print(f"{provider.upper()} usage limit ({self.QUOTAS[provider][0]}) reached.")
+                return False
+        except UsageStoreError as e:
+            # Unknown usage does not disable search; _search_and_charge handles the store failure
+            logger.error(f"Usage store failure while checking {provider.upper()} quota: {e}")
+        return True
+
+    def _remaining_fraction(self, provider: str) -> float:
+        """Fraction of the provider's monthly/lifetime quota still available (reservations count as used)."""
+        limit, period = self._quota(provider)
+        return 1.0 - self.usage_store.consumed(provider, period) / limit
+
+    # ---------- Usage Accounting ----------
+
+    def _quota(self, provider: str) -> Tuple[int, str]:
+        """(limit, period) for a provider; monthly quotas roll over with the calendar month."""
+        limit, kind = self.QUOTAS[provider]
+        return limit, current_month() if kind == "monthly" else LIFETIME_PERIOD
+
+    def _reserve_usage(self, provider: str) -> Optional[str]:
+        """Atomically reserve one call against the provider's quota (shared across workers)."""
+        limit, period = self._quota(provider)
+        return self.usage_store.reserve(provider, period, limit)
+
+    def get_usage(self) -> Dict[str, Dict[str, int]]:
+        """Current quota usage per provider and period."""
+        return self.usage_store.snapshot()
 
 if __name__ == "__main__":
     from rich import print
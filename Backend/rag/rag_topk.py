@@ -0,0 +1,92 @@
+# rag_topk.py
+import os
+from typing import Any, Dict, List, Optional, Sequence
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Adaptive top-k: over-fetch DB candidates and cut the reranked and context
+# document lists where the scores say the relevant documents end
+ADAPTIVE_TOPK = os.getenv("ADAPTIVE_TOPK", "true").lower() == "true"
+# Fewest documents kept by a cut (unless fewer are available)
+TOPK_MIN_DOCS = int(os.getenv("TOPK_MIN_DOCS", "2"))
+# Share of the total score (above the floor) the kept documents must cover
+TOPK_SCORE_MASS = float(os.getenv("TOPK_SCORE_MASS", "0.9"))
+# A drop between neighbouring scores of at least this fraction of the best
+# score (above the floor) ends the list
+TOPK_GAP = float(os.getenv("TOPK_GAP", "0.3"))
+
+
+def adaptive_k(
+    scores: Sequence[float],
+    floor: float = 0.0,
+    min_k: int = TOPK_MIN_DOCS,
+    max_k: Optional[int] = None,
+    mass: float = TOPK_SCORE_MASS,
+    gap: float = TOPK_GAP
+) -> int:
+    """
+    Number of leading documents to keep, given their scores sorted best
+    first. Scores are measured above floor (e.g. the similarity threshold
+    the documents already passed). The cut is the earlier of:
+      - gap detection: the first drop of at least gap * best score;
+      - score mass: the fewest documents covering `mass` of the total score;
+    and never fewer than min_k.
+    A peaked distribution (easy question, one or two clearly relevant
+    documents) keeps few documents; a flat one keeps up to max_k.
+    """
+    import numpy as np  # deferred: heavy import
+
+    s = np.clip(np.asarray(scores[:max_k], dtype=np.float64) - floor, 0.0, None)
+    n = len(s)
+    if n <= min_k:
+        return n
+    if s[0] <= 0:
+        return min_k
+
+    cumulative = np.cumsum(s) / s.sum()
+    mass_k = int(np.searchsorted(cumulative, mass - 1e-9)) + 1
+    # drops[i] is the drop after document i; cutting there keeps i + 1 documents
+    drops = (s[:-1] - s[1:]) / s[0]
+    large = np.flatnonzero(drops >= gap)
+    gap_k = int(large[0]) + 1 if len(large) else n
+    return max(min_k, min(mass_k, gap_k))
+
+
+def cut_by_score(
+    docs: List[Dict[str, Any]],
+    key: str,
+    floor: float = 0.0,
+    max_k: Optional[int] = None,
+    min_k: int = TOPK_MIN_DOCS
+) -> List[Dict[str, Any]]:
+    """The best docs by doc[key], cut at adaptive_k."""
+    ranked = sorted(docs, key=lambda d: d.get(key, 0.0), reverse=True)
+    k = adaptive_k([d.get(key, 0.0) for d in ranked], floor=floor, min_k=min_k, max_k=max_k)
+    return ranked[:k]
+
+
+if __name__ == "__main__":
+    from .rag_context import count_tokens
+
+    # Documents reranked and sent to the LLM with a fixed k versus adaptive k,
+    # for typical reranker score profiles (~250-token abstracts)
+    abstract = "Word " * 250
+    tokens_per_doc = count_tokens(abstract)
+    fixed_k = 5
+    profiles = {
+        "easy (one clear match)": [0.92, 0.21, 0.12, 0.08, 0.05],
+        "medium (two strong)": [0.81, 0.74, 0.22, 0.15, 0.09],
+        "hard (flat)": [0.41, 0.38, 0.35, 0.33, 0.31],
+        "weak (all low)": [0.12, 0.10, 0.09, 0.05, 0.02],
+    }
+    print(f"{'profile':<26}{'fixed docs':>11}{'adaptive':>10}{'fixed tok':>11}{'adaptive tok':>14}")
+    total_fixed = total_adaptive = 0
+    for name, scores in profiles.items():
+        k = adaptive_k(scores, max_k=fixed_k)
+        total_fixed += fixed_k * tokens_per_doc
+        total_adaptive += k * tokens_per_doc
+        print(f"{name:<26}{fixed_k:>11}{k:>10}{fixed_k * tokens_per_doc:>11}{k * tokens_per_doc:>14}")
+    print(f"Context tokens over these profiles: {total_fixed} -> {total_adaptive} "
+          f"({1 - total_adaptive / total_fixed:.0%} fewer)")
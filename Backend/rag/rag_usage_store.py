@@ -0,0 +1,286 @@
+# rag_usage_store.py
+import os
+import json
+import time
+import uuid
+import atexit
+import logging
+import sqlite3
+import tempfile
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Defaults to the temp directory, the only writable location on read-only
+# deployments (e.g. Vercel); if the file cannot be opened usage is counted in memory
+USAGE_DB_PATH = os.getenv("USAGE_DB_PATH", os.path.join(tempfile.gettempdir(), "usage.sqlite"))
+
+LIFETIME_PERIOD = "lifetime"
+
+
+class UsageStoreError(Exception):
+    """The usage database could not be read or written (e.g. locked past the timeout)."""
+
+
+def current_month() -> str:
+    return datetime.utcnow().strftime("%Y-%m")
+
+
+class UsageStore:
+    """
+    Crash-safe, multi-process-safe quota accounting for the search providers.
+
+    Counters live in a sqlite database in WAL mode, so several uvicorn workers
+    (or threads) can share one quota without lost increments, and a crash can
+    never leave a half-written file behind.
+
+    Accounting is reservation based:
+      1. reserve() atomically checks used + outstanding reservations against the
+         limit and records a reservation (one short write transaction). The call
+         to the provider is only made if this succeeds, so concurrent workers
+         can never overshoot a quota.
+      2. commit() / release() only queue the outcome in memory; a background
+         thread applies them in one batched transaction every FLUSH_INTERVAL
+         seconds, so settling a call never blocks a request.
+    Reservations left behind by a crashed worker are counted as used once they
+    are older than RESERVATION_TTL, which errs on the side of the quota.
+
+    If the database file cannot be opened (read-only filesystem), usage is
+    counted in an in-memory database for the life of the process instead.
+    """
+
+    FLUSH_INTERVAL = 2.0  # seconds
+    RESERVATION_TTL = 10 * 60  # seconds
+
+    def __init__(self, path: str = USAGE_DB_PATH):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            self._conn = self._open(path)
+        except sqlite3.Error as e:
+            logger.warning(f"Usage store {path} unavailable ({e}), counting quota in memory for this process")
+            self.path = ":memory:"
+            self._conn = self._open(self.path)
+
+        # (reservation_id, committed) outcomes waiting for the flusher
+        self._outcomes: List[Tuple[str, bool]] = []
+        self._outcomes_lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    @staticmethod
+    def _open(path: str) -> sqlite3.Connection:
+        conn = sqlite3.connect(path, check_same_thread=False, timeout=10.0, isolation_level=None)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quota_usage (
+                provider TEXT NOT NULL,
+                period TEXT NOT NULL,
+                used INTEGER NOT NULL DEFAULT 0,
+                PRIMARY KEY (provider, period)
+            )
+            """
+        )
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS quota_reservations (
+                id TEXT PRIMARY KEY,
+                provider TEXT NOT NULL,
+                period TEXT NOT NULL,
+                created_at REAL NOT NULL
+            )
+            """
+        )
+        conn.execute(
+            "CREATE INDEX IF NOT EXISTS idx_quota_reservations_provider ON quota_reservations(provider, period)"
+        )
+        return conn
+
+    # ---------- Reservations ----------
+
+    def reserve(self, provider: str, period: str, limit: int) -> Optional[str]:
+        """
+        Atomically reserve one unit of quota. Returns a reservation ID, or None
+        if the provider's quota for this period is exhausted. Raises
+        UsageStoreError if the database fails, so callers can tell a broken
+        store from an exhausted quota.
+        """
+        reservation_id = uuid.uuid4().hex
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    if self._consumed(provider, period) >= limit:
+                        self._conn.execute("ROLLBACK")
+                        return None
+                    self._conn.execute(
+                        "INSERT INTO quota_reservations (id, provider, period, created_at) VALUES (?, ?, ?, ?)",
+                        (reservation_id, provider, period, time.time())
+                    )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+            return reservation_id
+        except sqlite3.Error as e:
+            raise UsageStoreError(f"could not reserve {provider} quota: {e}") from e
+
+    def commit(self, reservation_id: str) -> None:
+        """Mark a reservation as used (the provider call was made)."""
+        self._queue_outcome(reservation_id, True)
+
+    def release(self, reservation_id: str) -> None:
+        """Give a reservation back (the provider call failed and is not billed)."""
+        self._queue_outcome(reservation_id, False)
+
+    def consumed(self, provider: str, period: str) -> int:
+        """Units used plus units currently reserved for this provider and period."""
+        try:
+            with self._lock:
+                return self._consumed(provider, period)
+        except sqlite3.Error as e:
+            raise UsageStoreError(f"could not read {provider} usage: {e}") from e
+
+    def _consumed(self, provider: str, period: str) -> int:
+        row = self._conn.execute(
+            "SELECT "
+            "COALESCE((SELECT used FROM quota_usage WHERE provider = ? AND period = ?), 0) + "
+            "(SELECT COUNT(*) FROM quota_reservations WHERE provider = ? AND period = ?)",
+            (provider, period, provider, period)
+        ).fetchone()
+        return row[0]
+
+    # ---------- Background flush ----------
+
+    def _queue_outcome(self, reservation_id: str, committed: bool) -> None:
+        with self._outcomes_lock:
+            self._outcomes.append((reservation_id, committed))
+        if self._flusher is None or not self._flusher.is_alive():
+            self._flusher = threading.Thread(target=self._flush_loop, name="usage-flusher", daemon=True)
+            self._flusher.start()
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_event.wait(self.FLUSH_INTERVAL)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Apply queued commits/releases and expire stale reservations in one transaction."""
+        with self._outcomes_lock:
+            outcomes, self._outcomes = self._outcomes, []
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for reservation_id, committed in outcomes:
+                        self._settle(reservation_id, committed)
+                    stale = self._conn.execute(
+                        "SELECT id FROM quota_reservations WHERE created_at < ?",
+                        (time.time() - self.RESERVATION_TTL,)
+                    ).fetchall()
+                    for (reservation_id,) in stale:
+                        self._settle(reservation_id, True)
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except Exception as e:
+            logger.warning(f"Error flushing usage store: {e}")
+            with self._outcomes_lock:
+                self._outcomes = outcomes + self._outcomes
+
+    def _settle(self, reservation_id: str, committed: bool) -> None:
+        row = self._conn.execute(
+            "SELECT provider, period FROM quota_reservations WHERE id = ?", (reservation_id,)
+        ).fetchone()
+        if row is None:
+            return
+        self._conn.execute("DELETE FROM quota_reservations WHERE id = ?", (reservation_id,))
+        if committed:
+            self._add_used(row[0], row[1], 1)
+
+    def _add_used(self, provider: str, period: str, amount: int) -> None:
+        self._conn.execute(
+            "INSERT INTO quota_usage (provider, period, used) VALUES (?, ?, ?) "
+            "ON CONFLICT (provider, period) DO UPDATE SET used = used + excluded.used",
+            (provider, period, amount)
+        )
+
+    # ---------- Migration ----------
+
+    def import_legacy_json(self, path: str) -> None:
+        """
+        One-time import of the old usage.json counters. Only seeds periods the
+        store has not seen yet, so running it again is harmless.
+        """
+        if not os.path.exists(path):
+            return
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"Could not import legacy usage file {path}: {e}")
+            return
+
+        seeds: Dict[Tuple[str, str], int] = {}
+        for provider in ("tavily", "serp"):
+            record = data.get(provider, {})
+            if record.get("month") and record.get("usage"):
+                seeds[(provider, record["month"])] = int(record["usage"])
+        lifetime = data.get("serper", {}).get("lifetime_usage")
+        if lifetime:
+            seeds[("serper", LIFETIME_PERIOD)] = int(lifetime)
+
+        try:
+            with self._lock:
+                self._conn.execute("BEGIN IMMEDIATE")
+                try:
+                    for (provider, period), used in seeds.items():
+                        self._conn.execute(
+                            "INSERT OR IGNORE INTO quota_usage (provider, period, used) VALUES (?, ?, ?)",
+                            (provider, period, used)
+                        )
+                    self._conn.execute("COMMIT")
+                except Exception:
+                    self._conn.execute("ROLLBACK")
+                    raise
+        except sqlite3.Error as e:
+            logger.warning(f"Could not import legacy usage file {path}: {e}")
+
+    def snapshot(self) -> Dict[str, Dict[str, int]]:
+        """Current used/reserved counts per provider and period."""
+        with self._lock:
+            result: Dict[str, Dict[str, int]] = {}
+            for provider, period, used in self._conn.execute(
+                "SELECT provider, period, used FROM quota_usage"
+            ).fetchall():
+                result.setdefault(provider, {})[period] = used
+            for provider, period, reserved in self._conn.execute(
+                "SELECT provider, period, COUNT(*) FROM quota_reservations GROUP BY provider, period"
+            ).fetchall():
+                result.setdefault(provider, {})[f"{period}:reserved"] = reserved
+            return result
+
+
+_usage_store: Optional[UsageStore] = None
+_usage_store_lock = threading.Lock()
+
+
+def get_usage_store() -> UsageStore:
+    """Process-wide UsageStore instance, opened on first use."""
+    global _usage_store
+    if _usage_store is None:
+        with _usage_store_lock:
+            if _usage_store is None:
+                _usage_store = UsageStore()
+    return _usage_store
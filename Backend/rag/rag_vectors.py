@@ -0,0 +1,169 @@
+# rag_vectors.py
+import base64
+from functools import lru_cache
+from typing import List, Optional, Sequence, Tuple, TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Embedding vectors are handled as contiguous float32 NumPy buffers end to end:
+# OpenAI returns them base64-encoded, pgvector receives a text literal and
+# sends them back in its binary form. Per-element Python floats exist only
+# transiently while the pgvector literal is formatted.
+
+
+def decode_base64_float32(data: str) -> "np.ndarray":
+    """Decode a base64 little-endian float32 buffer (OpenAI encoding_format="base64")."""
+    import numpy as np  # deferred: heavy import
+
+    return np.frombuffer(base64.b64decode(data), dtype="<f4")
+
+
+def decode_pgvector_binary(data: str) -> "np.ndarray":
+    """
+    Decode base64 of pgvector's binary form (vector_send: int16 dim, int16
+    unused, then dim big-endian float32s) into a native float32 array.
+    """
+    import numpy as np  # deferred: heavy import
+
+    raw = base64.b64decode(data)
+    dim = int.from_bytes(raw[:2], "big")
+    return np.frombuffer(raw, dtype=">f4", count=dim, offset=4).astype(np.float32)
+
+
+@lru_cache(maxsize=8)
+def _literal_format(dim: int) -> str:
+    # %.9g round-trips every float32 exactly
+    return "[" + ",".join(["%.9g"] * dim) + "]"
+
+
+def to_pgvector_literal(vector: "np.ndarray") -> str:
+    """
+    Format a vector as a pgvector text literal, e.g. "[0.1,0.2,...]", in one
+    %-format pass over a cached template. The floats boxed by tolist() only
+    live for the call; formatting from the buffer (astype(str), np.char.mod)
+    avoids them but is about 4x slower.
+    """
+    return _literal_format(len(vector)) % tuple(vector.tolist())
+
+
+QUANTIZED_DTYPES = ("float32", "float16", "int8")
+
+
+def _normalize(vectors: "np.ndarray", dimensions: Optional[int] = None) -> "np.ndarray":
+    """Truncate rows to their first `dimensions` components and L2-normalize them, as float32."""
+    import numpy as np  # deferred: heavy import
+
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    if dimensions:
+        vectors = vectors[:, :dimensions]
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def _quantize(vectors: "np.ndarray", dtype: str) -> Tuple["np.ndarray", int]:
+    """Round-trip normalized vectors through dtype storage; returns (float32 vectors, bytes per vector)."""
+    import numpy as np  # deferred: heavy import
+
+    if dtype == "int8":
+        # Symmetric per-vector scale, stored as one float32 next to the codes
+        scales = np.maximum(np.abs(vectors).max(axis=1, keepdims=True) / 127.0, 1e-12)
+        return np.round(vectors / scales).astype(np.int8) * scales, vectors.shape[1] + 4
+    stored = vectors.astype(dtype)
+    return stored.astype(np.float32), stored.itemsize * vectors.shape[1]
+
+
+def _top_k(matrix: "np.ndarray", query: "np.ndarray", k: int) -> set:
+    scores = matrix @ query
+    return set((-scores).argpartition(k - 1)[:k].tolist())
+
+
+def recall_latency_report(corpus: "np.ndarray", queries: "np.ndarray", k: int = 10,
+                          dimensions: Sequence[Optional[int]] = (None, 512, 256),
+                          dtypes: Sequence[str] = QUANTIZED_DTYPES) -> List[dict]:
+    """
+    Recall@k against exact full-size float32 search, memory per million
+    vectors and brute-force scan latency per query for vectors shortened to
+    each of `dimensions` (valid for text-embedding-3 models, which are trained
+    so that prefixes remain good embeddings) and stored as each of `dtypes`
+    (int8 with a symmetric per-vector scale). Quantized vectors are scanned
+    after dequantizing: NumPy has no fast float16/int8 matrix product, so
+    quantization saves memory (e.g. pgvector halfvec storage), not scan time.
+    """
+    import time
+
+    exact = _normalize(corpus)
+    truth = [_top_k(exact, q, k) for q in _normalize(queries)]
+
+    rows = []
+    for dims in dimensions:
+        vectors = _normalize(corpus, dims)
+        shortened_queries = _normalize(queries, dims)
+        for dtype in dtypes:
+            matrix, vector_bytes = _quantize(vectors, dtype)
+            start = time.perf_counter()
+            found = [_top_k(matrix, q, k) for q in shortened_queries]
+            latency = (time.perf_counter() - start) / len(queries)
+            recall = sum(len(f & t) for f, t in zip(found, truth)) / (k * len(queries))
+            rows.append({
+                "dimensions": dims or corpus.shape[1],
+                "dtype": dtype,
+                "recall": recall,
+                "latency_ms": latency * 1000,
+                "mib_per_million": vector_bytes * 1_000_000 / 2**20,
+            })
+    return rows
+
+
+if __name__ == "__main__":
+    import numpy as np
+    import json
+    import sys
+    import timeit
+    import tracemalloc
+
+    # Microbenchmark: per-query cost of the old List[float] path (OpenAI JSON
+    # floats -> list -> JSON-encoded again for the RPC) against the float32 path
+    # (base64 -> NumPy buffer -> pgvector literal).
+    dim = 1536
+    vector = np.random.default_rng(0).standard_normal(dim).astype(np.float32)
+    float_response = json.dumps({"data": [{"embedding": vector.tolist()}]})
+    base64_response = json.dumps({"data": [{"embedding": base64.b64encode(vector.tobytes()).decode("ascii")}]})
+
+    def list_path() -> str:
+        embedding = json.loads(float_response)["data"][0]["embedding"]
+        return json.dumps({"query_embedding": embedding})
+
+    def float32_path() -> str:
+        embedding = decode_base64_float32(json.loads(base64_response)["data"][0]["embedding"])
+        return json.dumps({"query_embedding": to_pgvector_literal(embedding)})
+
+    assert np.array_equal(np.array(json.loads(float32_path())["query_embedding"][1:-1].split(","), dtype=np.float32), vector)
+
+    print(f"Response payload: floats {len(float_response)} bytes, base64 {len(base64_response)} bytes")
+    for name, fn in (("List[float] path", list_path), ("float32 path", float32_path)):
+        runs = 2000
+        seconds = timeit.timeit(fn, number=runs) / runs
+        tracemalloc.start()
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(f"{name}: {seconds * 1e6:.1f} us/query, peak allocation {peak / 1024:.1f} KiB")
+
+    # Recall vs latency for reduced dimensions and quantized storage. Pass a
+    # .npy file of real embeddings (one per row) for meaningful numbers; the
+    # default synthetic corpus has variance concentrated in leading dimensions
+    # like text-embedding-3 vectors, but only roughly.
+    rng = np.random.default_rng(1)
+    if len(sys.argv) > 1:
+        embeddings = np.load(sys.argv[1]).astype(np.float32)
+    else:
+        scale = (1.0 + np.arange(dim) / 64.0) ** -0.5
+        centers = rng.standard_normal((500, dim)).astype(np.float32) * scale
+        embeddings = centers[rng.integers(0, len(centers), 20200)]
+        embeddings += 0.5 * rng.standard_normal(embeddings.shape).astype(np.float32) * scale
+    corpus, queries = embeddings[:-200], embeddings[-200:]
+    print(f"\nRecall@10 vs exact float32 search ({len(corpus)} vectors, {len(queries)} queries)")
+    print(f"{'dims':>6} {'dtype':>8} {'recall':>8} {'ms/query':>9} {'MiB/1M docs':>12}")
+    for row in recall_latency_report(corpus, queries):
+        print(f"{row['dimensions']:>6} {row['dtype']:>8} {row['recall']:>8.3f} "
+              f"{row['latency_ms']:>9.2f} {row['mib_per_million']:>12.0f}")
@@ -0,0 +1,128 @@
+# rag_verification.py
+import os
+import random
+import threading
+from collections import deque
+from typing import Any, Dict, List, Optional
+
+from dotenv import load_dotenv
+
+from .rag_metrics import metrics
+
+load_dotenv()
+
+# Adaptive verification: "adaptive" may skip the graders for high-confidence
+# database answers, "always" grades every answer (the previous behaviour)
+VERIFICATION_MODE = os.getenv("VERIFICATION_MODE", "adaptive")
+# Confidence band: best reranker relevanceScore and best DB similarity an
+# answer's documents must both reach before grading can be skipped
+VERIFY_SKIP_MIN_RELEVANCE = float(os.getenv("VERIFY_SKIP_MIN_RELEVANCE", "0.8"))
+VERIFY_SKIP_MIN_SIMILARITY = float(os.getenv("VERIFY_SKIP_MIN_SIMILARITY", "0.7"))
+# Fraction of in-band answers that are still graded, to keep the pass rate current
+VERIFY_SAMPLE_RATE = float(os.getenv("VERIFY_SAMPLE_RATE", "0.2"))
+# In-band grader pass rate (over the last VERIFY_WINDOW graded answers, at least
+# VERIFY_MIN_OBSERVATIONS of them) required before anything is skipped
+VERIFY_MIN_PASS_RATE = float(os.getenv("VERIFY_MIN_PASS_RATE", "0.95"))
+VERIFY_MIN_OBSERVATIONS = int(os.getenv("VERIFY_MIN_OBSERVATIONS", "50"))
+VERIFY_WINDOW = 200
+
+
+class VerificationPolicy:
+    """
+    Decides whether a database answer goes through the hallucination and
+    relevance graders.
+
+    Answers below the confidence band are always graded. Inside the band,
+    grading is skipped only while the graders have been passing in-band
+    answers at VERIFY_MIN_PASS_RATE or better, and even then a
+    VERIFY_SAMPLE_RATE fraction is graded so a drop in the pass rate (new
+    corpus, new model) turns skipping off again. Web answers are not covered
+    by the policy and are always graded.
+    """
+
+    def __init__(
+        self,
+        mode: str = VERIFICATION_MODE,
+        min_relevance: float = VERIFY_SKIP_MIN_RELEVANCE,
+        min_similarity: float = VERIFY_SKIP_MIN_SIMILARITY,
+        sample_rate: float = VERIFY_SAMPLE_RATE,
+        min_pass_rate: float = VERIFY_MIN_PASS_RATE,
+        min_observations: int = VERIFY_MIN_OBSERVATIONS
+    ):
+        self.mode = mode
+        self.min_relevance = min_relevance
+        self.min_similarity = min_similarity
+        self.sample_rate = sample_rate
+        self.min_pass_rate = min_pass_rate
+        self.min_observations = min_observations
+        self._outcomes: deque = deque(maxlen=VERIFY_WINDOW)
+        self._lock = threading.Lock()
+
+    def pass_rate(self) -> Dict[str, Any]:
+        """Grader pass rate over recently graded in-band answers."""
+        with self._lock:
+            observed = len(self._outcomes)
+            passed = sum(self._outcomes)
+        return {"observed": observed, "pass_rate": passed / observed if observed else None}
+
+    def decide(self, docs: List[Dict[str, Any]], grading_enabled: bool = True) -> Dict[str, Any]:
+        """
+        Decision for a database answer built from these reranked documents:
+        {"action": "grade" | "sample" | "skip", "in_band": bool, "reason": str,
+         "relevance": float, "similarity": float}.
+        grading_enabled=False (a degraded pipeline mode) always skips. Documents
+        scored by the local reranker fallback are always graded, since its
+        scores are not on the scale of the confidence band.
+        """
+        relevance = max((d.get("relevanceScore", 0.0) for d in docs), default=0.0)
+        similarity = max((d.get("similarity", 0.0) for d in docs), default=0.0)
+        decision = {"action": "grade", "in_band": False, "relevance": relevance, "similarity": similarity}
+        metrics.observe("verification.relevance", relevance)
+
+        if not grading_enabled:
+            decision["action"] = "skip"
+            decision["reason"] = "grading disabled by pipeline mode"
+        elif self.mode != "adaptive":
+            decision["reason"] = f"verification mode {self.mode}"
+        elif any(d.get("reranker") == "local" for d in docs):
+            decision["reason"] = "reranked locally"
+        elif relevance < self.min_relevance or similarity < self.min_similarity:
+            decision["reason"] = "below confidence band"
+        else:
+            decision["in_band"] = True
+            history = self.pass_rate()
+            if history["observed"] < self.min_observations:
+                decision["reason"] = f"collecting pass rate ({history['observed']}/{self.min_observations})"
+            elif history["pass_rate"] < self.min_pass_rate:
+                decision["reason"] = f"pass rate {history['pass_rate']:.2f} below {self.min_pass_rate}"
+            elif random.random() < self.sample_rate:
+                decision["action"] = "sample"
+                decision["reason"] = f"sampled at rate {self.sample_rate}"
+            else:
+                decision["action"] = "skip"
+                decision["reason"] = f"pass rate {history['pass_rate']:.2f} over {history['observed']} answers"
+
+        metrics.increment(f"verification.{decision['action']}")
+        return decision
+
+    def record(self, decision: Dict[str, Any], passed: bool) -> None:
+        """Feed back the graders' verdict; only in-band answers count toward the pass rate."""
+        if not decision["in_band"]:
+            return
+        with self._lock:
+            self._outcomes.append(passed)
+        metrics.increment(f"verification.in_band.{'passed' if passed else 'failed'}")
+
+
+_policy: Optional[VerificationPolicy] = None
+_policy_lock = threading.Lock()
+
+
+def get_verification_policy() -> VerificationPolicy:
+    """Process-wide VerificationPolicy, so pass rates are shared by all sessions."""
+    global _policy
+    if _policy is None:
+        with _policy_lock:
+            if _policy is None:
+                _policy = VerificationPolicy()
+    return _policy
@@ -0,0 +1,169 @@
+# rag_writeback.py
+import os
+import atexit
+import logging
+import hashlib
+import threading
+from typing import Any, Dict, List, Optional
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+from dotenv import load_dotenv
+
+from .rag_embeddings import EmbeddingsManager
+from .rag_metrics import metrics
+
+load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# Write verified web documents back into the documents table (off by default)
+WEB_WRITEBACK_ENABLED = os.getenv("WEB_WRITEBACK", "false").lower() == "true"
+# Only documents Cohere scored at least this high are kept; documents scored
+# by the local reranker fallback are not on that scale and are never kept
+WRITEBACK_MIN_RELEVANCE = float(os.getenv("WEB_WRITEBACK_MIN_RELEVANCE", "0.3"))
+
+TRACKING_PARAMS = {"fbclid", "gclid", "mc_cid", "mc_eid", "ref", "ref_src"}
+
+
+def canonical_url(url: str) -> str:
+    """
+    Canonical form of a URL for deduplication: lowercase scheme and host
+    without "www.", no fragment, tracking parameters dropped, remaining query
+    parameters sorted and no trailing slash. The scheme is kept: http and
+    https URLs may be different resources, and rewriting one can break it.
+    """
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = urlencode(sorted(
+        (key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    ))
+    return urlunsplit((parts.scheme.lower(), host, parts.path.rstrip("/"), query, ""))
+
+
+def url_hash(url: str) -> str:
+    """Dedupe key for a web document: its canonical URL, whatever the snippet says."""
+    return hashlib.sha256(f"url:{canonical_url(url)}".encode("utf-8")).hexdigest()
+
+
+class WebWriteBack:
+    """
+    Background stage that migrates verified web results into the corpus, so
+    recurring topics are answered from the database instead of the web.
+
+    submit() only filters and queues documents. A daemon thread collects
+    them for up to FLUSH_INTERVAL seconds (or BATCH_SIZE documents) and hands
+    the batch to a DocumentWriter, which embeds it in batched requests and
+    upserts it. Documents are keyed on their canonical URL, so the same page
+    found by different providers or queries is stored once. Provider,
+    relevance score, retrieval date and the question it answered are kept in
+    metadata as provenance. Documents are always embedded at full dimension.
+    """
+
+    FLUSH_INTERVAL = 10.0  # seconds
+    BATCH_SIZE = 64
+    MAX_PENDING = 1000
+
+    def __init__(self, embedder: Optional[EmbeddingsManager] = None, writer: Any = None,
+                 min_relevance: float = WRITEBACK_MIN_RELEVANCE):
+        # The shared query embedder is reused only if it embeds at full size;
+        # stored vectors must fit the VECTOR(1536) column even when queries use
+        # reduced EMBEDDING_DIMENSIONS
+        if embedder is not None and embedder.dimensions is not None:
+            embedder = None
+        self.embedder = embedder
+        self.min_relevance = min_relevance
+        self._writer = writer
+        self._pending: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._flush_event = threading.Event()
+        self._flusher: Optional[threading.Thread] = None
+        atexit.register(self.flush)
+
+    def _get_writer(self):
+        if self._writer is None:
+            from .rag_ingestion import DocumentWriter
+
+            self._writer = DocumentWriter(embedder=self.embedder, concurrency=1)
+        return self._writer
+
+    def submit(self, query: str, docs: List[Dict[str, Any]]) -> int:
+        """Queue the reranked web documents behind a verified answer. Returns how many were queued."""
+        queued = 0
+        with self._lock:
+            for doc in docs:
+                if doc.get("reranker") == "local":
+                    metrics.increment("writeback.skipped_local")
+                    continue
+                url, content = doc.get("url"), (doc.get("content") or "").strip()
+                if not url or not content or doc.get("relevanceScore", 0.0) < self.min_relevance:
+                    continue
+                if len(self._pending) >= self.MAX_PENDING:
+                    metrics.increment("writeback.dropped")
+                    break
+                key = url_hash(url)
+                if key in self._pending:
+                    # Same page from another provider/query: keep the better-scored copy
+                    if self._pending[key]["metadata"]["relevance_score"] >= doc["relevanceScore"]:
+                        continue
+                    queued -= 1
+                self._pending[key] = {
+                    "title": doc.get("title") or canonical_url(url),
+                    "content": content,
+                    "url": canonical_url(url),
+                    "content_hash": key,
+                    "metadata": {
+                        "source": "web",
+                        "search_provider": doc.get("provider"),
+                        "date": doc.get("date"),
+                        "relevance_score": doc.get("relevanceScore"),
+                        "query": query,
+                    },
+                }
+                queued += 1
+            if len(self._pending) >= self.BATCH_SIZE:
+                self._flush_event.set()
+        metrics.increment("writeback.queued", queued)
+        if queued and (self._flusher is None or not self._flusher.is_alive()):
+            self._flusher = threading.Thread(target=self._flush_loop, name="web-writeback", daemon=True)
+            self._flusher.start()
+        return queued
+
+    def _flush_loop(self) -> None:
+        while True:
+            self._flush_event.wait(self.FLUSH_INTERVAL)
+            self._flush_event.clear()
+            self.flush()
+
+    def flush(self) -> None:
+        """Embed and upsert everything queued so far."""
+        with self._lock:
+            batch, self._pending = list(self._pending.values()), {}
+        if not batch:
+            return
+        try:
+            stats = self._get_writer().write(batch)
+        except Exception as e:
+            logger.warning(f"Web write-back of {len(batch)} documents failed: {e}")
+            metrics.increment("writeback.failed", len(batch))
+            return
+        for key, value in stats.items():
+            metrics.increment(f"writeback.{key}", value)
+
+
+_writeback: Optional[WebWriteBack] = None
+_writeback_lock = threading.Lock()
+
+
+def get_web_writeback(embedder: Optional[EmbeddingsManager] = None) -> Optional[WebWriteBack]:
+    """Process-wide WebWriteBack, or None unless WEB_WRITEBACK=true."""
+    global _writeback
+    if not WEB_WRITEBACK_ENABLED:
+        return None
+    if _writeback is None:
+        with _writeback_lock:
+            if _writeback is None:
+                _writeback = WebWriteBack(embedder=embedder)
+    return _writeback
@@ -0,0 +1,15 @@
+# test_import_time.py
+import os
+
+from rag.rag_warmup import IMPORT_TIME_BUDGET, measure_import_time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def test_import_app_main_within_budget():
+    """`import app.main` in a fresh interpreter stays within IMPORT_TIME_BUDGET (median of 3 runs)."""
+    median = measure_import_time(runs=3, cwd=BACKEND_DIR)
+    assert median <= IMPORT_TIME_BUDGET, (
+        f"import app.main took {median:.3f}s, over the {IMPORT_TIME_BUDGET:.3f}s budget; "
+        "defer heavy SDK imports to first use"
+    )
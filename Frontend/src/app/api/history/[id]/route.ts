@@ -0,0 +1,30 @@
+import { getAuth } from '@clerk/nextjs/server';
+import { NextRequest, NextResponse } from 'next/server';
+import { env } from '@/config/env';
+
+export async function GET(
+  request: NextRequest,
+  { params }: { params: Promise<{ id: string }> }
+) {
+  const { userId } = getAuth(request);
+
+  if (!userId) {
+    return NextResponse.json({ error: 'Unauthorized' }, { status: 401 });
+  }
+
+  const { id } = await params;
+
+  try {
+    const response = await fetch(`${env.apiUrl}/history/${userId}/${id}`);
+    if (response.status === 404) {
+      return NextResponse.json({ error: 'Not found' }, { status: 404 });
+    }
+    if (!response.ok) throw new Error('Failed to fetch history item from backend');
+
+    const data = await response.json();
+    return NextResponse.json(data);
+  } catch (error) {
+    console.error('Error fetching history item:', error);
+    return NextResponse.json({ error: 'Failed to fetch history item' }, { status: 500 });
+  }
+}
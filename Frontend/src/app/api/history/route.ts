@@ -10,7 +10,9 @@ export async function GET(request: NextRequest) {
   }
 
   try {
-    const response = await fetch(`${env.apiUrl}/history/${userId}`);
+    // Forward pagination parameters (limit, cursor) to the backend
+    const params = request.nextUrl.searchParams.toString();
+    const response = await fetch(`${env.apiUrl}/history/${userId}${params ? `?${params}` : ''}`);
     if (!response.ok) throw new Error('Failed to fetch history from backend');
 
     const data = await response.json();
@@ -43,7 +43,7 @@ export default function HistoryPage() {
   const backgroundY = useTransform(scrollY, [0, 500], [0, 150]);
   const opacity = useTransform(scrollY, [0, 200], [1, 0]);
   const [isLoading, setIsLoading] = useState(true);
-  const { history, syncHistory } = useHistory(user?.id || '');
+  const { history, syncHistory, hasMore, loadMore, loadHistoryItem } = useHistory(user?.id || '');
 
   useEffect(() => {
     const loadHistory = async () => {
@@ -57,6 +57,15 @@ export default function HistoryPage() {
     loadHistory();
   }, [user?.id, syncHistory]);
 
+  // Answers and documents are loaded on demand when an item is opened
+  useEffect(() => {
+    if (!selectedItem) return;
+    const item = history.find(entry => entry.id === selectedItem);
+    if (item && !('answer' in item)) {
+      loadHistoryItem(selectedItem);
+    }
+  }, [selectedItem, history, loadHistoryItem]);
+
   useEffect(() => {
     if (isLoaded && !isSignedIn) {
       router.push('/');
@@ -249,7 +258,9 @@ export default function HistoryPage() {
   };
 
   const selectedHistoryItem = history.find(item => item.id === selectedItem);
-  const parsedHistoryItem = selectedHistoryItem ? parseHistoryAnswer(selectedHistoryItem) : null;
+  const parsedHistoryItem = selectedHistoryItem && 'answer' in selectedHistoryItem
+    ? parseHistoryAnswer(selectedHistoryItem)
+    : null;
 
   return (
     <main className="min-h-screen flex flex-col">
@@ -383,6 +394,14 @@ export default function HistoryPage() {
                 ))}
               </AnimatePresence>
 
+              {hasMore && !searchTerm && (
+                <div className="flex justify-center pt-4">
+                  <Button variant="outline" onClick={loadMore}>
+                    Load more
+                  </Button>
+                </div>
+              )}
+
               {/* Clean Empty State Animation */}
               {filteredHistory.length === 0 && !isLoading && (
                 <motion.div
@@ -4,7 +4,9 @@ import type { ResearchResponse } from '@/types/research';
 export interface HistoryItem {
   id: string;
   question: string;
-  answer: ResearchResponse;
+  // Only present once the item has been loaded with loadHistoryItem
+  answer?: ResearchResponse;
+  status?: string;
   timestamp: number;
   created_at?: string;
 }
@@ -13,7 +15,10 @@ interface UseHistoryReturn {
   history: HistoryItem[];
   isLoading: boolean;
   error: string | null;
+  hasMore: boolean;
   syncHistory: () => Promise<void>;
+  loadMore: () => Promise<void>;
+  loadHistoryItem: (id: string) => Promise<void>;
   addToHistory: (item: Omit<HistoryItem, 'id'>) => Promise<void>;
   deleteFromHistory: (id: string) => Promise<void>;
 }
@@ -22,9 +27,10 @@ export function useHistory(userId: string): UseHistoryReturn {
   const [history, setHistory] = useState<HistoryItem[]>([]);
   const [isLoading, setIsLoading] = useState(false);
   const [error, setError] = useState<string | null>(null);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
 
-  // Sync with backend
-  const syncHistory = useCallback(async () => {
+  // Fetch one page of history summaries from the backend
+  const fetchPage = useCallback(async (cursor: string | null) => {
     if (!userId) {
       setError('No user ID provided');
       return;
@@ -34,7 +40,8 @@ export function useHistory(userId: string): UseHistoryReturn {
     setError(null);
 
     try {
-      const response = await fetch('/api/history', {
+      const query = cursor ? `?cursor=${encodeURIComponent(cursor)}` : '';
+      const response = await fetch(`/api/history${query}`, {
         method: 'GET',
         headers: {
           'Content-Type': 'application/json',
@@ -58,7 +65,8 @@ export function useHistory(userId: string): UseHistoryReturn {
         return timeB - timeA;
       });
 
-      setHistory(sortedHistory);
+      setHistory(prev => cursor ? [...prev, ...sortedHistory] : sortedHistory);
+      setNextCursor(data.next_cursor ?? null);
     } catch (error) {
       console.error('Error syncing history:', error);
       setError(error instanceof Error ? error.message : 'Failed to sync history');
@@ -67,6 +75,31 @@ export function useHistory(userId: string): UseHistoryReturn {
     }
   }, [userId]);
 
+  // Sync with backend (first page)
+  const syncHistory = useCallback(() => fetchPage(null), [fetchPage]);
+
+  const loadMore = useCallback(async () => {
+    if (nextCursor) {
+      await fetchPage(nextCursor);
+    }
+  }, [fetchPage, nextCursor]);
+
+  // Load the full answer and documents for a single history item
+  const loadHistoryItem = useCallback(async (id: string) => {
+    if (!userId) return;
+    try {
+      const response = await fetch(`/api/history/${id}`);
+      if (!response.ok) {
+        throw new Error(`HTTP error! status: ${response.status}`);
+      }
+      const data = await response.json();
+      setHistory(prev => prev.map(item => item.id === id ? { ...item, ...data.query } : item));
+    } catch (error) {
+      console.error('Error loading history item:', error);
+      setError(error instanceof Error ? error.message : 'Failed to load history item');
+    }
+  }, [userId]);
+
   const addToHistory = useCallback(async (item: Omit<HistoryItem, 'id'>) => {
     if (!userId) return;
     try {
@@ -105,7 +138,10 @@ export function useHistory(userId: string): UseHistoryReturn {
     history,
     isLoading,
     error,
+    hasMore: nextCursor !== null,
     syncHistory,
+    loadMore,
+    loadHistoryItem,
     addToHistory,
     deleteFromHistory,
   };